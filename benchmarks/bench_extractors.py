@@ -0,0 +1,60 @@
+"""השוואת זמן ריצה וקריאות API לדוח: rules / llm / hybrid על כל מחסן הדוחות
+
+ברירת המחדל מריצה מול שרת הדמה המקומי (ללא מכסת API); --live משתמש ב-Gemini האמיתי.
+    python -m benchmarks.bench_extractors [--quarter Q3] [--live]
+"""
+import argparse
+import os
+import statistics
+import time
+
+from engine.batch import iter_reports
+from engine.extraction import CHAINS, extract_report, schema_fields
+from engine.gemini_client import GeminiClient
+from engine.stub_gemini import StubGemini
+
+
+def _api_calls(server):
+    return sum(":generateContent" in r["path"] for r in server.requests) if server else None
+
+
+def run(reports, api_key, client, server):
+    rows = []
+    n_fields = len(schema_fields())
+    for mode in sorted(CHAINS):
+        times, calls, filled = [], [], []
+        for r in reports:
+            before = _api_calls(server)
+            t0 = time.perf_counter()
+            data, status = extract_report(r.path, api_key, mode=mode, use_cache=False, client=client)
+            times.append(time.perf_counter() - t0)
+            if server: calls.append(_api_calls(server) - before)
+            sources = (data or {}).get("meta", {}).get("sources", {})
+            filled.append(len(sources) / n_fields)
+        rows.append((mode, sum(times), statistics.median(times), sum(calls) / len(calls) if calls else float("nan"),
+                     statistics.mean(filled)))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quarter", action="append")
+    parser.add_argument("--company", action="append")
+    parser.add_argument("--live", action="store_true", help="Gemini אמיתי (GOOGLE_API_KEY)")
+    args = parser.parse_args(argv)
+
+    server = None
+    if args.live:
+        api_key, client = os.environ["GOOGLE_API_KEY"], None
+    else:
+        server = StubGemini().start()
+        api_key, client = "stub", GeminiClient("stub", server.base_url)
+    reports = list(iter_reports(companies=args.company, quarters=args.quarter))
+    print(f"{len(reports)} דוחות")
+    print(f"{'mode':<8} {'total s':>9} {'median s':>9} {'API/report':>11} {'fields filled':>14}")
+    for mode, total, median, calls, filled in run(reports, api_key, client, server):
+        print(f"{mode:<8} {total:>9.2f} {median:>9.3f} {calls:>11.2f} {filled:>13.0%}")
+
+
+if __name__ == "__main__":
+    main()
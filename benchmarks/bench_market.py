@@ -0,0 +1,311 @@
+"""סוויטת ביצועים על שוק סינתטי: N חברות × M רבעונים ברשומות במבנה IFRS17_SCHEMA, מ-10 עד 100k רשומות
+
+לכל גודל נבנה מאגר מדדים סינתטי (Parquet בתיקייה זמנית, APEX_STORE_PATH/APEX_CACHE_DIR), וכל פעולה
+נמדדת בשני תהליכים נפרדים (שניהם קרים, עם מטמון משלהם) אחרי ייבוא וטעינת המאגר:
+    seconds / base_mb  זמן הקריאה הראשונה, ו-RSS של התהליך אחרי טעינת המאגר (ru_maxrss)
+    alloc_mb           שיא ההקצאות של הפעולה עצמה (tracemalloc: שיא פחות נקודת ההתחלה) - בתהליך נפרד,
+                       כי tracemalloc מאט את הריצה. כולל אובייקטי Python ומאגרי NumPy, לא את זיכרון Arrow
+    benchmark        get_benchmark_data לרבעון האחרון (חישוב השוק כולו)
+    red_flags        אינדקס הדגלים לכל השוק (RuleIndex) + red_flags לרשומה בודדת
+    compliance       compliance_checks לרשומה בודדת
+    waterfall/radar  create_waterfall / create_radar_chart מ-engine.charts (ללא memo)
+    export_xlsx      ייצוא כל השוק ל-xlsx (המחליף של generate_excel)
+    simulator        shock_impact + Monte Carlo לכל המבטחים ברבעון (simulate_market)
+פעולות לרשומה בודדת מדווחות כחציון לקריאה על מדגם של עד SAMPLE רשומות.
+
+    python -m benchmarks.bench_market run --sizes 10 1000 --save benchmarks/baselines/market.json
+    python -m benchmarks.bench_market compare benchmarks/baselines/market.json [--tolerance 0.25]
+compare מריץ מחדש את הגדלים והפעולות שבבסיס (או משווה לקובץ תוצאות קיים) ויוצא עם קוד 1 על רגרסיה.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# גודל -> (חברות, רבעונים)
+SIZES = {10: (5, 2), 100: (10, 10), 1_000: (50, 20), 10_000: (250, 40), 100_000: (1000, 100)}
+OPS = ("benchmark", "red_flags", "compliance", "waterfall", "radar", "export_xlsx", "simulator")
+SAMPLE = 50
+DEFAULT_TOLERANCE = 0.25  # האטה יחסית שנחשבת רגרסיה
+MIN_SECONDS = 0.005       # מתחת לזה הפרשים הם רעש מדידה
+MIN_ALLOC_MB = 4.0
+
+
+# ==============================================================================
+# מחולל שוק סינתטי
+# ==============================================================================
+def _period(ordinal):
+    return f"Q{ordinal % 4 + 1} {2000 + ordinal // 4}"
+
+
+def synthetic_market(n_companies, n_quarters, seed=0, missing=0.03):
+    """{period: {company: record}} במבנה FULL_DATA / IFRS17_SCHEMA. CSM מתגלגל בין רבעונים
+    (סגירה = פתיחה הבאה), חלק מהחברות חוצות ספי דגלים, ו-missing מהשדות חסרים (None)."""
+    rng = np.random.default_rng(seed)
+    shape = (n_quarters, n_companies)
+    opening = np.empty(shape)
+    opening[0] = rng.uniform(2_000, 20_000, n_companies)
+    new_business = rng.uniform(50, 900, shape)
+    release = opening[0] * rng.uniform(0.015, 0.04, shape)
+    for q in range(1, n_quarters):
+        opening[q] = opening[q - 1] + new_business[q - 1] - release[q - 1]
+    closing = opening + new_business - release
+    solvency = np.clip(rng.normal(150, 30, shape), 60, 300)
+    tier1 = rng.uniform(2_000, 15_000, shape)
+    fields = {
+        "core_kpis": {"net_profit": rng.normal(300, 250, shape), "total_csm": closing, "roe": rng.normal(11, 5, shape),
+                      "gross_premiums": rng.uniform(2_000, 30_000, shape), "total_assets": rng.uniform(5e4, 4e5, shape)},
+        "ifrs17_segments": {"life_csm": closing * 0.55, "health_csm": closing * 0.3, "general_csm": closing * 0.15,
+                            "onerous_contracts": np.where(rng.random(shape) < 0.3, rng.uniform(0, 400, shape), 0.0),
+                            "new_business_csm": new_business},
+        "investment_mix": {"govt_bonds_pct": rng.uniform(20, 50, shape), "corp_bonds_pct": rng.uniform(10, 30, shape),
+                           "stocks_pct": rng.uniform(5, 25, shape), "real_estate_pct": rng.uniform(2, 12, shape),
+                           "unquoted_pct": rng.uniform(5, 35, shape), "real_yield": rng.normal(4, 2, shape)},
+        "financial_ratios": {"loss_ratio": rng.uniform(55, 90, shape), "combined_ratio": rng.normal(95, 6, shape),
+                             "lcr": rng.uniform(0.8, 2.0, shape), "leverage": rng.uniform(5, 15, shape),
+                             "roa": rng.normal(1, 0.5, shape)},
+        "solvency": {"solvency_ratio": solvency, "tier1_capital": tier1, "tier2_capital": tier1 * rng.uniform(0.2, 0.9, shape),
+                     "scr": tier1 * 100 / solvency},
+        "consistency_check": {"opening_csm": opening, "new_business_csm": new_business, "csm_release": release,
+                              "closing_csm": closing},
+    }
+    holes = rng.random((len(fields), 8) + shape) < missing
+    companies = [f"Co{c:04d}" for c in range(n_companies)]
+    market = {}
+    for q in range(n_quarters):
+        market[_period(q)] = quarter = {}
+        for c, company in enumerate(companies):
+            quarter[company] = {
+                block: {k: None if holes[b, f, q, c] else round(float(v[q, c]), 2) for f, (k, v) in enumerate(values.items())}
+                for b, (block, values) in enumerate(fields.items())}
+    return market
+
+
+def build_store(size, directory, seed=0):
+    """מאגר Parquet סינתטי בגודל size (רשומות); מחזיר את הנתיב"""
+    from engine.store import from_nested, save_store
+
+    n_companies, n_quarters = SIZES.get(size) or (max(1, size // 10), 10)
+    path = os.path.join(directory, f"metrics_{size}.parquet")
+    save_store(from_nested(synthetic_market(n_companies, n_quarters, seed)), path)
+    return path
+
+
+# ==============================================================================
+# פעולות (רצות בתהליך המדידה)
+# ==============================================================================
+def _sample_records(k=SAMPLE):
+    from engine.store import get_record, load_store
+
+    frame = load_store()
+    rows = frame.iloc[np.linspace(0, len(frame) - 1, min(k, len(frame))).astype(int)]
+    records = [get_record(c, p, frame) for c, p in zip(rows["company"], rows["period"])]
+    # גרפי הדשבורד מניחים רשומה מלאה; רשומות עם חורים נשארות לבדיקות הכללים
+    return records, [r for r in records if all(v is not None for b in r.values() if isinstance(b, dict) for v in b.values())]
+
+
+def _per_call(fn, items):
+    times = []
+    for item in items:
+        t = time.perf_counter()
+        fn(item)
+        times.append(time.perf_counter() - t)
+    return statistics.median(times) if times else None
+
+
+def op_benchmark():
+    from engine.benchmark import get_benchmark_data
+    from engine.store import companies, periods
+
+    last = periods()[-1]
+    get_benchmark_data(companies(last), last)
+
+
+def op_red_flags():
+    from engine.rules import RuleIndex, red_flags
+
+    RuleIndex().refresh()
+    return {"per_record_s": _per_call(red_flags, _sample_records()[0])}
+
+
+def op_compliance():
+    from engine.rules import compliance_checks
+
+    return {"per_record_s": _per_call(compliance_checks, _sample_records()[0])}
+
+
+def op_waterfall():
+    from engine.charts import create_waterfall
+
+    return {"per_record_s": _per_call(create_waterfall.__wrapped__, _sample_records()[1])}
+
+
+def op_radar():
+    from engine.charts import create_radar_chart
+
+    return {"per_record_s": _per_call(create_radar_chart.__wrapped__, _sample_records()[1])}
+
+
+def op_export_xlsx():
+    from engine.export import export_market
+
+    return {"bytes": os.path.getsize(export_market("xlsx"))}
+
+
+def op_simulator():
+    from engine.store import periods
+    from engine.stress import shock_impact, simulate_market
+
+    shock_impact(np.linspace(-3, 3, 1000), np.linspace(-60, 60, 1000), np.linspace(-60, 60, 1000))
+    mc, _ = simulate_market(periods()[-1], (-1.0, -20.0, 10.0), False)
+    return {"companies": len(mc)}
+
+
+def _probe(op, memory=False):
+    """מדידה בתהליך הנוכחי: ייבוא + טעינת המאגר לפני נקודת הבסיס, ואז הפעולה (זמן, או הקצאות עם memory)"""
+    from engine.store import load_store
+
+    load_store()
+    if memory:
+        tracemalloc.start()
+        start = tracemalloc.get_traced_memory()[0]
+        globals()[f"op_{op}"]()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return {"alloc_mb": round((peak - start) / 2**20, 1)}
+    base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    t = time.perf_counter()
+    extra = globals()[f"op_{op}"]() or {}
+    seconds = time.perf_counter() - t
+    extra = {k: round(v, 6) if isinstance(v, float) else v for k, v in extra.items()}
+    return {"seconds": round(seconds, 6), "base_mb": round(base / 1024, 1), **extra}
+
+
+def _run_probe(args, store_path, cache_dir, timeout):
+    env = {**os.environ, "APEX_STORE_PATH": store_path, "APEX_CACHE_DIR": cache_dir, "APEX_TELEMETRY": "0",
+           "PYTHONPATH": ROOT + os.pathsep + os.environ.get("PYTHONPATH", "")}
+    proc = subprocess.run([sys.executable, "-m", "benchmarks.bench_market", "probe", *args], cwd=ROOT, env=env,
+                          capture_output=True, text=True, timeout=timeout)
+    line = next((l for l in proc.stdout.splitlines() if l.startswith("RESULT ")), None)
+    if line is None:
+        return {"error": (proc.stderr.strip().splitlines() or ["no output"])[-1]}
+    return json.loads(line[len("RESULT "):])
+
+
+def measure(op, store_path, cache_dir, timeout=1800):
+    """זמן ו-RSS בתהליך אחד, הקצאות הפעולה בתהליך שני עם מטמון ריק משלו (כדי ששניהם יהיו קרים)"""
+    timing = _run_probe([op], store_path, cache_dir, timeout)
+    if "error" in timing:
+        return timing
+    memory = _run_probe([op, "--memory"], store_path, cache_dir + "_mem", timeout)
+    return {**timing, **memory}
+
+
+def run(sizes, ops, progress=print):
+    results = []
+    with tempfile.TemporaryDirectory(prefix="apex_bench_") as tmp:
+        for size in sizes:
+            t = time.perf_counter()
+            store_path = build_store(size, tmp)
+            progress(f"[{size:>7,}] מאגר סינתטי נבנה ({time.perf_counter() - t:.1f}s)")
+            for op in ops:
+                cache_dir = os.path.join(tmp, f"cache_{size}_{op}")
+                r = {"size": size, "op": op, **measure(op, store_path, cache_dir)}
+                results.append(r)
+                progress(_row(r))
+    return {"machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": results}
+
+
+def _row(r):
+    if "error" in r:
+        return f"[{r['size']:>7,}] {r['op']:<12} שגיאה: {r['error']}"
+    per = f"  {r['per_record_s'] * 1000:8.2f}ms/רשומה" if r.get("per_record_s") else ""
+    alloc = f"{r['alloc_mb']:8.1f}MB" if r.get("alloc_mb") is not None else f"{'?':>10}"
+    return f"[{r['size']:>7,}] {r['op']:<12} {r['seconds']:9.3f}s {alloc} הוקצו (בסיס {r['base_mb']:.0f}MB){per}"
+
+
+# ==============================================================================
+# השוואה מול בסיס
+# ==============================================================================
+def compare(baseline, current, tolerance=DEFAULT_TOLERANCE):
+    """[(size, op, metric, base, now, ratio, regressed)] לכל מדד משותף"""
+    now = {(r["size"], r["op"]): r for r in current["results"]}
+    rows = []
+    for b in baseline["results"]:
+        c = now.get((b["size"], b["op"]))
+        if c is None or "error" in b:
+            continue
+        if "error" in c:
+            rows.append((b["size"], b["op"], "error", None, None, None, True))
+            continue
+        for metric, floor in (("seconds", MIN_SECONDS), ("per_record_s", MIN_SECONDS / 10), ("alloc_mb", MIN_ALLOC_MB)):
+            if b.get(metric) is None or c.get(metric) is None: continue
+            ratio = c[metric] / b[metric] if b[metric] else float("inf")
+            regressed = c[metric] > b[metric] * (1 + tolerance) and c[metric] - b[metric] > floor
+            rows.append((b["size"], b["op"], metric, b[metric], c[metric], ratio, regressed))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("run")
+    p.add_argument("--sizes", type=int, nargs="+", default=list(SIZES))
+    p.add_argument("--ops", nargs="+", choices=OPS, default=list(OPS))
+    p.add_argument("--save", help="נתיב לשמירת התוצאות כ-JSON (בסיס)")
+    p = sub.add_parser("compare")
+    p.add_argument("baseline")
+    p.add_argument("current", nargs="?", help="קובץ תוצאות; ברירת מחדל: הרצה חדשה")
+    p.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    p = sub.add_parser("probe")
+    p.add_argument("op", choices=OPS)
+    p.add_argument("--memory", action="store_true", help="מדידת הקצאות (tracemalloc) במקום זמן")
+    args = parser.parse_args(argv)
+
+    if args.cmd == "probe":
+        print("RESULT " + json.dumps(_probe(args.op, args.memory)))
+        return 0
+    if args.cmd == "run":
+        result = run(args.sizes, args.ops)
+        if args.save:
+            os.makedirs(os.path.dirname(args.save) or ".", exist_ok=True)
+            with open(args.save, "w", encoding="utf-8") as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+            print(f"נשמר: {args.save}")
+        return 1 if any("error" in r for r in result["results"]) else 0
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if args.current:
+        with open(args.current, encoding="utf-8") as f:
+            current = json.load(f)
+    else:
+        sizes = sorted({r["size"] for r in baseline["results"]})
+        ops = [op for op in OPS if any(r["op"] == op for r in baseline["results"])]
+        current = run(sizes, ops)
+    rows = compare(baseline, current, args.tolerance)
+    print(f"{'size':>8} {'op':<12} {'metric':<13} {'baseline':>10} {'current':>10} {'ratio':>7}")
+    for size, op, metric, base, now, ratio, regressed in rows:
+        if metric == "error":
+            print(f"{size:>8,} {op:<12} {'error':<13} {'':>10} {'':>10} {'':>7} ❌")
+            continue
+        print(f"{size:>8,} {op:<12} {metric:<13} {base:>10.4g} {now:>10.4g} {ratio:>6.2f}x{' ❌' if regressed else ''}")
+    regressions = sum(r[-1] for r in rows)
+    print(f"{regressions} רגרסיות (סבולת {args.tolerance:.0%})")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
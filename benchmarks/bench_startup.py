@@ -0,0 +1,80 @@
+"""זמן עלייה (cold start) וזמן תגובה לאינטראקציות בדשבורד, מול יעדים קבועים
+
+כל חזרה רצה בתהליך נפרד (מטמונים וייבואים קרים) דרך streamlit.testing.v1.AppTest:
+טעינה ראשונה, הרצת ביקורת, מעבר בין כל הטאבים והזזת סליידר בסימולטור.
+בנוסף נבדק שתלויות החילוץ ו-plotly.express אינן נטענות בעלייה.
+    python -m benchmarks.bench_startup [--repeat 3] [--json]
+יוצא עם קוד 1 כשאחד היעדים נחצה, כך שניתן להריץ ב-CI.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "app.py")
+
+# יעדים (שניות, חציון החזרות)
+TARGETS = {"cold_start": 2.5, "audit_run": 1.0, "tab_switch": 0.75, "slider": 0.5}
+# מודולים שאסור שייטענו לפני שמשתמש פותח גרף או מריץ חילוץ חי
+DEFERRED_MODULES = ("requests", "jsonschema", "plotly.express", "engine.extraction", "engine.gemini_client")
+
+_PROBE = r"""
+import json, logging, sys, time
+logging.disable(logging.WARNING)
+t0 = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file(sys.argv[1], default_timeout=120).run()
+out = {"cold_start": time.perf_counter() - t0,
+       "loaded_at_start": [m for m in sys.argv[2].split(",") if m in sys.modules]}
+
+def timed(fn):
+    t = time.perf_counter(); fn(); return time.perf_counter() - t
+
+out["audit_run"] = timed(lambda: at.button[0].click().run())
+tab = next(r for r in at.radio if r.key == "tab")
+out["tab_switch"] = max(timed(lambda o=o: at.radio(key="tab").set_value(o).run()) for o in tab.options[1:])
+at.radio(key="tab").set_value(next(o for o in tab.options if "סימולטור" in o)).run()
+out["slider"] = timed(lambda: at.slider[0].set_value(-1.0).run())
+out["errors"] = [str(e.value) for e in at.exception]
+print("RESULT " + json.dumps(out))
+"""
+
+
+def probe():
+    proc = subprocess.run([sys.executable, "-c", _PROBE, APP, ",".join(DEFERRED_MODULES)],
+                          cwd=ROOT, capture_output=True, text=True, check=True)
+    line = next(l for l in proc.stdout.splitlines() if l.startswith("RESULT "))
+    return json.loads(line[len("RESULT "):])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", action="store_true", help="פלט JSON במקום טבלה")
+    args = parser.parse_args(argv)
+
+    runs = [probe() for _ in range(args.repeat)]
+    summary = {k: statistics.median(r[k] for r in runs) for k in TARGETS}
+    loaded = sorted(set().union(*(r["loaded_at_start"] for r in runs)))
+    errors = sorted(set().union(*(r["errors"] for r in runs)))
+    failed = [k for k, v in summary.items() if v > TARGETS[k]] + (["deferred_imports"] if loaded else []) + \
+             (["exceptions"] if errors else [])
+
+    if args.json:
+        print(json.dumps({"median": summary, "targets": TARGETS, "loaded_at_start": loaded, "errors": errors,
+                          "failed": failed}, ensure_ascii=False, indent=2))
+    else:
+        print(f"{'metric':<12} {'median s':>9} {'target s':>9}")
+        for k, v in summary.items():
+            print(f"{k:<12} {v:>9.3f} {TARGETS[k]:>9.2f} {'FAIL' if v > TARGETS[k] else 'ok'}")
+        print(f"נטענו בעלייה (אמורים להיטען בעצלות): {', '.join(loaded) or 'אין'}")
+        for e in errors:
+            print(f"שגיאה: {e}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
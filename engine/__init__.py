@@ -0,0 +1,6 @@
+"""מנועי עיבוד ולוגיקה של Apex Regulator - ניתנים לייבוא ללא Streamlit (CLI, שירותים, עבודות רקע)"""
+import os
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(ROOT_DIR, "data")
+CACHE_DIR = os.environ.get("APEX_CACHE_DIR", os.path.join(DATA_DIR, ".cache"))
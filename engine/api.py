@@ -0,0 +1,288 @@
+"""שירות HTTP מקומי (ללא Streamlit) לשאילתות על מאגר המדדים: רשומות, דגלים, ציות ובנצ'מארק
+
+כל תשובה היא JSON שנבנה פעם אחת לכל גרסת נתונים ונשמר ב-LRU בזיכרון התהליך, עם ETag חזק
+(hash התוכן) - בקשה חוזרת עם If-None-Match מקבלת 304 בלי גוף. מספר תהליכי עובדים (fork) חולקים
+socket האזנה אחד; ה-ETag זהה בכל העובדים כי הוא נגזר מהתוכן.
+
+נתיבים:
+    GET /companies                               חברות ותקופות זמינות
+    GET /companies/{company}/quarters/{quarter}  רשומה מלאה + דגלים + ציות (quarter: "Q3 2025" / Q3-2025 / 2025Q3)
+    GET /benchmark?companies=Harel,Clal&metric=solvency.solvency_ratio&quarter=Q3-2025
+    GET /flags?severity=CRITICAL&period=Q3-2025&company=Harel
+    GET /health
+
+שימוש:
+    python -m engine.api --port 8780 --workers 4
+    curl -s localhost:8780/companies/Harel/quarters/Q3-2025
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import re
+import signal
+import socket
+import sys
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from engine.store import companies, get_record, period_label, periods, store_version
+
+CACHE_SIZE = 2048
+DEFAULT_PORT = 8780
+
+_QUARTER = (re.compile(r"Q([1-4])[ _-]?(\d{4})", re.IGNORECASE), re.compile(r"(\d{4})[ _-]?Q([1-4])", re.IGNORECASE))
+
+
+class NotFound(Exception):
+    pass
+
+
+class BadRequest(Exception):
+    pass
+
+
+def parse_quarter(text):
+    """'Q3 2025' / 'Q3-2025' / '2025Q3' -> 'Q3 2025'"""
+    text = unquote(text).strip()
+    m = _QUARTER[0].fullmatch(text)
+    if m: return period_label(m.group(2), m.group(1))
+    m = _QUARTER[1].fullmatch(text)
+    if m: return period_label(m.group(1), m.group(2))
+    raise BadRequest(f"רבעון לא תקין: {text}")
+
+
+def _clean(value):
+    """NaN/inf -> None (JSON תקני), רקורסיבית"""
+    if isinstance(value, float) and not math.isfinite(value): return None
+    if isinstance(value, dict): return {k: _clean(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)): return [_clean(v) for v in value]
+    if hasattr(value, "item"): return _clean(value.item())  # numpy scalar
+    return value
+
+
+def _records(frame):
+    return _clean(frame.to_dict(orient="records"))
+
+
+def _list_param(query, name):
+    values = [v for raw in query.get(name, []) for v in raw.split(",") if v.strip()]
+    return [v.strip() for v in values] or None
+
+
+# ==============================================================================
+# נתיבים -> payload (dict)
+# ==============================================================================
+def company_list(query):
+    return {"companies": companies(), "periods": periods()}
+
+
+def company_quarter(query, company, quarter):
+    from engine.rules import compliance_checks, red_flags
+
+    period = parse_quarter(quarter)
+    record = get_record(company, period)
+    if record is None:
+        raise NotFound(f"אין נתונים עבור {company} ({period})")
+    return {"company": company, "period": period, "record": _clean(record),
+            "red_flags": [{"level": level, "message": msg} for level, msg in red_flags(record)],
+            "compliance": compliance_checks(record)}
+
+
+def benchmark_view(query):
+    from engine.benchmark import SCATTER_METRICS, benchmark
+
+    names = _list_param(query, "companies")
+    quarters = [parse_quarter(q) for q in _list_param(query, "quarter") or []] or None
+    metrics = _list_param(query, "metric") or list(SCATTER_METRICS)
+    tidy = benchmark(names, quarters, metrics)
+    cols = ["company", "period", "metric", "value", "missing", "pct_rank", "z_vs_median", "qoq_delta"]
+    return {"rows": _records(tidy[cols])}
+
+
+def flags_view(query):
+    from engine.rules import get_rule_index
+
+    severity = (query.get("severity") or [None])[0]
+    if severity: severity = severity.upper()
+    if severity not in (None, "CRITICAL", "WARNING"):
+        raise BadRequest(f"severity לא תקין: {severity}")
+    period = parse_quarter(query["period"][0]) if query.get("period") else None
+    company = (query.get("company") or [None])[0]
+    hits = get_rule_index().hits(level=severity, period=period, company=company)
+    return {"flags": _records(hits[["company", "period", "rule", "level", "value", "message"]])}
+
+
+ROUTES = [
+    (re.compile(r"/companies/?"), company_list),
+    (re.compile(r"/companies/([^/]+)/quarters/([^/]+)/?"), company_quarter),
+    (re.compile(r"/benchmark/?"), benchmark_view),
+    (re.compile(r"/flags/?"), flags_view),
+]
+
+
+# ==============================================================================
+# מטמון תשובות
+# ==============================================================================
+class ResponseCache:
+    """LRU של (נתיב, פרמטרים, גרסת נתונים) -> (גוף, ETag)"""
+
+    def __init__(self, maxsize=CACHE_SIZE):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key, build):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+        body = json.dumps(build(), ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode("utf-8")
+        entry = (body, '"' + hashlib.sha256(body).hexdigest()[:32] + '"')
+        with self._lock:
+            self._data[key] = entry
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return entry
+
+
+def resolve(path):
+    """(handler, args) לנתיב, או NotFound"""
+    for pattern, handler in ROUTES:
+        m = pattern.fullmatch(path)
+        if m: return handler, tuple(unquote(g) for g in m.groups())
+    raise NotFound(f"נתיב לא קיים: {path}")
+
+
+class ApiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", DEFAULT_PORT), cache_size=CACHE_SIZE, bind_and_activate=True):
+        super().__init__(address, _Handler, bind_and_activate)
+        self.cache = ResponseCache(cache_size)
+
+    @property
+    def base_url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def respond(self, handler, args, query):
+        """(גוף, ETag) מהמטמון; המפתח כולל את גרסת הנתונים, כך שכתיבה למאגר מבטלת את כל התשובות"""
+        if handler is company_quarter:
+            args = (args[0], parse_quarter(args[1]))
+        key = (handler.__name__, args, tuple(sorted((k, tuple(v)) for k, v in query.items())), store_version())
+        return self.cache.get(key, lambda: handler(query, *args))
+
+    def warm(self):
+        """בניית תשובות הרשומות מראש (כל חברה × רבעון) לגרסת הנתונים הנוכחית"""
+        for period in periods():
+            for company in companies(period):
+                self.respond(company_quarter, (company, period), {})
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # כותרות וגוף נכתבים בנפרד; בלי זה keep-alive ממתין ל-delayed ACK
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body=b"", headers=None):
+        self.send_response(status)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status, message):
+        body = json.dumps({"error": message}, ensure_ascii=False).encode("utf-8")
+        self._send(status, body, {"Content-Type": "application/json; charset=utf-8"})
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/health":
+            return self._send(200, b'{"status":"ok"}', {"Content-Type": "application/json"})
+        query = parse_qs(url.query)
+        try:
+            handler, args = resolve(url.path)
+            body, etag = self.server.respond(handler, args, query)
+        except NotFound as e:
+            return self._error(404, str(e))
+        except BadRequest as e:
+            return self._error(400, str(e))
+        except Exception as e:
+            return self._error(500, f"{type(e).__name__}: {e}")
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag in [t.strip() for t in self.headers.get("If-None-Match", "").split(",")]:
+            return self._send(304, headers=headers)
+        self._send(200, body, {**headers, "Content-Type": "application/json; charset=utf-8"})
+
+
+# ==============================================================================
+# הרצה: תהליך אחד או מאגר עובדים (fork) על socket משותף
+# ==============================================================================
+def serve(host="127.0.0.1", port=DEFAULT_PORT, workers=1, cache_size=CACHE_SIZE):
+    sock = socket.create_server((host, port), backlog=128)
+    print(f"API on http://{host}:{sock.getsockname()[1]} ({workers} workers)", flush=True)
+
+    def run():
+        server = ApiServer((host, port), cache_size, bind_and_activate=False)
+        server.socket.close()
+        server.socket = sock
+        server.server_address = sock.getsockname()
+        server.warm()
+        server.serve_forever()
+
+    if workers <= 1:
+        return run()
+    children = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            try:
+                run()
+            finally:
+                os._exit(0)
+        children.append(pid)
+
+    def stop(*_):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        for pid in children:
+            os.waitpid(pid, 0)
+    except KeyboardInterrupt:
+        stop()
+    finally:
+        sock.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="שירות HTTP לשאילתות על מאגר המדדים")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--cache-size", type=int, default=CACHE_SIZE, help="מספר תשובות ב-LRU לכל עובד")
+    args = parser.parse_args(argv)
+    serve(args.host, args.port, args.workers, args.cache_size)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+"""קליטה אצוותית (Batch) של מחסן הדוחות: מאגר עובדים חסום + מגביל קצב משותף
+
+שימוש:
+    python -m engine.batch --quarter Q3 --workers 4 --rpm 15
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from engine.extraction import CHAINS, PARTIAL, extract_report, get_extraction_cache
+from engine.warehouse import REPORT_TYPES, WAREHOUSE_DIR, get_manifest
+
+Report = namedtuple("Report", ["company", "year", "quarter", "report_type", "path"])
+
+
+def iter_reports(root=WAREHOUSE_DIR, companies=None, years=None, quarters=None, report_types=REPORT_TYPES):
+    """הדוחות במחסן לפי סינון אופציונלי, דרך אינדקס המחסן (דוח מועדף אחד לכל חברה/רבעון/סוג)"""
+    for e in get_manifest(root).entries(companies, years, quarters, report_types, preferred_only=True):
+        yield Report(e.company, e.year, e.quarter, e.report_type, e.path)
+
+
+def find_report(company, year, quarter, report_type="Financial", root=WAREHOUSE_DIR):
+    """הנתיב לדוח המועדף עבור חברה/רבעון, או None"""
+    entry = get_manifest(root).resolve(company, year, quarter, report_type)
+    return entry.path if entry else None
+
+
+class TokenBucket:
+    """מגביל קצב משותף לכל העובדים; 429 עוצר את כל הדלי עד חלוף ה-Retry-After"""
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or max(1, int(rate_per_minute // 4))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.paused_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def penalize(self, seconds):
+        """השהיית כל הבקשות (בתגובה ל-429)"""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+
+
+def run_batch(reports, api_key, workers=4, rpm=15, use_cache=True, out_dir=None, progress=print, mode="hybrid"):
+    """מריץ חילוץ לכל הדוחות; קבצים זהים בתוכן נשלחים פעם אחת בלבד"""
+    limiter = TokenBucket(rpm)
+    cache = get_extraction_cache() if use_cache else None
+    groups = {}
+    for r in reports:
+        key = cache.content_hash(r.path) if cache else r.path
+        groups.setdefault(key, []).append(r)
+
+    results, done, total = [], 0, len(groups)
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        for key, group in groups.items():
+            futures[pool.submit(_extract_one, group[0].path, api_key, limiter, cache, use_cache, mode)] = group
+        for fut in as_completed(futures):
+            group = futures[fut]
+            data, status, elapsed = fut.result()
+            done += 1
+            for r in group:
+                results.append({**r._asdict(), "status": status, "seconds": round(elapsed, 2)})
+                if data is not None and out_dir: _write_output(out_dir, r, data)
+            icon = "✅" if status == "success" else "⚠️" if data is not None else "❌"
+            names = ", ".join(f"{r.company} {r.quarter} {r.report_type}" for r in group)
+            progress(f"[{done}/{total}] {icon} {names} ({elapsed:.1f}s){'' if status == 'success' else ' - ' + status}")
+    partial = sum(r["status"].startswith(PARTIAL) for r in results)
+    failed = [r for r in results if r["status"] != "success" and not r["status"].startswith(PARTIAL)]
+    progress(f"הסתיים: {len(results) - len(failed)}/{len(results)} דוחות ({partial} חלקיים), {total} קבצים ייחודיים, "
+             f"{time.monotonic() - started:.1f}s")
+    return results
+
+
+def _extract_one(path, api_key, limiter, cache, use_cache, mode):
+    t0 = time.monotonic()
+    try:
+        data, status = extract_report(path, api_key, mode=mode, cache=cache, use_cache=use_cache, limiter=limiter)
+    except Exception as e:
+        data, status = None, f"{type(e).__name__}: {e}"
+    return data, status, time.monotonic() - t0
+
+
+def _write_output(out_dir, r, data):
+    target = os.path.join(out_dir, r.company, r.year, r.quarter)
+    os.makedirs(target, exist_ok=True)
+    with open(os.path.join(target, f"{r.report_type}.json"), "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="חילוץ אצוותי של דוחות ממחסן הנתונים")
+    parser.add_argument("--root", default=WAREHOUSE_DIR)
+    parser.add_argument("--company", action="append", help="ניתן לחזור מספר פעמים")
+    parser.add_argument("--year", action="append")
+    parser.add_argument("--quarter", action="append", help="Q1..Q4")
+    parser.add_argument("--type", action="append", choices=REPORT_TYPES, dest="report_types")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rpm", type=float, default=15, help="מכסת בקשות לדקה (משותפת)")
+    parser.add_argument("--api-key", default=os.environ.get("GOOGLE_API_KEY"))
+    parser.add_argument("--mode", choices=sorted(CHAINS), default="hybrid", help="rules / llm / hybrid")
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--out", help="תיקייה לשמירת ה-JSON שחולץ")
+    args = parser.parse_args(argv)
+
+    if not args.api_key and args.mode != "rules":
+        parser.error("חסר API Key (--api-key או GOOGLE_API_KEY)")
+    reports = list(iter_reports(args.root, args.company, args.year, args.quarter, args.report_types or REPORT_TYPES))
+    if not reports:
+        print("לא נמצאו דוחות תואמים.")
+        return 1
+    results = run_batch(reports, args.api_key, args.workers, args.rpm, not args.no_cache, args.out, mode=args.mode)
+    return 0 if all(r["status"] == "success" for r in results) else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
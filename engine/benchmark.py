@@ -0,0 +1,85 @@
+"""מנוע בנצ'מארק וקטורי: כל השוק (חברות × רבעונים × מדדים) מחושב במעבר אחד ונשמר לפי גרסת הנתונים
+
+הפלט "מסודר" (tidy): שורה לכל (company, period, metric) עם value, missing, pct_rank,
+z_vs_median (מול חציון העמיתים באותו רבעון) ו-qoq_delta (מול הרבעון הקודם של אותה חברה).
+ערכים חסרים מסומנים במפורש ואינם מוחלפים בנתוני דמה.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+from engine.store import KEY_COLUMNS, TEXT_COLUMNS, load_store, period_key, store_version
+
+# עמודות מפת הסיכון בדשבורד
+SCATTER_METRICS = {"solvency.solvency_ratio": "Solvency", "core_kpis.roe": "ROE",
+                   "core_kpis.total_csm": "CSM", "financial_ratios.combined_ratio": "Combined"}
+
+_lock = threading.Lock()
+_market = {"version": None, "frame": None}
+
+
+def compute_market(frame):
+    """חישוב וקטורי לכל השוק"""
+    metric_cols = [c for c in frame.columns if c not in TEXT_COLUMNS]
+    values = frame[KEY_COLUMNS + metric_cols].melt(id_vars=KEY_COLUMNS, var_name="metric", value_name="value")
+    ordinals = {p: period_key(p)[0] * 4 + period_key(p)[1] for p in values["period"].unique()}
+    values["ordinal"] = values["period"].map(ordinals)
+    values["missing"] = values["value"].isna()
+
+    grp = values.groupby(["period", "metric"])["value"]
+    values["pct_rank"] = grp.rank(pct=True)
+    median, std = grp.transform("median"), grp.transform("std", ddof=0)
+    values["z_vs_median"] = (values["value"] - median) / std.replace(0, np.nan)
+
+    # QoQ: רק מול הרבעון הצמוד (ordinal-1), לא מול התצפית הקודמת הזמינה
+    idx = pd.MultiIndex.from_frame(values[["company", "metric", "ordinal"]])
+    by_key = pd.Series(values["value"].to_numpy(), index=idx)
+    prev_idx = pd.MultiIndex.from_arrays([values["company"], values["metric"], values["ordinal"] - 1])
+    values["qoq_delta"] = values["value"].to_numpy() - by_key.reindex(prev_idx).to_numpy()
+    return values.sort_values(["ordinal", "metric", "company"], kind="stable").reset_index(drop=True)
+
+
+def market_frame():
+    """תוצאת השוק המלאה, מחושבת פעם אחת לכל גרסת נתונים ומשותפת לכל התצוגות"""
+    version = store_version()
+    with _lock:
+        if _market["version"] != version:
+            _market["frame"] = compute_market(load_store())
+            _market["version"] = version
+        return _market["frame"]
+
+
+def benchmark(companies=None, periods=None, metrics=None):
+    """חיתוך של תוצאת השוק; שילובים מבוקשים ללא נתונים מופיעים עם missing=True"""
+    market = market_frame()
+    companies = list(companies) if companies is not None else list(dict.fromkeys(market["company"]))
+    periods = list(periods) if periods is not None else sorted(market["period"].unique(), key=period_key)
+    metrics = list(metrics) if metrics is not None else list(dict.fromkeys(market["metric"]))
+    full = pd.MultiIndex.from_product([companies, periods, metrics], names=["company", "period", "metric"])
+    out = market.set_index(["company", "period", "metric"]).reindex(full).reset_index()
+    out["missing"] = out["value"].isna()
+    return out
+
+
+def _scatter(tidy, companies):
+    wide = tidy.pivot(index="company", columns="metric", values="value").reindex(companies, columns=list(SCATTER_METRICS))
+    df = wide.rename(columns=SCATTER_METRICS)
+    df["missing"] = df.isna().any(axis=1)
+    return df.rename_axis("חברה").reset_index()
+
+
+def get_benchmark_data(selected_companies, quarter):
+    """נתוני מפת הסיכון לרבעון: עמודה לכל מדד + missing (חברה ללא אף נתון ברבעון)"""
+    return _scatter(benchmark(selected_companies, [quarter], list(SCATTER_METRICS)), selected_companies)
+
+
+def scatter_frames(periods=None):
+    """נתוני מפת הסיכון לכל רבעון (כל החברות שדיווחו בו) מחיתוך אחד של תוצאת השוק: {period: df}"""
+    market = market_frame()
+    sub = market[market["metric"].isin(list(SCATTER_METRICS))]
+    if periods is not None:
+        sub = sub[sub["period"].isin(list(periods))]
+    # סדר החברות כפי שהוזנו למאגר (כמו companies(period))
+    order = load_store().groupby("period", sort=False)["company"].agg(lambda s: list(dict.fromkeys(s)))
+    return {period: _scatter(group, order[period]) for period, group in sub.groupby("period", sort=False)}
@@ -0,0 +1,135 @@
+"""מטמון חילוץ מבוסס תוכן (Content-Addressed Extraction Cache)
+
+המפתח הוא hash של תוכן הקובץ + מרחב שמות (namespace) של הפרומפט. כל רשומה נושאת
+טביעת אצבע של הפרומפט/הסכמה - שינוי פרומפט פוסל את הרשומות הישנות.
+הגודל הכולל חסום, ופינוי מתבצע לפי LRU (הגישה האחרונה הוותיקה ביותר).
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from engine import CACHE_DIR
+
+DEFAULT_CACHE_PATH = os.path.join(CACHE_DIR, "extractions.sqlite")
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+CHUNK_SIZE = 1024 * 1024
+
+
+def fingerprint(*parts):
+    """טביעת אצבע יציבה לפרומפט/סכמה/מודל"""
+    h = hashlib.sha256()
+    for p in parts:
+        h.update(p if isinstance(p, bytes) else json.dumps(p, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+def hash_file(file_path):
+    """SHA-256 של תוכן הקובץ בקריאה בחלקים (ללא טעינת הקובץ כולו לזיכרון)"""
+    h = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ExtractionCache:
+    """מטמון JSON מאומת על הדיסק (SQLite) עם פינוי LRU וחסם גודל"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("""CREATE TABLE IF NOT EXISTS entries (
+                content_hash TEXT NOT NULL, namespace TEXT NOT NULL, fingerprint TEXT NOT NULL,
+                payload TEXT NOT NULL, size INTEGER NOT NULL, created_at REAL NOT NULL, last_access REAL NOT NULL,
+                PRIMARY KEY (content_hash, namespace))""")
+            db.execute("CREATE INDEX IF NOT EXISTS idx_entries_access ON entries(last_access)")
+            # hash לפי (נתיב, גודל, mtime) - חוסך קריאה מחדש של קבצים שלא השתנו
+            db.execute("""CREATE TABLE IF NOT EXISTS file_hashes (
+                path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, content_hash TEXT NOT NULL)""")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def content_hash(self, file_path):
+        """hash תוכן עם זיכרון לפי גודל/mtime"""
+        st = os.stat(file_path)
+        key = os.path.abspath(file_path)
+        with self._lock, self._connect() as db:
+            row = db.execute("SELECT size, mtime_ns, content_hash FROM file_hashes WHERE path=?", (key,)).fetchone()
+        if row and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+            return row[2]
+        digest = hash_file(file_path)
+        with self._lock, self._connect() as db:
+            db.execute("INSERT OR REPLACE INTO file_hashes VALUES (?, ?, ?, ?)", (key, st.st_size, st.st_mtime_ns, digest))
+        return digest
+
+    def get(self, content_hash, fp, namespace="full"):
+        """שליפה; רשומה עם טביעת אצבע שונה נמחקת (invalidate-on-prompt-change)"""
+        with self._lock, self._connect() as db:
+            row = db.execute("SELECT fingerprint, payload FROM entries WHERE content_hash=? AND namespace=?",
+                             (content_hash, namespace)).fetchone()
+            if row is None:
+                return None
+            if row[0] != fp:
+                db.execute("DELETE FROM entries WHERE content_hash=? AND namespace=?", (content_hash, namespace))
+                return None
+            db.execute("UPDATE entries SET last_access=? WHERE content_hash=? AND namespace=?",
+                       (time.time(), content_hash, namespace))
+        return json.loads(row[1])
+
+    def put(self, content_hash, fp, data, namespace="full"):
+        """שמירת תוצאה מאומתת ופינוי LRU מעבר לחסם הגודל"""
+        payload = json.dumps(data, ensure_ascii=False)
+        now = time.time()
+        with self._lock, self._connect() as db:
+            db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                       (content_hash, namespace, fp, payload, len(payload.encode("utf-8")), now, now))
+            self._evict(db)
+
+    def _evict(self, db):
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for h, ns, size in db.execute("SELECT content_hash, namespace, size FROM entries ORDER BY last_access").fetchall():
+            if total <= self.max_bytes:
+                break
+            db.execute("DELETE FROM entries WHERE content_hash=? AND namespace=?", (h, ns))
+            total -= size
+
+    def purge_stale(self, fp, namespace="full"):
+        """מחיקה יזומה של כל הרשומות שנוצרו בפרומפט/סכמה קודמים"""
+        with self._lock, self._connect() as db:
+            return db.execute("DELETE FROM entries WHERE namespace=? AND fingerprint!=?", (namespace, fp)).rowcount
+
+    def payloads(self, namespace=None):
+        """(content_hash, namespace, data) לכל הרשומות (או namespace אחד), לאימות בכמות"""
+        sql, args = "SELECT content_hash, namespace, payload FROM entries", ()
+        if namespace is not None:
+            sql, args = sql + " WHERE namespace=?", (namespace,)
+        with self._lock, self._connect() as db:
+            rows = db.execute(sql, args).fetchall()
+        return [(h, ns, json.loads(payload)) for h, ns, payload in rows]
+
+    def stats(self):
+        with self._lock, self._connect() as db:
+            n, size = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {"entries": n, "bytes": size, "max_bytes": self.max_bytes}
+
+
+_default_cache = None
+
+
+def get_default_cache():
+    """מופע משותף לתהליך"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ExtractionCache()
+    return _default_cache
@@ -0,0 +1,167 @@
+"""גרפי תצוגת החברה (מפל CSM, עכביש, הרכב הון, הקצאת נכסים, מפת סיכון-תשואה, מגמות) - ללא תלות ב-Streamlit
+
+משמשים את הדשבורד (app.py) ואת בניית הדוחות הסטטיים (engine.report). plotly נטען רק בקריאה הראשונה.
+"""
+import pandas as pd
+
+from engine.benchmark import get_benchmark_data
+from engine.memo import memo
+
+
+@memo("figure")
+def create_waterfall(d):
+    """יצירת גרף מפל ל-CSM"""
+    import plotly.graph_objects as go
+    c = d['consistency_check']
+    start = c.get('opening_csm', 0)
+    new_biz = c.get('new_business_csm', 0)
+    release = c.get('csm_release', 0)
+    end = d['core_kpis']['total_csm']
+
+    fig = go.Figure(go.Waterfall(
+        name = "20", orientation = "v",
+        measure = ["relative", "relative", "relative", "total"],
+        x = ["פתיחה", "עסקים חדשים", "שחרור לרווח", "סגירה"],
+        textposition = "outside",
+        text = [f"{start:,.0f}", f"+{new_biz}", f"-{release}", f"{end:,.0f}"],
+        y = [start, new_biz, -release, end],
+        connector = {"line":{"color":"rgb(63, 63, 63)"}},
+        decreasing = {"marker":{"color":"#ff4b4b"}},
+        increasing = {"marker":{"color":"#00ff00"}},
+        totals = {"marker":{"color":"#2e7bcf"}}
+    ))
+    fig.update_layout(title="תנועה ב-CSM (מיליוני ש\"ח)", template="plotly_dark", height=400, showlegend=False)
+    return fig
+
+
+def _radar_values(d):
+    return [
+        d['solvency']['solvency_ratio']/200,
+        d['core_kpis']['roe']/30,
+        (100-d['investment_mix']['unquoted_pct'])/100,
+        (100-(d['financial_ratios']['combined_ratio']-70))/100,
+        d['investment_mix']['real_yield']/10
+    ]
+
+
+@memo("figure")
+def create_radar_chart(company_data, overlays=None):
+    """יצירת תרשים עכביש פרופיל סיכון; overlays - {שם: רשומה מקוננת} (למשל חציון קבוצת עמיתים) כשכבה מקווקוות"""
+    import plotly.graph_objects as go
+    categories = ['סולבנסי', 'ROE', 'נזילות (1-לא סחיר)', 'רווחיות (1-CR)', 'תשואה']
+    val_c = _radar_values(company_data)
+    fig = go.Figure()
+    for name, record in (overlays or {}).items():
+        # חציון חסר (None) -> NaN, כך שרק הציר החסר נשמט מהשכבה
+        filled = {b: {k: float("nan") if x is None else x for k, x in sub.items()}
+                  for b, sub in record.items() if isinstance(sub, dict)}
+        fig.add_trace(go.Scatterpolar(r=_radar_values(filled), theta=categories, name=name, line={"dash": "dash", "color": "#2e7bcf"}))
+    fig.add_trace(go.Scatterpolar(r=val_c, theta=categories, fill='toself', name='החברה הנבחרת', line_color='#00ff00'))
+    fig.update_layout(polar=dict(radialaxis=dict(visible=True, range=[0, 1])), template="plotly_dark", title="פרופיל סיכון-ביצוע")
+    return fig
+
+
+@memo("figure")
+def create_models_pie(models):
+    """גרף דונאט למודלי המדידה"""
+    import plotly.express as px
+    return px.pie(values=list(models.values()), names=list(models.keys()), hole=0.5, title="מודלי מדידה", color_discrete_sequence=px.colors.sequential.RdBu)
+
+
+@memo("figure")
+def create_capital_chart(sol):
+    """גרף איכות הון (Tier 1 vs Tier 2)"""
+    import plotly.express as px
+    df_cap = pd.DataFrame({
+        "סוג הון": ["Tier 1 (ליבה)", "Tier 2 (משני)"],
+        "סכום": [sol.get('tier1_capital',0), sol.get('tier2_capital',0)]
+    })
+    fig_cap = px.bar(df_cap, x="סוג הון", y="סכום", color="סוג הון", title="הרכב ההון המוכר", text="סכום")
+    fig_cap.update_traces(texttemplate='%{text:,.0f}', textposition='outside')
+    return fig_cap
+
+
+@memo("figure")
+def create_allocation_pie(i):
+    """הקצאת נכסים"""
+    import plotly.express as px
+    vals = [i.get('govt_bonds_pct',0), i.get('corp_bonds_pct',0), i.get('stocks_pct',0), i.get('real_estate_pct',0), i.get('unquoted_pct',0)]
+    names = ["אגח ממשלתי", "אגח קונצרני", "מניות", "נדל\"ן", "לא סחיר (אשראי/קרנות)"]
+    return px.pie(values=vals, names=names, hole=0.4, title="הקצאת נכסים (Asset Allocation)")
+
+
+@memo("data")
+def get_market_benchmark(selected_companies, quarter):
+    """נתוני הבנצ'מארק לרבעון (לפי גרסת הנתונים)"""
+    return get_benchmark_data(selected_companies, quarter)
+
+
+@memo("figure")
+def create_benchmark_chart(selected_companies, quarter):
+    """מפת סיכון-תשואה"""
+    return benchmark_scatter(get_market_benchmark(selected_companies, quarter), quarter)
+
+
+def benchmark_scatter(df_bench, quarter):
+    """מפת סיכון-תשואה מנתוני בנצ'מארק מוכנים (get_benchmark_data / scatter_frames)"""
+    import plotly.express as px
+    df_bench = df_bench[~df_bench["missing"]]
+    return px.scatter(
+        df_bench,
+        x="Solvency",
+        y="ROE",
+        size="CSM",
+        color="Combined",
+        text="חברה",
+        title=f"מפת סיכון-תשואה ({quarter}): Solvency (X) vs ROE (Y)",
+        labels={"Solvency": "יחס סולבנסי (%)", "ROE": "תשואה להון (%)", "Combined": "Combined Ratio"},
+        color_continuous_scale="RdYlGn_r", # ירוק לנמוך (טוב), אדום לגבוה (רע) עבור Combined Ratio
+        size_max=60
+    )
+
+
+TREND_VIEWS = {"value": "רמה", "qoq": "שינוי רבעוני (QoQ)", "yoy": "שינוי שנתי (YoY)", "roll_mean": "ממוצע נע (4 רבעונים)",
+               "roll_std": "תנודתיות (סטיית תקן נעה)", "annualized": "בחישוב שנתי"}
+TREND_TRACES = 20  # מעבר לזה כל השוק מצויר כעקומה אחת (עם שם החברה בריחוף)
+
+
+@memo("figure")
+def create_trend_chart(metric, view, company, horizon=4):
+    """היסטוריית כל המבטחים בגרף אחד; החברה הנבחרת מודגשת, ולמדדים עם תחזית - המשך מקווקו עם רצועת 95%"""
+    import plotly.graph_objects as go
+    from engine.timeseries import PROJECTED, SERIES_METRICS, get_timeseries
+
+    ts = get_timeseries()
+    df = ts.frame(metric)
+    df = df[df[view].notna()]
+    fig = go.Figure()
+    others = df[df["company"] != company]
+    if others["company"].nunique() <= TREND_TRACES:
+        for name, g in others.groupby("company", sort=False):
+            fig.add_trace(go.Scatter(x=g["period"], y=g[view], mode="lines", name=name, opacity=0.5, line={"width": 1.5}))
+    else:
+        # עקומה אחת עם הפסקות (None) בין חברות
+        groups = list(others.groupby("company", sort=False))
+        x = [v for _, g in groups for v in g["period"].tolist() + [None]]
+        y = [v for _, g in groups for v in g[view].tolist() + [None]]
+        text = [name for name, g in groups for _ in range(len(g) + 1)]
+        fig.add_trace(go.Scatter(x=x, y=y, text=text, hovertemplate="%{text}: %{y:,.1f}<extra></extra>",
+                                 mode="lines", name="שאר השוק", line={"width": 1, "color": "rgba(150,150,150,0.35)"}))
+    own = df[df["company"] == company]
+    fig.add_trace(go.Scatter(x=own["period"], y=own[view], mode="lines+markers", name=company,
+                             line={"width": 4, "color": "#00ff00"}))
+    periods = ts.periods
+    if view == "value" and metric in PROJECTED and not own.empty:
+        proj = ts.project(metric, horizon, companies=[company])
+        if not proj.empty:
+            periods = periods + proj["period"].tolist()
+            x = [own["period"].iloc[-1]] + proj["period"].tolist()
+            fig.add_trace(go.Scatter(x=proj["period"].tolist() + proj["period"].tolist()[::-1],
+                                     y=proj["upper"].tolist() + proj["lower"].tolist()[::-1], fill="toself",
+                                     fillcolor="rgba(0,255,0,0.12)", line={"width": 0}, name="רצועת 95%", hoverinfo="skip"))
+            fig.add_trace(go.Scatter(x=x, y=[own["value"].iloc[-1]] + proj["value"].tolist(), mode="lines+markers",
+                                     name="תחזית", line={"width": 3, "dash": "dash", "color": "#00ff00"}))
+    fig.update_xaxes(categoryorder="array", categoryarray=periods)
+    fig.update_layout(title=f"{SERIES_METRICS[metric]} - {TREND_VIEWS[view]}", template="plotly_dark", height=480,
+                      hovermode="closest")
+    return fig
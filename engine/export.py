@@ -0,0 +1,221 @@
+"""ייצוא כל השוק (כל החברות × כל הרבעונים × כל הבלוקים + דגלים) ל-xlsx / CSV / Parquet
+
+המאגר עצמו כבר בזיכרון (load_store); הכותבים עוברים עליו לפי סדר הרבעונים בחלקים של עד CHUNK_ROWS
+שורות ומצרפים את הדגלים לכל חלק בנפרד, כך שהזיכרון הנוסף חסום בגודל חלק ולא בגודל השוק (מלבד
+השורות שנבחרו בסינון, שמועתקות פעם אחת):
+xlsx במצב constant_memory, Parquet בקבוצות שורות (row groups) ו-CSV בחלקים. התוצר נשמר במטמון
+לפי גרסת הנתונים והסינון, כך שהורדה חוזרת מחזירה את הקובץ הקיים מיד.
+
+שימוש:
+    python -m engine.export --format xlsx
+    python -m engine.export --format all --out exports/
+    python -m engine.export --format csv --period "Q3 2025" --company Harel
+"""
+import argparse
+import glob
+import math
+import os
+import shutil
+import sys
+
+import numpy as np
+import pandas as pd
+
+from engine import CACHE_DIR
+from engine.cache import fingerprint
+from engine.rules import get_rule_index
+from engine.store import TEXT_COLUMNS, load_store, period_key, store_version
+
+EXPORT_DIR = os.path.join(CACHE_DIR, "exports")
+FORMATS = ("xlsx", "csv", "parquet")
+CHUNK_ROWS = 5000
+# סדר הגיליונות; עמודות שאינן שייכות לאף בלוק נכנסות ל-extra
+BLOCKS = ("core_kpis", "solvency", "ifrs17_segments", "investment_mix", "financial_ratios", "consistency_check", "extra")
+MIME_TYPES = {"xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+              "csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+
+
+def _market(companies=None, periods=None):
+    """השורות המסוננות (ללא מיון וללא העתקה כשאין סינון - הסדר נקבע ב-_chunks)"""
+    frame = load_store()
+    if companies:
+        frame = frame[frame["company"].isin(companies)]
+    if periods:
+        frame = frame[frame["period"].isin(periods)]
+    return frame
+
+
+def _block_columns(frame):
+    metrics = [c for c in frame.columns if c not in TEXT_COLUMNS]
+    return {b: [c for c in metrics if c.split(".", 1)[0] == b] for b in BLOCKS}
+
+
+def _chunks(frame):
+    """(רבעונים, מיקומי שורות) לפי סדר הרבעונים, עד CHUNK_ROWS שורות בחלק: רבעונים קטנים מאוחדים
+    לחלק אחד ורבעון גדול מפוצל"""
+    groups = frame.groupby("period", sort=False).indices
+    periods, parts, size = [], [], 0
+    for period in sorted(groups, key=period_key):
+        for start in range(0, len(groups[period]), CHUNK_ROWS):
+            part = groups[period][start:start + CHUNK_ROWS]
+            if size + len(part) > CHUNK_ROWS:
+                yield tuple(periods), np.concatenate(parts)
+                periods, parts, size = [], [], 0
+            if not periods or periods[-1] != period: periods.append(period)
+            parts.append(part)
+            size += len(part)
+    if parts:
+        yield tuple(periods), np.concatenate(parts)
+
+
+def _rule_chunks(frame, chunks=None):
+    """(מיקומי שורות, תוצאות הכללים שלהן) - התוצאות נשלפות רק לרבעונים של החלק"""
+    results = get_rule_index().results
+    by_period = results.groupby("period", sort=False).indices
+    company, period = frame["company"].to_numpy(), frame["period"].to_numpy()
+    current = None
+    for periods, rows in chunks or _chunks(frame):
+        if current != periods:
+            current = periods
+            period_results = results.take(np.concatenate([by_period.get(p, np.empty(0, np.intp)) for p in periods]))
+            result_keys = pd.MultiIndex.from_arrays([period_results["company"], period_results["period"]])
+        yield rows, period_results[result_keys.isin(pd.MultiIndex.from_arrays([company[rows], period[rows]]))]
+
+
+def _flags(results):
+    """דגלים שנדלקו + סטטוס בדיקות הציות"""
+    flags = results[(results["kind"] == "flag") & (results["status"] == True)]  # noqa: E712
+    checks = results[results["kind"] == "check"]
+    return flags, checks
+
+
+def _cell(value):
+    if value is None or isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+# ==============================================================================
+# כותבים
+# ==============================================================================
+def write_xlsx(frame, path):
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(path, {"constant_memory": True, "nan_inf_to_errors": True})
+    header = workbook.add_format({"bold": True, "bg_color": "#1c2e4a", "font_color": "#ffffff"})
+    number = workbook.add_format({"num_format": "#,##0.##"})
+
+    def sheet(name, columns, rows):
+        ws = workbook.add_worksheet(name[:31])
+        ws.right_to_left()
+        ws.freeze_panes(1, 2)
+        ws.write_row(0, 0, columns, header)
+        for r, row in enumerate(rows, start=1):
+            for c, value in enumerate(row):
+                value = _cell(value)
+                if value is None: continue
+                if isinstance(value, float): ws.write_number(r, c, value, number)
+                else: ws.write(r, c, value)
+
+    chunks = list(_chunks(frame))  # מיקומי השורות בלבד; משותף לכל הגיליונות
+    for block, cols in _block_columns(frame).items():
+        if not cols: continue
+        labels = ["company", "period", "source"] + [c.split(".", 1)[1] for c in cols]
+        positions = frame.columns.get_indexer(["company", "period", "source"] + cols)
+        sheet(block, labels, (row for _, rows in chunks
+                              for row in frame.iloc[rows, positions].itertuples(index=False, name=None)))
+    sheet("red_flags", ["period", "company", "level", "rule", "message"],
+          (row for _, results in _rule_chunks(frame, chunks)
+           for row in _flags(results)[0][["period", "company", "level", "rule", "message"]].itertuples(index=False, name=None)))
+    sheet("compliance", ["period", "company", "check", "status"],
+          ((p, c, m, {True: "pass", False: "fail"}.get(s, "no data"))
+           for _, results in _rule_chunks(frame, chunks)
+           for p, c, m, s in _flags(results)[1][["period", "company", "message", "status"]].itertuples(index=False, name=None)))
+    parts = (frame.iloc[rows, frame.columns.get_indexer(["company", "period", "notes"])]
+             for _, rows in chunks) if "notes" in frame else ()
+    sheet("notes", ["company", "period", "notes"],
+          (row for part in parts for row in part[part["notes"].notna()].itertuples(index=False, name=None)))
+    workbook.close()
+
+
+def _wide_chunks(frame):
+    """הטבלה הרחבה + עמודת דגלים (CSV/Parquet הם קובץ אחד), חלק אחר חלק"""
+    for rows, results in _rule_chunks(frame):
+        flags, _ = _flags(results)
+        joined = flags.groupby(["company", "period"])["message"].agg(" | ".join).rename("red_flags")
+        yield frame.iloc[rows].join(joined, on=["company", "period"])
+
+
+def write_csv(frame, path):
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        header = True
+        for part in _wide_chunks(frame):
+            part.to_csv(f, index=False, header=header)
+            header = False
+        if header:
+            frame.iloc[0:0].assign(red_flags=None).to_csv(f, index=False)
+
+
+def write_parquet(frame, path):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # הסכמה מטיפוסי המאגר (ולא מהחלק הראשון), כדי שעמודה ריקה בחלק אחד לא תקבע טיפוס null
+    schema = pa.Schema.from_pandas(frame.iloc[0:0], preserve_index=False)
+    fields = [f.with_type(pa.string()) if pa.types.is_null(f.type) else f for f in schema]
+    schema = pa.schema(fields + [pa.field("red_flags", pa.string())], metadata=schema.metadata)
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        for part in _wide_chunks(frame):
+            writer.write_table(pa.Table.from_pandas(part, schema=schema, preserve_index=False))
+
+
+WRITERS = {"xlsx": write_xlsx, "csv": write_csv, "parquet": write_parquet}
+
+
+def export_market(fmt="xlsx", companies=None, periods=None, out=None):
+    """נתיב לתוצר; נבנה רק כשאין תוצר לגרסת הנתונים והסינון הנוכחיים"""
+    if fmt not in WRITERS:
+        raise ValueError(f"פורמט לא נתמך: {fmt}")
+    version = store_version()
+    key = fingerprint(version, sorted(companies or []), sorted(periods or []))[:16]
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    path = os.path.join(EXPORT_DIR, f"market_{key}.{fmt}")
+    if not os.path.exists(path):
+        tmp = f"{path}.tmp{os.getpid()}"
+        try:
+            WRITERS[fmt](_market(companies, periods), tmp)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp): os.remove(tmp)
+        _prune(fmt, keep=path)
+    if out:
+        target = os.path.join(out, f"market.{fmt}") if os.path.isdir(out) else out
+        shutil.copyfile(path, target)
+        return target
+    return path
+
+
+def _prune(fmt, keep, max_files=8):
+    """השארת התוצרים האחרונים בלבד לכל פורמט"""
+    files = sorted(glob.glob(os.path.join(EXPORT_DIR, f"market_*.{fmt}")), key=os.path.getmtime, reverse=True)
+    for old in files[max_files:]:
+        if old != keep: os.remove(old)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ייצוא נתוני כל השוק")
+    parser.add_argument("--format", choices=FORMATS + ("all",), default="xlsx")
+    parser.add_argument("--company", action="append", help="ניתן לחזור מספר פעמים")
+    parser.add_argument("--period", action="append", help='למשל "Q3 2025"')
+    parser.add_argument("--out", help="קובץ או תיקיית יעד (ברירת מחדל: המטמון)")
+    args = parser.parse_args(argv)
+
+    if args.out and args.format == "all":
+        os.makedirs(args.out, exist_ok=True)
+    for fmt in FORMATS if args.format == "all" else (args.format,):
+        print(export_market(fmt, args.company, args.period, args.out))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,228 @@
+"""מנוע חילוץ AI מדוחות IFRS 17 (Gemini) עם מטמון מבוסס תוכן"""
+import os
+import time
+from datetime import datetime
+
+from engine.cache import fingerprint, get_default_cache, hash_file
+from engine.gemini_client import GEMINI_MODEL, UPLOAD_THRESHOLD, get_client
+from engine.local_extractor import extract_report_local
+from engine.pdf_filter import prefilter as prefilter_pages
+from engine.telemetry import count, span
+from engine.validation import extract_json, prepare
+
+# סכמה (Schema) למנוע ה-AI
+IFRS17_SCHEMA = {
+    "type": "object",
+    "required": ["core_kpis", "ifrs17_segments", "investment_mix", "financial_ratios", "solvency", "consistency_check", "meta"],
+    "properties": {
+        "core_kpis": { "type": "object", "properties": { "net_profit": {"type": ["number", "null"]}, "total_csm": {"type": ["number", "null"]}, "roe": {"type": ["number", "null"]}, "gross_premiums": {"type": ["number", "null"]}, "total_assets": {"type": ["number", "null"]} } },
+        "ifrs17_segments": { "type": "object", "properties": { "life_csm": {"type": ["number", "null"]}, "health_csm": {"type": ["number", "null"]}, "general_csm": {"type": ["number", "null"]}, "onerous_contracts": {"type": ["number", "null"]}, "new_business_csm": {"type": ["number", "null"]} } },
+        "investment_mix": { "type": "object", "properties": { "govt_bonds_pct": {"type": ["number", "null"]}, "corp_bonds_pct": {"type": ["number", "null"]}, "stocks_pct": {"type": ["number", "null"]}, "real_estate_pct": {"type": ["number", "null"]}, "unquoted_pct": {"type": ["number", "null"]}, "real_yield": {"type": ["number", "null"]} } },
+        "financial_ratios": { "type": "object", "properties": { "loss_ratio": {"type": ["number", "null"]}, "combined_ratio": {"type": ["number", "null"]}, "lcr": {"type": ["number", "null"]}, "leverage": {"type": ["number", "null"]}, "roa": {"type": ["number", "null"]} } },
+        "solvency": { "type": "object", "properties": { "solvency_ratio": {"type": ["number", "null"]}, "tier1_capital": {"type": ["number", "null"]}, "tier2_capital": {"type": ["number", "null"]}, "scr": {"type": ["number", "null"]} } },
+        "consistency_check": { "type": "object", "properties": { "opening_csm": {"type": ["number", "null"]}, "new_business_csm": {"type": ["number", "null"]}, "csm_release": {"type": ["number", "null"]}, "closing_csm": {"type": ["number", "null"]} } },
+        "meta": { "type": "object", "properties": { "confidence": {"type": "number"}, "extraction_time": {"type": "string"} } }
+    }
+}
+
+SYSTEM_PROMPT = """
+    You are an expert Israeli Insurance Regulator. Extract data from Hebrew IFRS 17 reports.
+    CRITICAL:
+    1. 'total_csm': "יתרת מרווח שירות חוזי".
+    2. 'new_business_csm': "תוספת בגין חוזים חדשים".
+    3. 'onerous_contracts': "רכיב הפסד".
+    4. 'solvency_ratio': Economic ratio ("בתקופת הפריסה").
+    5. 'unquoted_pct': Percentage of Level 3 assets ("רמה 3").
+    OUTPUT: JSON matching schema. Return null if missing.
+    """
+
+# כל שינוי בפרומפט, בסכמה או במודל משנה את טביעת האצבע ופוסל את המטמון
+PROMPT_FINGERPRINT = fingerprint(SYSTEM_PROMPT, IFRS17_SCHEMA, GEMINI_MODEL)
+_purged = False
+
+
+def get_extraction_cache():
+    """מטמון ברירת המחדל; בשימוש הראשון בתהליך נמחקות רשומות של פרומפטים קודמים"""
+    global _purged
+    cache = get_default_cache()
+    if not _purged:
+        cache.purge_stale(PROMPT_FINGERPRINT)
+        _purged = True
+    return cache
+
+
+def schema_fields(schema=IFRS17_SCHEMA):
+    """כל נתיבי השדות המספריים בסכמה ("block.field"), ללא meta"""
+    return [f"{block}.{field}" for block, spec in schema["properties"].items() if block != "meta"
+            for field in spec.get("properties", {})]
+
+
+def partial_prompt(fields):
+    """פרומפט + סכמה + טביעת אצבע + namespace לחילוץ חלקי של שדות מסוימים בלבד"""
+    fields = sorted(fields)
+    blocks = {}
+    for path in fields:
+        block, field = path.split(".", 1)
+        blocks.setdefault(block, {})[field] = IFRS17_SCHEMA["properties"][block]["properties"][field]
+    schema = {"type": "object", "required": list(blocks) + ["meta"],
+              "properties": {**{b: {"type": "object", "properties": p} for b, p in blocks.items()},
+                             "meta": IFRS17_SCHEMA["properties"]["meta"]}}
+    prompt = SYSTEM_PROMPT + f"    ONLY extract these fields (block.field): {', '.join(fields)}.\n"
+    fp = fingerprint(prompt, schema, GEMINI_MODEL)
+    return prompt, schema, fp, "partial:" + fingerprint(fields)[:16]
+
+
+def analyze_report(file_path, api_key, retries=3, cache=None, use_cache=True, limiter=None, client=None, upload=None,
+                   prefilter="text", fields=None):
+    """מנוע AI מוקשח: מחזיר (data, status); קובץ שכבר חולץ נשלף מהמטמון ללא קריאת API.
+    limiter (אופציונלי) הוא מגביל קצב משותף עם acquire()/penalize(seconds).
+    upload=None בוחר אוטומטית: קבצים גדולים מועלים פעם אחת ל-File API, השאר נשלחים inline בזרימה.
+    prefilter: "text" (טקסט העמודים הרלוונטיים - הקטן ביותר), "pdf" (PDF מצומצם לאותם עמודים) או None (הקובץ המלא).
+    fields: רשימת "block.field" לחילוץ חלקי (פרומפט וסכמה מצומצמים, רשומת מטמון נפרדת)."""
+    if not os.path.exists(file_path): return None, f"קובץ חסר: {file_path}"
+    prompt, schema, fp, namespace = SYSTEM_PROMPT, IFRS17_SCHEMA, PROMPT_FINGERPRINT, "full"
+    if fields: prompt, schema, fp, namespace = partial_prompt(fields)
+    content_hash = None
+    if use_cache:
+        cache = cache or get_extraction_cache()
+        with span("extract.cache_lookup", namespace=namespace) as s:
+            content_hash = cache.content_hash(file_path)
+            hit = cache.get(content_hash, fp, namespace)
+            s.set(hit=hit is not None)
+        count("extract.cache", result="hit" if hit is not None else "miss")
+        if hit is not None:
+            hit["meta"]["cached"] = True
+            return hit, "success"
+
+    client = client or get_client(api_key)
+    send_path, send_text = file_path, None
+    if prefilter:
+        with span("extract.prefilter", mode=prefilter) as s:
+            reduced_path, send_text = prefilter_pages(file_path, content_hash or hash_file(file_path), prefilter)
+            send_path = reduced_path or file_path
+            s.set(bytes=len(send_text.encode("utf-8")) if send_text is not None else os.path.getsize(send_path))
+    if upload is None: upload = send_text is None and os.path.getsize(send_path) >= UPLOAD_THRESHOLD
+    upload_key = content_hash if send_path == file_path else None
+    file_uri, last_error = None, None
+
+    for attempt in range(retries):
+        if attempt: count("extract.retries", namespace=namespace)
+        if limiter:
+            with span("extract.rate_wait"):
+                limiter.acquire()
+        try:
+            route = "text" if send_text is not None else "upload" if upload else "inline"
+            with span("http.roundtrip", route=route, attempt=attempt + 1) as s:
+                if send_text is not None:
+                    response = client.generate_text(prompt, send_text)
+                elif upload:
+                    file_uri = file_uri or client.upload_file(send_path, upload_key)
+                    response = client.generate_from_uri(prompt, file_uri)
+                else:
+                    response = client.generate_inline(prompt, send_path)
+                s.set(status=response.status_code, bytes=len(response.content))
+            count("http.responses", status=response.status_code)
+            if response.status_code == 200:
+                with span("extract.json_parse"):
+                    raw = response.json()['candidates'][0]['content']['parts'][0]['text']
+                    data = extract_json(raw)
+                with span("extract.schema_validate") as s:
+                    data, errors, coerced = prepare(data, schema)
+                    s.set(errors=len(errors), coerced=len(coerced))
+                if errors:
+                    # כל השגיאות במסמך; ניסיון נוסף (פלט המודל אינו דטרמיניסטי)
+                    count("extract.invalid", namespace=namespace)
+                    last_error = "Schema Error: " + "; ".join(errors[:5])
+                    continue
+                data["meta"]["extraction_time"] = datetime.utcnow().isoformat()
+                if coerced: data["meta"]["coerced"] = coerced
+                if use_cache: cache.put(content_hash, fp, data, namespace)
+                return data, "success"
+            elif response.status_code == 429 and limiter:
+                limiter.penalize(_retry_after(response, 2**attempt)); continue
+            elif response.status_code in [429, 500, 503]:
+                with span("extract.backoff", seconds=2**attempt):
+                    time.sleep(2**attempt)
+                continue
+            elif upload and response.status_code in [403, 404]:
+                # URI שפג תוקפו - העלאה מחדש בניסיון הבא
+                client.forget_upload(send_path, upload_key); file_uri = None; continue
+            else: return None, f"API Error: {response.text}"
+        except Exception as e:
+            count("extract.errors", type=type(e).__name__)
+            with span("extract.backoff", seconds=1):
+                time.sleep(1)
+    return None, last_error or "Connection Failed"
+
+
+def _retry_after(response, default):
+    """שניות המתנה לפי כותרת Retry-After (אם קיימת)"""
+    try:
+        return float(response.headers.get("Retry-After", default))
+    except (TypeError, ValueError):
+        return default
+
+
+# ==============================================================================
+# שרשרת מחלצים (Extractor Chain): כללים מקומיים -> Gemini לשדות החסרים בלבד
+# ==============================================================================
+
+def rules_extractor(file_path, missing, api_key=None, **kwargs):
+    """מחלץ מקומי: {path: (value, confidence)}"""
+    found = extract_report_local(file_path)
+    return {k: v for k, v in found.items() if k in missing}, "success"
+
+
+def gemini_extractor(file_path, missing, api_key=None, **kwargs):
+    """Gemini: כשחסר הכל - פרומפט מלא (ומטמון מלא), אחרת פרומפט חלקי לשדות החסרים"""
+    if not api_key: return {}, "חסר API Key"
+    partial = set(missing) != set(schema_fields())
+    data, status = analyze_report(file_path, api_key, fields=sorted(missing) if partial else None, **kwargs)
+    if status != "success": return {}, status
+    conf = data.get("meta", {}).get("confidence", 0.7)
+    out = {}
+    for path in missing:
+        block, field = path.split(".", 1)
+        value = (data.get(block) or {}).get(field)
+        if value is not None: out[path] = (value, conf)
+    return out, status
+
+
+EXTRACTORS = {"rules": rules_extractor, "gemini": gemini_extractor}
+PARTIAL = "partial: "  # קידומת סטטוס לתוצאה חלקית (meta.errors מפרט את השלבים שנכשלו)
+CHAINS = {"rules": ["rules"], "llm": ["gemini"], "hybrid": ["rules", "gemini"]}
+
+
+def extract_report(file_path, api_key=None, mode="hybrid", min_confidence=0.8, chain=None, progress=None, **kwargs):
+    """מריץ את שרשרת המחלצים לפי הסדר; כל מחלץ מקבל רק את השדות שעדיין ריקים או בביטחון נמוך.
+    meta.sources ממפה כל שדה למנוע שמילא אותו. progress(fraction, message) נקרא לפני כל מחלץ.
+    סטטוס: "success", "partial: <שלב>: <שגיאה>" (יש נתונים אך שלב נכשל; גם ב-meta.errors), או שגיאה ללא נתונים."""
+    if not os.path.exists(file_path): return None, f"קובץ חסר: {file_path}"
+    values, errors = {}, {}
+    all_fields = schema_fields()
+    chain = chain or CHAINS[mode]
+    for step, name in enumerate(chain):
+        missing = [f for f in all_fields if f not in values or values[f][1] < min_confidence]
+        if not missing: break
+        if progress: progress(step / len(chain), f"{name}: {len(missing)} שדות")
+        found, status = EXTRACTORS[name](file_path, missing, api_key=api_key, **kwargs)
+        if status != "success": errors[name] = status
+        for path, (value, conf) in found.items():
+            if path not in values or conf > values[path][1]:
+                values[path] = (value, conf, name)
+    if not values:
+        return None, "; ".join(errors.values()) or "לא חולצו נתונים"
+
+    data = {block: {} for block in IFRS17_SCHEMA["properties"] if block != "meta"}
+    for path in all_fields:
+        block, field = path.split(".", 1)
+        data[block][field] = values[path][0] if path in values else None
+    confs = [v[1] for v in values.values()]
+    data["meta"] = {"confidence": round(sum(confs) / len(confs), 3),
+                    "extraction_time": datetime.utcnow().isoformat(),
+                    "sources": {path: v[2] for path, v in sorted(values.items())}}
+    if errors:
+        # תוצאה חלקית: שלב בשרשרת נכשל אחרי ששלב קודם מילא חלק מהשדות
+        data["meta"]["errors"] = errors
+        return data, PARTIAL + "; ".join(f"{name}: {err}" for name, err in errors.items())
+    return data, "success"
@@ -0,0 +1,148 @@
+"""שכבת לקוח HTTP ל-Gemini: Session עם מאגר חיבורים, timeouts מפורשים, גוף בקשה בזרימה
+(base64 בחלקים, ללא שלושה עותקים של ה-PDF בזיכרון) והעלאה חד-פעמית דרך File API.
+
+כתובת הבסיס ניתנת להחלפה (GEMINI_BASE_URL) - למשל לשרת הדמה ב-engine.stub_gemini.
+"""
+import base64
+import json
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from engine.telemetry import record
+
+GEMINI_MODEL = "gemini-2.0-flash"
+DEFAULT_BASE_URL = os.environ.get("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com")
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 180
+# קבצים מעל הסף מועלים פעם אחת ומוזכרים לפי URI בכל ניסיון/פרומפט
+UPLOAD_THRESHOLD = 2 * 1024 * 1024
+# קבצים ב-File API נשמרים 48 שעות; משאירים מרווח ביטחון
+UPLOAD_TTL = 46 * 3600
+B64_CHUNK = 3 * 64 * 1024
+
+
+class StreamingInlineBody:
+    """גוף JSON של generateContent שבו ה-PDF מקודד ל-base64 תוך כדי שליחה.
+    האורך ידוע מראש, כך שנשלח Content-Length ולא chunked encoding."""
+
+    def __init__(self, prompt, file_path, mime_type="application/pdf"):
+        self.file_path = file_path
+        head = {"contents": [{"parts": [{"text": prompt}, {"inline_data": {"mime_type": mime_type, "data": "\x00"}}]}]}
+        self.prefix, self.suffix = (s.encode("utf-8") for s in json.dumps(head).split('"\\u0000"'))
+        self.prefix += b'"'
+        self.suffix = b'"' + self.suffix
+        size = os.path.getsize(file_path)
+        self._length = len(self.prefix) + 4 * ((size + 2) // 3) + len(self.suffix)
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        # זמני הקריאה והקידוד נצברים בין ה-yields (השליחה עצמה נמדדת ב-http.roundtrip)
+        read_s = encode_s = 0.0
+        yield self.prefix
+        with open(self.file_path, "rb") as f:
+            while True:
+                t0 = time.perf_counter()
+                chunk = f.read(B64_CHUNK)
+                t1 = time.perf_counter()
+                if not chunk: break
+                encoded = base64.b64encode(chunk)
+                read_s, encode_s = read_s + t1 - t0, encode_s + time.perf_counter() - t1
+                yield encoded
+        record("gemini.file_read", read_s * 1000, bytes=os.path.getsize(self.file_path))
+        record("gemini.base64_encode", encode_s * 1000, bytes=self._length)
+        yield self.suffix
+
+
+class GeminiClient:
+    """לקוח לשימוש חוזר; בטוח לשיתוף בין threads של מאגר העובדים"""
+
+    def __init__(self, api_key, base_url=DEFAULT_BASE_URL, model=GEMINI_MODEL,
+                 connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT, pool_size=8):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._uploads = {}
+        self._upload_lock = threading.Lock()
+
+    def _url(self, version, path):
+        return f"{self.base_url}/{version}/{path}"
+
+    def generate_inline(self, prompt, file_path, mime_type="application/pdf"):
+        """generateContent עם המסמך מוטמע בבקשה (בזרימה)"""
+        return self.session.post(
+            self._url("v1", f"models/{self.model}:generateContent"), params={"key": self.api_key},
+            data=StreamingInlineBody(prompt, file_path, mime_type),
+            headers={"Content-Type": "application/json"}, timeout=self.timeout)
+
+    def generate_from_uri(self, prompt, file_uri, mime_type="application/pdf"):
+        """generateContent עם הפניה לקובץ שכבר הועלה - ללא שידור חוזר של המסמך"""
+        payload = {"contents": [{"parts": [{"text": prompt}, {"file_data": {"mime_type": mime_type, "file_uri": file_uri}}]}]}
+        return self.session.post(
+            self._url("v1beta", f"models/{self.model}:generateContent"), params={"key": self.api_key},
+            json=payload, timeout=self.timeout)
+
+    def generate_text(self, prompt, text):
+        """generateContent עם טקסט בלבד (למשל עמודים מסוננים מקומית)"""
+        payload = {"contents": [{"parts": [{"text": prompt}, {"text": text}]}]}
+        return self.session.post(
+            self._url("v1", f"models/{self.model}:generateContent"), params={"key": self.api_key},
+            json=payload, timeout=self.timeout)
+
+    def upload_file(self, file_path, content_hash=None, mime_type="application/pdf"):
+        """העלאה (resumable) ל-File API; קובץ שכבר הועלה (לפי hash) לא מועלה שוב. מחזיר URI."""
+        key = content_hash or os.path.abspath(file_path)
+        with self._upload_lock:
+            cached = self._uploads.get(key)
+            if cached and cached[1] > time.time():
+                return cached[0]
+        size = os.path.getsize(file_path)
+        start = self.session.post(
+            f"{self.base_url}/upload/v1beta/files", params={"key": self.api_key},
+            headers={"X-Goog-Upload-Protocol": "resumable", "X-Goog-Upload-Command": "start",
+                     "X-Goog-Upload-Header-Content-Length": str(size),
+                     "X-Goog-Upload-Header-Content-Type": mime_type},
+            json={"file": {"display_name": os.path.basename(file_path)}}, timeout=self.timeout)
+        start.raise_for_status()
+        upload_url = start.headers["X-Goog-Upload-URL"]
+        with open(file_path, "rb") as f:
+            resp = self.session.post(
+                upload_url, data=f,
+                headers={"Content-Length": str(size), "X-Goog-Upload-Offset": "0",
+                         "X-Goog-Upload-Command": "upload, finalize"}, timeout=self.timeout)
+        resp.raise_for_status()
+        uri = resp.json()["file"]["uri"]
+        with self._upload_lock:
+            self._uploads[key] = (uri, time.time() + UPLOAD_TTL)
+        return uri
+
+    def forget_upload(self, file_path, content_hash=None):
+        """ביטול URI שפג תוקפו (למשל 403/404 מהשרת)"""
+        with self._upload_lock:
+            self._uploads.pop(content_hash or os.path.abspath(file_path), None)
+
+    def close(self):
+        self.session.close()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(api_key, base_url=DEFAULT_BASE_URL):
+    """לקוח משותף לכל התהליך לפי (מפתח, כתובת) - חיבורי TLS נשמרים בין קריאות"""
+    with _clients_lock:
+        client = _clients.get((api_key, base_url))
+        if client is None:
+            client = _clients[(api_key, base_url)] = GeminiClient(api_key, base_url)
+        return client
@@ -0,0 +1,235 @@
+"""תור עבודות חילוץ מתמיד (SQLite) ומאגר עובדים בתהליך נפרד
+
+הדשבורד רק מגיש עבודה ומציג את מצבה; החילוץ עצמו (כולל backoff) רץ בתהליך העובדים.
+- עבודה זהה (אותו תוכן קובץ + אותו מצב חילוץ) שכבר ממתינה או רצה מוחזרת במקום עבודה חדשה
+- מצב, התקדמות ושגיאה נשמרים לכל עבודה; עבודות שרדו הפעלה מחדש של Streamlit או של העובדים
+  (עבודה "רצה" ללא heartbeat חוזרת לתור)
+- תהליך עובדים יחיד לכל המשתמשים: נעילת קובץ מבטיחה מאגר אחד, והדשבורד מפעיל אותו לפי הצורך
+
+שימוש:
+    python -m engine.jobs worker --workers 4 --rpm 15
+    python -m engine.jobs submit data/Insurance_Warehouse/Harel/2025/Q3/Financial_Reports/report.pdf
+    python -m engine.jobs list
+"""
+import argparse
+import fcntl
+import json
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from engine import DATA_DIR, ROOT_DIR
+from engine.cache import fingerprint, get_default_cache
+
+JOBS_DB = os.path.join(DATA_DIR, "jobs.sqlite")
+ACTIVE = ("queued", "running")
+POLL_INTERVAL = 0.5
+STALE_AFTER = 60.0  # שניות ללא heartbeat עד שעבודה רצה נחשבת יתומה
+
+
+class JobQueue:
+    """גישה לטבלת העבודות; בטוח לשימוש ממספר תהליכים ו-threads"""
+
+    def __init__(self, path=JOBS_DB):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL, path TEXT NOT NULL, mode TEXT NOT NULL,
+                company TEXT, period TEXT, status TEXT NOT NULL, progress REAL NOT NULL DEFAULT 0, message TEXT,
+                result TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0, worker TEXT,
+                created_at REAL NOT NULL, started_at REAL, finished_at REAL, heartbeat REAL)""")
+            db.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, id)")
+            db.execute("CREATE INDEX IF NOT EXISTS idx_jobs_key ON jobs(key, status)")
+            db.execute("CREATE INDEX IF NOT EXISTS idx_jobs_report ON jobs(company, period, id)")
+            db.execute("""CREATE TABLE IF NOT EXISTS workers (
+                name TEXT PRIMARY KEY, pid INTEGER NOT NULL, slots INTEGER NOT NULL, heartbeat REAL NOT NULL)""")
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        return db
+
+    @staticmethod
+    def _row(row):
+        if row is None: return None
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def submit(self, path, mode="hybrid", company=None, period=None):
+        """מגיש עבודה ומחזיר את המזהה; עבודה זהה שעדיין פעילה מוחזרת במקום כפילות"""
+        key = fingerprint(get_default_cache().content_hash(path), mode)
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            row = db.execute(f"SELECT id FROM jobs WHERE key=? AND status IN {ACTIVE} ORDER BY id LIMIT 1", (key,)).fetchone()
+            if row:
+                db.execute("COMMIT")
+                return row["id"]
+            cur = db.execute("INSERT INTO jobs (key, path, mode, company, period, status, created_at) VALUES (?, ?, ?, ?, ?, 'queued', ?)",
+                             (key, os.path.abspath(path), mode, company, period, time.time()))
+            db.execute("COMMIT")
+            return cur.lastrowid
+
+    def get(self, job_id):
+        with self._connect() as db:
+            return self._row(db.execute("SELECT * FROM jobs WHERE id=?", (job_id,)).fetchone())
+
+    def latest(self, company, period, active_only=False):
+        """העבודה האחרונה לחברה/רבעון (לחידוש מעקב אחרי ריענון דף או הפעלה מחדש)"""
+        where = f" AND status IN {ACTIVE}" if active_only else ""
+        with self._connect() as db:
+            return self._row(db.execute(f"SELECT * FROM jobs WHERE company=? AND period=?{where} ORDER BY id DESC LIMIT 1",
+                                        (company, period)).fetchone())
+
+    def list(self, status=None, limit=50):
+        query, args = "SELECT * FROM jobs", ()
+        if status:
+            query, args = query + " WHERE status=?", (status,)
+        with self._connect() as db:
+            return [self._row(r) for r in db.execute(query + " ORDER BY id DESC LIMIT ?", args + (limit,))]
+
+    def claim(self, worker):
+        """לוקח את העבודה הממתינה הוותיקה ביותר (אטומי בין תהליכים)"""
+        now = time.time()
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            row = db.execute("SELECT id FROM jobs WHERE status='queued' ORDER BY id LIMIT 1").fetchone()
+            if row is None:
+                db.execute("COMMIT")
+                return None
+            db.execute("""UPDATE jobs SET status='running', worker=?, attempts=attempts+1, started_at=?, heartbeat=?,
+                          progress=0, message=NULL, error=NULL WHERE id=?""", (worker, now, now, row["id"]))
+            job = db.execute("SELECT * FROM jobs WHERE id=?", (row["id"],)).fetchone()
+            db.execute("COMMIT")
+            return self._row(job)
+
+    def report(self, job_id, progress, message=None):
+        with self._connect() as db:
+            db.execute("UPDATE jobs SET progress=?, message=?, heartbeat=? WHERE id=? AND status='running'",
+                       (progress, message, time.time(), job_id))
+
+    def finish(self, job_id, result=None, error=None):
+        status = "failed" if error else "done"
+        with self._connect() as db:
+            db.execute("UPDATE jobs SET status=?, progress=1, result=?, error=?, finished_at=?, heartbeat=? WHERE id=?",
+                       (status, json.dumps(result, ensure_ascii=False) if result is not None else None, error,
+                        time.time(), time.time(), job_id))
+
+    def heartbeat(self, worker, slots):
+        now = time.time()
+        with self._connect() as db:
+            db.execute("INSERT OR REPLACE INTO workers VALUES (?, ?, ?, ?)", (worker, os.getpid(), slots, now))
+            db.execute("UPDATE jobs SET heartbeat=? WHERE worker=? AND status='running'", (now, worker))
+
+    def requeue_stale(self, max_age=STALE_AFTER):
+        """עבודות רצות של עובד שמת חוזרות לתור"""
+        with self._connect() as db:
+            return db.execute("UPDATE jobs SET status='queued', worker=NULL WHERE status='running' AND heartbeat<?",
+                              (time.time() - max_age,)).rowcount
+
+    def worker_alive(self, max_age=STALE_AFTER / 4):
+        with self._connect() as db:
+            row = db.execute("SELECT MAX(heartbeat) FROM workers").fetchone()
+        return row[0] is not None and time.time() - row[0] < max_age
+
+
+# ==============================================================================
+# מאגר העובדים
+# ==============================================================================
+def run_worker(api_key, workers=4, rpm=15, path=JOBS_DB, stop=None):
+    """לולאת העובדים; חוזרת מיד אם מאגר אחר כבר מחזיק בנעילה"""
+    from engine.batch import TokenBucket
+    from engine.extraction import extract_report, get_extraction_cache
+
+    lock = open(f"{path}.lock", "w")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock.close()
+        return False
+    queue = JobQueue(path)
+    name = f"{socket.gethostname()}:{os.getpid()}"
+    limiter, cache = TokenBucket(rpm), get_extraction_cache()
+    stop = stop or threading.Event()
+    slots = threading.Semaphore(workers)
+
+    def work(job):
+        try:
+            data, status = extract_report(job["path"], api_key, mode=job["mode"], cache=cache, limiter=limiter,
+                                          progress=lambda f, m: queue.report(job["id"], f, m))
+            if data is None: queue.finish(job["id"], error=status)
+            else: queue.finish(job["id"], result=data)
+        except Exception as e:
+            queue.finish(job["id"], error=f"{type(e).__name__}: {e}")
+        finally:
+            slots.release()
+
+    try:
+        queue.requeue_stale(0)  # עבודות "רצות" מהפעלה קודמת - אין להן עובד חי כשאנחנו מחזיקים בנעילה
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while not stop.is_set():
+                queue.heartbeat(name, workers)
+                queue.requeue_stale()
+                while slots.acquire(blocking=False):
+                    job = queue.claim(name)
+                    if job is None:
+                        slots.release()
+                        break
+                    pool.submit(work, job)
+                stop.wait(POLL_INTERVAL)
+    finally:
+        fcntl.flock(lock, fcntl.LOCK_UN)
+        lock.close()
+    return True
+
+
+def ensure_worker(api_key, workers=4, rpm=15, path=JOBS_DB):
+    """מפעיל את תהליך העובדים ברקע אם אין אחד חי (משותף לכל משתמשי הדשבורד)"""
+    queue = JobQueue(path)
+    if queue.worker_alive():
+        return False
+    env = {**os.environ, "GOOGLE_API_KEY": api_key or ""}
+    subprocess.Popen([sys.executable, "-m", "engine.jobs", "--db", path, "worker", "--workers", str(workers),
+                      "--rpm", str(rpm)], cwd=ROOT_DIR, env=env, start_new_session=True,
+                     stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="תור עבודות החילוץ")
+    parser.add_argument("--db", default=JOBS_DB)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("worker")
+    p.add_argument("--workers", type=int, default=4)
+    p.add_argument("--rpm", type=float, default=15, help="מכסת בקשות לדקה (משותפת)")
+    p.add_argument("--api-key", default=os.environ.get("GOOGLE_API_KEY"))
+    p = sub.add_parser("submit")
+    p.add_argument("path"); p.add_argument("--mode", default="hybrid")
+    p.add_argument("--company"); p.add_argument("--period")
+    p = sub.add_parser("list")
+    p.add_argument("--status")
+    args = parser.parse_args(argv)
+
+    if args.cmd == "worker":
+        if not run_worker(args.api_key, args.workers, args.rpm, args.db):
+            print("מאגר עובדים אחר כבר פעיל")
+        return 0
+    queue = JobQueue(args.db)
+    if args.cmd == "submit":
+        print(queue.submit(args.path, args.mode, args.company, args.period))
+    else:
+        for job in queue.list(args.status):
+            print(f"{job['id']:>5} {job['status']:<8} {job['progress']:>4.0%} {job['company'] or '-'} {job['period'] or '-'} "
+                  f"{os.path.basename(job['path'])} {job['error'] or job['message'] or ''}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
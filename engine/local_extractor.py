@@ -0,0 +1,81 @@
+"""מחלץ מקומי דטרמיניסטי (regex על טקסט poppler) - מסלול מהיר לפני ה-LLM
+
+כל כלל מגדיר תוויות עבריות קבועות, הקשר עמוד אופציונלי וטווח סבירות. לכל שדה נאספים מועמדים
+מכל העמודים; הערך הנבחר הוא השכיח, והביטחון = ביטחון הכלל × שיעור ההסכמה בין המועמדים.
+"""
+import re
+import subprocess
+from collections import Counter
+
+from engine.pdf_filter import page_texts, poppler_available
+
+# (נתיב בסכמה, תוויות, מונח הקשר שחייב להופיע בעמוד, סוג, טווח סביר, ביטחון בסיס)
+FIELD_RULES = [
+    ("solvency.solvency_ratio", ["יחס כושר פירעון כלכלי", "יחס כושר הפירעון הכלכלי"], None, "pct", (50, 400), 0.9),
+    ("solvency.scr", ["הון נדרש לכושר פירעון", "סך ההון הנדרש"], None, "amount", (100, 100000), 0.85),
+    ("solvency.tier1_capital", ["הון רובד 1", "הון ליבה"], None, "amount", (100, 100000), 0.8),
+    ("solvency.tier2_capital", ["הון רובד 2"], None, "amount", (0, 50000), 0.8),
+    ("consistency_check.opening_csm", ["יתרת פתיחה"], "מרווח שירות חוזי", "amount", (100, 100000), 0.75),
+    ("consistency_check.closing_csm", ["יתרת סגירה"], "מרווח שירות חוזי", "amount", (100, 100000), 0.75),
+    ("consistency_check.new_business_csm", ["תוספת בגין חוזים חדשים", "חוזים שהוכרו לראשונה"], "מרווח שירות חוזי", "amount", (0, 10000), 0.75),
+    ("core_kpis.total_csm", ["יתרת מרווח שירות חוזי"], None, "amount", (100, 100000), 0.8),
+    ("ifrs17_segments.onerous_contracts", ["רכיב הפסד"], None, "amount", (0, 10000), 0.6),
+]
+
+_NUMBER = re.compile(r"\(?-?\d{1,3}(?:,\d{3})+(?:\.\d+)?\)?|\(?-?\d+(?:\.\d+)?\)?")
+_WS = re.compile(r"\s+")
+
+
+def parse_number(token):
+    """'1,234.5' / '(120)' -> float; סוגריים = שלילי"""
+    neg = token.startswith("(") and token.endswith(")")
+    value = float(token.strip("()").replace(",", ""))
+    return -value if neg else value
+
+
+def _candidates(line, kind, lo, hi):
+    for token in _NUMBER.findall(line):
+        try:
+            value = parse_number(token)
+        except ValueError:
+            continue
+        # דוחות רבים מוצגים באלפי ש"ח - המרה למיליונים
+        if kind == "amount" and abs(value) > hi and lo <= abs(value) / 1000 <= hi:
+            value = value / 1000
+        if lo <= value <= hi:
+            yield round(value, 2)
+
+
+def extract_fields(pages):
+    """{path: (value, confidence)} מתוך רשימת טקסטים של עמודים"""
+    found = {}
+    norm_pages = [_WS.sub(" ", p) if p else "" for p in pages]
+    for path, labels, context, kind, (lo, hi), base in FIELD_RULES:
+        votes = Counter()
+        for raw, norm in zip(pages, norm_pages):
+            if context and context not in norm and context[::-1] not in norm:
+                continue
+            for line in raw.splitlines():
+                line_n = _WS.sub(" ", line)
+                hit = next((l for lbl in labels for l in (lbl, lbl[::-1]) if l in line_n), None)
+                if hit is None:
+                    continue
+                # התווית עצמה עשויה להכיל מספר ("הון רובד 2") - מסירים אותה לפני חיפוש הערך
+                for value in _candidates(line_n.replace(hit, " "), kind, lo, hi):
+                    votes[value] += 1
+                    break  # המספר הראשון בשורה = התקופה השוטפת
+        if votes:
+            value, n = votes.most_common(1)[0]
+            found[path] = (value, round(base * n / sum(votes.values()), 3))
+    return found
+
+
+def extract_report_local(file_path, pages=None):
+    """חילוץ מקומי לקובץ; מחזיר {} כשאין poppler או טקסט"""
+    if pages is None:
+        if not poppler_available(): return {}
+        try:
+            pages = page_texts(file_path)
+        except (subprocess.CalledProcessError, OSError):
+            return {}
+    return extract_fields(pages)
@@ -0,0 +1,149 @@
+"""שכבת memoization לנתונים נגזרים ולגרפים (TTL + LRU), בסמנטיקה בנוסח st.cache_data/st.cache_resource
+
+המפתח הוא טביעת אצבע של הארגומנטים (גם מילונים ורשימות) + גרסת המאגר, כך ששינוי בנתונים
+מבטל את כל התוצאות הנגזרות בלי ניקוי ידני. שלושה סוגים:
+    data      - מחזיר עותק (DataFrame/מילון) כדי שהקורא לא ישנה את המטמון
+    figure    - גרף Plotly נשמר כמילון (to_dict) ומשוחזר בכל פגיעה לאובייקט חדש ללא ולידציה חוזרת
+    resource  - אותו אובייקט משותף (חיבורים, מודלים)
+המטמון נרשם לפי שם הפונקציה, כך שהרצה חוזרת של הסקריפט (rerun ב-Streamlit) שמגדירה את הפונקציה
+מחדש ממשיכה להשתמש באותו מטמון; שינוי בקוד הפונקציה מנקה אותו.
+אינו תלוי ב-Streamlit; מוני הפגיעות זמינים ב-memo_stats(), וכל קריאה נמדדת כ-span ("figure.<name>").
+"""
+import copy
+import functools
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+from engine.store import store_version
+from engine.telemetry import span
+
+DEFAULT_TTL = 600
+DEFAULT_MAXSIZE = 256
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+class MemoCache:
+    """מילון LRU חסום בגודל עם תפוגה לכל רשומה"""
+
+    def __init__(self, name, maxsize=DEFAULT_MAXSIZE, ttl=DEFAULT_TTL, code=None):
+        self.name, self.maxsize, self.ttl, self.code = name, maxsize, ttl, code
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expired = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"name": self.name, "hits": self.hits, "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else None,
+                "evictions": self.evictions, "expired": self.expired, "size": len(self._entries)}
+
+
+def _code_hash(code, h=None):
+    """טביעת אצבע לקוד הפונקציה (כולל פונקציות פנימיות) - יציבה בין הרצות"""
+    h = h or hashlib.sha256()
+    h.update(code.co_code)
+    for const in code.co_consts:
+        if hasattr(const, "co_code"):
+            _code_hash(const, h)
+        else:
+            h.update(repr(const).encode("utf-8"))
+    return h.hexdigest()
+
+
+def _key(args, kwargs, versioned):
+    raw = json.dumps([args, kwargs], sort_keys=True, ensure_ascii=False, default=str)
+    version = store_version() if versioned else None
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest(), version
+
+
+def _freeze(value, kind):
+    if kind == "figure":
+        return value.to_dict()
+    return value
+
+
+def _thaw(value, kind):
+    if kind == "figure":
+        # המילון נלקח מגרף שכבר עבר ולידציה - בנייה ללא ולידציה (והרחבת template) חוסכת את רוב העלות;
+        # העתק עמוק כדי ש-update_layout של הקורא לא ישנה את המטמון
+        import plotly.graph_objects as go
+        return go.Figure(copy.deepcopy(value), _validate=False)
+    if kind == "data":
+        return value.copy() if isinstance(value, (pd.DataFrame, pd.Series)) else copy.deepcopy(value)
+    return value
+
+
+def memo(kind="data", ttl=DEFAULT_TTL, maxsize=DEFAULT_MAXSIZE, versioned=True):
+    """דקורטור: @memo("figure") def create_chart(company, quarter): ..."""
+    if kind not in ("data", "figure", "resource"):
+        raise ValueError(f"סוג מטמון לא מוכר: {kind}")
+
+    def decorator(fn):
+        name = f"{fn.__module__}.{fn.__qualname__}"
+        code = _code_hash(fn.__code__)
+        with _registry_lock:
+            cache = _registry.get(name)
+            if cache is None or cache.code != code:
+                cache = _registry[name] = MemoCache(fn.__qualname__, maxsize, ttl, code)
+
+        stage = f"{kind}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage) as s:
+                key = _key(args, kwargs, versioned)
+                hit, value = cache.get(key)
+                s.set(hit=hit)
+                if not hit:
+                    value = _freeze(fn(*args, **kwargs), kind)
+                    cache.put(key, value)
+                return _thaw(value, kind)
+
+        wrapper.cache = cache
+        wrapper.clear = cache.clear
+        return wrapper
+    return decorator
+
+
+def memo_stats():
+    """מוני פגיעות לכל פונקציה עטופה (לפאנל הדיבאג)"""
+    return pd.DataFrame([c.stats() for c in _registry.values()],
+                        columns=["name", "hits", "misses", "hit_rate", "evictions", "expired", "size"])
+
+
+def clear_all():
+    for cache in _registry.values():
+        cache.clear()
@@ -0,0 +1,146 @@
+"""סינון עמודים מקומי (poppler) לפני החילוץ: רק העמודים שמכילים את מונחי העוגן נשלחים למודל
+
+pdftotext מחלץ את כל העמודים בקריאה אחת (עמודים מופרדים ב-form feed), כל עמוד מאונדקס לפי
+מונחי העוגן העבריים של הפרומפט, והאינדקס נשמר במטמון לפי hash התוכן.
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+
+from engine import CACHE_DIR
+
+INDEX_DIR = os.path.join(CACHE_DIR, "page_index")
+REDUCED_DIR = os.path.join(CACHE_DIR, "reduced")
+INDEX_VERSION = 1
+
+# מונחי עוגן לפי שדה בסכמה (הראשונים הם המונחים מהפרומפט של analyze_report)
+ANCHOR_TERMS = {
+    "total_csm": ["יתרת מרווח שירות חוזי", "מרווח שירות חוזי"],
+    "new_business_csm": ["תוספת בגין חוזים חדשים", "חוזים שהוכרו לראשונה"],
+    "onerous_contracts": ["רכיב הפסד"],
+    "solvency_ratio": ["בתקופת הפריסה", "יחס כושר פירעון"],
+    "unquoted_pct": ["רמה 3"],
+    "tier_capital": ["הון רובד 1", "הון רובד 2"],
+    "scr": ["הון כלכלי נדרש"],
+    "net_profit": ["רווח כולל"],
+    "gross_premiums": ["פרמיות ברוטו"],
+    "total_assets": ["סך כל הנכסים"],
+}
+PAGES_PER_FIELD = 3
+# דוחות קצרים מזה נשלחים כמות שהם
+MIN_PAGES_TO_FILTER = 20
+
+_WS = re.compile(r"\s+")
+
+
+def poppler_available():
+    return all(shutil.which(tool) for tool in ("pdfinfo", "pdftotext", "pdfseparate", "pdfunite"))
+
+
+def page_count(file_path):
+    """מספר העמודים לפי pdfinfo"""
+    out = subprocess.run(["pdfinfo", file_path], capture_output=True, text=True, check=True).stdout
+    m = re.search(r"^Pages:\s+(\d+)", out, re.MULTILINE)
+    return int(m.group(1)) if m else 0
+
+
+def page_texts(file_path, first=None, last=None):
+    """טקסט לכל עמוד (pdftotext -layout; עמודים מופרדים ב-\\f)"""
+    cmd = ["pdftotext", "-layout", "-enc", "UTF-8"]
+    if first: cmd += ["-f", str(first)]
+    if last: cmd += ["-l", str(last)]
+    out = subprocess.run(cmd + [file_path, "-"], capture_output=True, check=True).stdout.decode("utf-8", "replace")
+    pages = out.split("\f")
+    if pages and not pages[-1].strip(): pages.pop()
+    return pages
+
+
+def _normalize(text):
+    return _WS.sub(" ", text)
+
+
+def build_page_index(pages):
+    """{field: [(page, hits), ...]} - כולל התאמה לטקסט עברי שחולץ בסדר ויזואלי הפוך"""
+    index = {}
+    for n, text in enumerate(pages, start=1):
+        norm = _normalize(text)
+        for field, terms in ANCHOR_TERMS.items():
+            hits = sum(norm.count(t) + norm.count(t[::-1]) for t in terms)
+            if hits: index.setdefault(field, []).append((n, hits))
+    return index
+
+
+def get_page_index(file_path, content_hash):
+    """אינדקס עמודים מהמטמון (לפי hash התוכן) או בנייה דרך poppler"""
+    path = os.path.join(INDEX_DIR, f"{content_hash}.json")
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            cached = json.load(f)
+        if cached.get("version") == INDEX_VERSION:
+            return cached
+    count = page_count(file_path)
+    # דוח קצר לא יסונן - חוסכים את חילוץ הטקסט המלא
+    pages = page_texts(file_path) if count >= MIN_PAGES_TO_FILTER else []
+    entry = {"version": INDEX_VERSION, "pages": count,
+             "fields": {k: [list(p) for p in v] for k, v in build_page_index(pages).items()}}
+    os.makedirs(INDEX_DIR, exist_ok=True)
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(entry, f, ensure_ascii=False)
+    os.replace(tmp, path)
+    return entry
+
+
+def select_pages(index, per_field=PAGES_PER_FIELD):
+    """העמודים עם מירב ההופעות לכל שדה (איחוד, ממוין)"""
+    selected = set()
+    for hits in index["fields"].values():
+        for n, _ in sorted(hits, key=lambda h: (-h[1], h[0]))[:per_field]:
+            selected.add(n)
+    return sorted(selected)
+
+
+def reduced_pdf(file_path, content_hash, pages):
+    """PDF מצומצם לעמודים הנבחרים (pdfseparate + pdfunite), שמור במטמון"""
+    tag = hashlib.sha1(",".join(map(str, pages)).encode()).hexdigest()[:12]
+    out = os.path.join(REDUCED_DIR, f"{content_hash}-{tag}.pdf")
+    if os.path.exists(out): return out
+    os.makedirs(REDUCED_DIR, exist_ok=True)
+    with tempfile.TemporaryDirectory() as tmp:
+        parts = []
+        for n in pages:
+            part = os.path.join(tmp, f"p{n:05d}.pdf")
+            subprocess.run(["pdfseparate", "-f", str(n), "-l", str(n), file_path, part], check=True, capture_output=True)
+            parts.append(part)
+        staged = os.path.join(tmp, "reduced.pdf")
+        subprocess.run(["pdfunite", *parts, staged], check=True, capture_output=True)
+        shutil.move(staged, out)
+    return out
+
+
+def reduced_text(file_path, pages):
+    """מטען טקסט בלבד לעמודים הנבחרים, עם סימון מספר עמוד"""
+    chunks = []
+    for n in pages:
+        text = page_texts(file_path, n, n)
+        chunks.append(f"--- עמוד {n} ---\n{text[0] if text else ''}")
+    return "\n".join(chunks)
+
+
+def prefilter(file_path, content_hash, mode="pdf"):
+    """מחזיר (path, text) לשליחה: PDF מצומצם, טקסט מצומצם, או המקור (None) כשאין צורך/אין poppler"""
+    if mode not in ("pdf", "text") or not poppler_available():
+        return None, None
+    try:
+        index = get_page_index(file_path, content_hash)
+        if index["pages"] < MIN_PAGES_TO_FILTER: return None, None
+        pages = select_pages(index)
+        if not pages: return None, None  # למשל PDF סרוק ללא שכבת טקסט
+        if mode == "text": return None, reduced_text(file_path, pages)
+        return reduced_pdf(file_path, content_hash, pages), None
+    except (subprocess.CalledProcessError, OSError):
+        return None, None
@@ -0,0 +1,264 @@
+"""אינדקס דמיון עמיתים: וקטור מאפיינים מתוקנן לכל חברה × רבעון, שכנים קרובים (k-NN) וקבוצות סיכון (k-means)
+
+המאפיינים הם כל העמודות המספריות בבלוקים FEATURE_BLOCKS (סולבנסי, מקטעי IFRS 17, תמהיל השקעות, יחסים,
+מדדי ליבה). סכומים כספיים (LOG_FEATURES) עוברים log חתום כדי שגודל החברה לא יכריע את הפרופיל; לאחר מכן
+כל מאפיין מתוקנן (z-score) בתוך הרבעון מול כל החברות שדיווחו בו, וערך חסר = ממוצע השוק (0).
+כל רבעון הוא אפוא בלוק float32 עצמאי: refresh() מזהה לפי hash שורות אילו רבעונים השתנו ובונה רק אותם.
+    neighbors()    - k השכנים הקרובים (קוסינוס או אוקלידי), באותו רבעון או מול כל הרבעונים
+    clusters()     - k-means לרבעון; הקבוצות ממוספרות לפי יחס סולבנסי חציוני (1 = האיתנה ביותר)
+    peer_medians() - חציון הערכים הגולמיים של קבוצת העמיתים כרשומה מקוננת (שכבה על תרשים העכביש)
+
+שימוש:
+    python -m engine.peers neighbors --company Migdal --period "Q3 2025" --k 3 --metric euclidean
+    python -m engine.peers clusters --period "Q3 2025" --k 3
+"""
+import argparse
+import sys
+import threading
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from engine.store import KEY_COLUMNS, load_store, period_key, store_version, unflatten_row
+
+FEATURE_BLOCKS = ("solvency.", "ifrs17_segments.", "investment_mix.", "financial_ratios.", "core_kpis.")
+LOG_FEATURES = frozenset({
+    "solvency.scr", "solvency.tier1_capital", "solvency.tier2_capital",
+    "ifrs17_segments.life_csm", "ifrs17_segments.health_csm", "ifrs17_segments.general_csm",
+    "ifrs17_segments.new_business_csm", "ifrs17_segments.onerous_contracts",
+    "core_kpis.total_csm", "core_kpis.net_profit", "core_kpis.gross_premiums", "core_kpis.total_assets",
+})
+METRICS = ("cosine", "euclidean")
+DEFAULT_K = 5
+DEFAULT_CLUSTERS = 3
+RANK_FEATURE = "solvency.solvency_ratio"  # סדר הקבוצות
+KMEANS_ITER = 50
+KMEANS_INIT = 4
+SEED = 0
+
+Block = namedtuple("Block", "companies index raw z norms")
+
+
+def _standardize(x, log_cols):
+    """log חתום לסכומים, z-score לכל עמודה (סטיית תקן 0 -> 0), חסר -> 0; float32"""
+    x = x.copy()
+    x[:, log_cols] = np.sign(x[:, log_cols]) * np.log1p(np.abs(x[:, log_cols]))
+    valid = ~np.isnan(x)
+    count = valid.sum(axis=0)
+    v = np.where(valid, x, 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = v.sum(axis=0) / count
+        std = np.sqrt(np.where(valid, (x - mean) ** 2, 0.0).sum(axis=0) / count)
+        z = np.where(valid & (std > 0), (x - mean) / std, 0.0)
+    return z.astype(np.float32)
+
+
+def _kmeans(z, k, seed=SEED, n_init=KMEANS_INIT, iters=KMEANS_ITER):
+    """Lloyd וקטורי עם אתחול k-means++; הריצה עם האינרציה הנמוכה ביותר מתוך n_init"""
+    rng = np.random.default_rng(seed)
+    sq = (z * z).sum(axis=1)
+    best = None
+    for _ in range(n_init):
+        centers = z[[rng.integers(len(z))]]
+        for _ in range(1, k):
+            d2 = np.maximum(sq[:, None] + (centers * centers).sum(axis=1) - 2 * z @ centers.T, 0).min(axis=1)
+            p = d2 / d2.sum() if d2.sum() > 0 else None
+            centers = np.vstack([centers, z[rng.choice(len(z), p=p)]])
+        for _ in range(iters):
+            d2 = np.maximum(sq[:, None] + (centers * centers).sum(axis=1) - 2 * z @ centers.T, 0)
+            labels = d2.argmin(axis=1)
+            new = np.array([z[labels == j].mean(axis=0) if (labels == j).any() else z[d2.min(axis=1).argmax()]
+                            for j in range(k)], dtype=np.float32)
+            if np.allclose(new, centers): break
+            centers = new
+        d2 = np.maximum(sq[:, None] + (centers * centers).sum(axis=1) - 2 * z @ centers.T, 0)
+        labels = d2.argmin(axis=1)
+        inertia = d2[np.arange(len(z)), labels].sum()
+        if best is None or inertia < best[0]:
+            best = (inertia, labels, np.sqrt(d2[np.arange(len(z)), labels]))
+    return best[1], best[2]
+
+
+class PeerIndex:
+    """מטריצות המאפיינים לכל רבעון; refresh() מסנכרן מול המאגר בהדרגה"""
+
+    def __init__(self, features=None):
+        self._requested = list(features) if features else None
+        self.features = []
+        self._lock = threading.Lock()
+        self._version = None
+        self._hashes = {}
+        self._blocks = {}
+        self._clusters = {}
+        self._stacked = None
+        self.updated = []  # רבעונים שנבנו מחדש בעדכון האחרון
+
+    # --------------------------------------------------------------------------
+    # סנכרון
+    # --------------------------------------------------------------------------
+    def refresh(self, frame=None):
+        """מחזיר את הרבעונים שנבנו מחדש"""
+        with self._lock:
+            version = store_version() if frame is None else None
+            if frame is None and version == self._version:
+                return []
+            frame = load_store() if frame is None else frame
+            features = self._requested or [c for c in frame.columns if c.startswith(FEATURE_BLOCKS)]
+            if features != self.features:
+                self.features, self._hashes, self._blocks = features, {}, {}
+            hashes = dict(zip(zip(frame["company"], frame["period"]),
+                              pd.util.hash_pandas_object(frame.reindex(columns=KEY_COLUMNS + features), index=False)))
+            dirty = {key[1] for key, h in hashes.items() if self._hashes.get(key) != h}
+            dirty |= {p for _, p in set(self._hashes) - set(hashes)}
+            if dirty:
+                log_cols = [i for i, f in enumerate(features) if f in LOG_FEATURES]
+                rows = frame[frame["period"].isin(list(dirty))]
+                for period, g in rows.groupby("period", sort=False):
+                    raw = g.reindex(columns=features).to_numpy(dtype=np.float64)
+                    z = _standardize(raw, log_cols)
+                    names = list(g["company"])
+                    self._blocks[period] = Block(names, {c: i for i, c in enumerate(names)}, raw, z,
+                                                 np.linalg.norm(z, axis=1))
+                for period in dirty - set(rows["period"].unique()):
+                    self._blocks.pop(period, None)
+                self._clusters = {key: v for key, v in self._clusters.items() if key[0] not in dirty}
+                self._stacked = None
+            self._hashes, self._version = hashes, version
+            self.updated = sorted(dirty, key=period_key)
+            return self.updated
+
+    @property
+    def periods(self):
+        return sorted(self._blocks, key=period_key)
+
+    def companies(self, period):
+        b = self._blocks.get(period)
+        return list(b.companies) if b else []
+
+    def matrix(self):
+        """כל הבלוקים במטריצה רציפה אחת: (companies, periods, z, norms) - נבנית מחדש רק אחרי שינוי"""
+        if self._stacked is None:
+            blocks = [(p, self._blocks[p]) for p in self.periods]
+            self._stacked = (
+                np.array([c for _, b in blocks for c in b.companies], dtype=object),
+                np.array([p for p, b in blocks for _ in b.companies], dtype=object),
+                np.vstack([b.z for _, b in blocks]) if blocks else np.zeros((0, len(self.features)), np.float32),
+                np.concatenate([b.norms for _, b in blocks]) if blocks else np.zeros(0, np.float32),
+            )
+        return self._stacked
+
+    # --------------------------------------------------------------------------
+    # שאילתות
+    # --------------------------------------------------------------------------
+    def neighbors(self, company, period, k=DEFAULT_K, metric="cosine", all_periods=False):
+        """k החברות הקרובות ביותר (ללא החברה עצמה); all_periods - מול כל חברה × רבעון במאגר"""
+        if metric not in METRICS:
+            raise ValueError(f"metric must be one of {METRICS}")
+        b = self._blocks.get(period)
+        if b is None or company not in b.index:
+            return pd.DataFrame(columns=["company", "period", "distance"])
+        i = b.index[company]
+        q, qn = b.z[i], b.norms[i]
+        if all_periods:
+            names, periods, z, norms = self.matrix()
+        else:
+            names, z, norms = np.array(b.companies, dtype=object), b.z, b.norms
+            periods = np.full(len(names), period, dtype=object)
+        dot = z @ q
+        with np.errstate(invalid="ignore", divide="ignore"):
+            if metric == "cosine":
+                dist = 1 - dot / (norms * qn)
+            else:
+                dist = np.sqrt(np.maximum(norms * norms + qn * qn - 2 * dot, 0))
+        dist = np.where(np.isnan(dist) | (names == company), np.inf, dist)
+        k = min(k, int(np.isfinite(dist).sum()))
+        if k <= 0:
+            return pd.DataFrame(columns=["company", "period", "distance"])
+        top = np.argpartition(dist, k - 1)[:k]
+        top = top[np.argsort(dist[top], kind="stable")]
+        return pd.DataFrame({"company": names[top], "period": periods[top], "distance": dist[top].astype(np.float64)})
+
+    def clusters(self, period, k=DEFAULT_CLUSTERS):
+        """קבוצות סיכון לרבעון: company, cluster (1..k), distance (מרכז הקבוצה)"""
+        key = (period, k)
+        if key not in self._clusters:
+            b = self._blocks.get(period)
+            if b is None:
+                return pd.DataFrame(columns=["company", "cluster", "distance"])
+            k = max(1, min(k, len(b.companies)))
+            labels, dist = _kmeans(b.z, k)
+            if RANK_FEATURE in self.features:
+                col = b.raw[:, self.features.index(RANK_FEATURE)]
+                rank = [-np.nanmedian(col[labels == j]) if np.isfinite(col[labels == j]).any() else np.inf
+                        for j in range(k)]
+            else:
+                rank = [-(labels == j).sum() for j in range(k)]
+            relabel = np.empty(k, dtype=np.int64)
+            relabel[np.argsort(rank, kind="stable")] = np.arange(1, k + 1)
+            self._clusters[key] = pd.DataFrame({"company": b.companies, "cluster": relabel[labels],
+                                                "distance": dist.astype(np.float64)})
+        return self._clusters[key].copy()
+
+    def peer_medians(self, company, period, k=DEFAULT_K, metric="cosine", by="neighbors"):
+        """(חברות הקבוצה, רשומה מקוננת של חציון הערכים הגולמיים); by: neighbors או cluster"""
+        b = self._blocks.get(period)
+        if b is None or company not in b.index:
+            return [], None
+        if by == "cluster":
+            c = self.clusters(period, k)
+            label = c.loc[c["company"] == company, "cluster"].iloc[0]
+            members = [m for m in c.loc[c["cluster"] == label, "company"] if m != company]
+        else:
+            members = list(self.neighbors(company, period, k, metric)["company"])
+        if not members:
+            return [], None
+        rows = b.raw[[b.index[m] for m in members]]
+        with np.errstate(all="ignore"):
+            med = np.array([np.nanmedian(c) if np.isfinite(c).any() else np.nan for c in rows.T])
+        return members, unflatten_row(dict(zip(self.features, med)))
+
+
+_peer_index = None
+_peer_index_lock = threading.Lock()
+
+
+def get_peer_index():
+    global _peer_index
+    with _peer_index_lock:
+        if _peer_index is None:
+            _peer_index = PeerIndex()
+    _peer_index.refresh()
+    return _peer_index
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="עמיתים דומים וקבוצות סיכון")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("neighbors")
+    p.add_argument("--company", required=True)
+    p.add_argument("--period")
+    p.add_argument("--k", type=int, default=DEFAULT_K)
+    p.add_argument("--metric", choices=METRICS, default="cosine")
+    p.add_argument("--all-periods", action="store_true")
+    p = sub.add_parser("clusters")
+    p.add_argument("--period")
+    p.add_argument("--k", type=int, default=DEFAULT_CLUSTERS)
+    args = parser.parse_args(argv)
+
+    index = get_peer_index()
+    period = args.period or (index.periods[-1] if index.periods else None)
+    if args.cmd == "neighbors":
+        res = index.neighbors(args.company, period, args.k, args.metric, args.all_periods)
+    else:
+        res = index.clusters(period, args.k).sort_values(["cluster", "distance"])
+    if res.empty:
+        print(f"אין נתונים עבור {period}", file=sys.stderr)
+        return 1
+    with pd.option_context("display.width", 200, "display.max_rows", None):
+        print(res.to_string(index=False, float_format=lambda v: f"{v:,.3f}"))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
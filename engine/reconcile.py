@@ -0,0 +1,188 @@
+"""התאמת גלגול CSM (IFRS 17) לכל החברות והרבעונים במעבר וקטורי אחד
+
+שלוש משפחות בדיקה, כל אחת כהפרש (residual) בין צד צפוי לצד מדווח:
+- rollforward: פתיחה + עסקים חדשים - שחרור מול סגירה, בתוך התקופה
+- linkage: סגירת הרבעון הקודם מול פתיחת הרבעון הנוכחי (אותה חברה, רבעון עוקב בלבד)
+- cross-block: אותו מדד בשני בלוקים (עסקים חדשים ב-consistency_check מול ifrs17_segments,
+  סגירה מול core_kpis.total_csm)
+הפרש חורג כש-|residual| > max(ABS_TOL, REL_TOL * |מדווח|). ערך חסר נותן breach=None ("לא ידוע").
+
+האינדקס (Reconciler) מתעדכן בהדרגה: רק שורות שתוכנן השתנה (למשל חילוץ חדש שנקלט) והרבעון
+העוקב להן (בדיקת ה-linkage שלו) נבדקים מחדש.
+
+שימוש:
+    python -m engine.reconcile
+    python -m engine.reconcile --all --company Clal
+"""
+import argparse
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+
+from engine.store import KEY_COLUMNS, from_extraction, load_store, period_key, store_version
+
+OPENING, NEW_BUSINESS, RELEASE, CLOSING = (f"consistency_check.{f}" for f in
+                                           ("opening_csm", "new_business_csm", "csm_release", "closing_csm"))
+# check id -> (תיאור, עמודה מדווחת, עמודה משווה) לבדיקות cross-block
+CROSS_BLOCK = {
+    "new_business_blocks": ("עסקים חדשים: consistency_check מול ifrs17_segments", NEW_BUSINESS,
+                            "ifrs17_segments.new_business_csm"),
+    "closing_vs_total": ("CSM סגירה מול core_kpis.total_csm", CLOSING, "core_kpis.total_csm"),
+}
+CHECKS = {"rollforward": "פתיחה + עסקים חדשים - שחרור = סגירה", "linkage": "סגירת הרבעון הקודם = פתיחה",
+          **{k: v[0] for k, v in CROSS_BLOCK.items()}}
+COLUMNS = [OPENING, NEW_BUSINESS, RELEASE, CLOSING] + [v[2] for v in CROSS_BLOCK.values()]
+ABS_TOL = 1.0     # ₪M
+REL_TOL = 0.005   # 0.5% מהערך המדווח
+RESULT_COLUMNS = ["company", "period", "check", "description", "expected", "reported", "residual", "tolerance", "breach"]
+
+
+def _ordinal(periods):
+    """'Q3 2025' -> 2025*4+2 (רבעונים עוקבים נבדלים ב-1); פענוח פעם אחת לכל תקופה ייחודית"""
+    periods = pd.Series(periods, dtype="object")
+    table = {p: y * 4 + q - 1 for p in periods.unique() for y, q in [period_key(p)]}
+    return periods.map(table).to_numpy(dtype=np.int64)
+
+
+def _values(frame, col):
+    return frame[col].to_numpy(dtype=np.float64) if col in frame.columns else np.full(len(frame), np.nan)
+
+
+def reconcile(frame, keys=None):
+    """טבלת הפרשים לכל (company, period, check). keys - הגבלה לשורות מסוימות; ה-linkage
+    עדיין נקרא מכל frame (הרבעון הקודם לא חייב להיות בין keys)"""
+    frame = frame.reset_index(drop=True)
+    rows = frame if keys is None else frame[pd.MultiIndex.from_frame(frame[KEY_COLUMNS]).isin(list(keys))]
+    n = len(rows)
+    opening, new_business, release, closing = (_values(rows, c) for c in (OPENING, NEW_BUSINESS, RELEASE, CLOSING))
+
+    # סגירת הרבעון הקודם: חיפוש וקטורי לפי (company, ordinal - 1) מול כל frame
+    prev_closing = pd.Series(_values(frame, CLOSING), index=pd.MultiIndex.from_arrays(
+        [frame["company"].to_numpy(), _ordinal(frame["period"])])).groupby(level=[0, 1]).last()
+    lookup = pd.MultiIndex.from_arrays([rows["company"].to_numpy(), _ordinal(rows["period"]) - 1])
+    prev = prev_closing.reindex(lookup).to_numpy(dtype=np.float64)
+
+    pairs = {"rollforward": (opening + new_business - release, closing), "linkage": (prev, opening)}
+    for check, (_, reported, other) in CROSS_BLOCK.items():
+        pairs[check] = (_values(rows, other), _values(rows, reported))
+
+    out = []
+    for check, (expected, reported) in pairs.items():
+        residual = reported - expected
+        tolerance = np.maximum(ABS_TOL, REL_TOL * np.abs(reported))
+        known = ~np.isnan(residual)
+        breach = pd.Series(np.abs(residual) > tolerance, dtype="object").where(known, None)
+        out.append(pd.DataFrame({
+            "company": rows["company"].to_numpy(), "period": rows["period"].to_numpy(), "check": check,
+            "description": CHECKS[check], "expected": expected, "reported": reported, "residual": residual,
+            "tolerance": tolerance, "breach": breach.to_numpy(),
+        }))
+    if not n:
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+    return _ordered(pd.concat(out, ignore_index=True))
+
+
+def _ordered(result):
+    return result.assign(_o=_ordinal(result["period"])).sort_values(["_o", "company"], kind="stable").drop(columns="_o").reset_index(drop=True)
+
+
+def _row_hashes(frame):
+    cols = [c for c in KEY_COLUMNS + COLUMNS if c in frame.columns]
+    return dict(zip(zip(frame["company"], frame["period"]), pd.util.hash_pandas_object(frame[cols], index=False)))
+
+
+class Reconciler:
+    """טבלת ההפרשים לכל השוק; מתעדכנת רק לשורות שהשתנו ולרבעון העוקב להן"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._hashes = {}
+        self.results = pd.DataFrame(columns=RESULT_COLUMNS)
+        self.checked = []  # (company, period) שנבדקו בעדכון האחרון
+
+    def refresh(self, frame=None):
+        """סנכרון מול המאגר; מחזיר את המפתחות שנבדקו מחדש"""
+        with self._lock:
+            version = store_version() if frame is None else None
+            if frame is None and version == self._version:
+                return []
+            frame = load_store() if frame is None else frame
+            hashes = _row_hashes(frame)
+            changed = {k for k, h in hashes.items() if self._hashes.get(k) != h}
+            changed |= set(self._hashes) - set(hashes)
+            # שינוי בסגירה משפיע על ה-linkage של הרבעון העוקב
+            successors = {(c, o + 1) for c, o in zip((k[0] for k in changed), _ordinal([k[1] for k in changed]))}
+            ordinals = dict(zip(zip(frame["company"], _ordinal(frame["period"])), zip(frame["company"], frame["period"])))
+            affected = {k for k in changed if k in hashes} | {ordinals[s] for s in successors if s in ordinals}
+            if affected:
+                stale = pd.MultiIndex.from_frame(self.results[KEY_COLUMNS]).isin(list(changed | affected))
+                self.results = _ordered(pd.concat([self.results[~stale], reconcile(frame, affected)], ignore_index=True))
+            elif changed:
+                self.results = self.results[~pd.MultiIndex.from_frame(self.results[KEY_COLUMNS]).isin(list(changed))] \
+                    .reset_index(drop=True)
+            self._hashes, self._version = hashes, version
+            self.checked = sorted(affected, key=lambda k: (period_key(k[1]), k[0]))
+            return self.checked
+
+    def breaches(self, company=None, period=None, check=None):
+        """הפרשים מחוץ לסבולת (breach True)"""
+        res = self.results
+        mask = res["breach"] == True  # noqa: E712 - עמודת object עם None
+        if company is not None:
+            mask &= res["company"] == company
+        if period is not None:
+            mask &= res["period"] == period
+        if check is not None:
+            mask &= res["check"] == check
+        return res[mask].reset_index(drop=True)
+
+
+_reconciler = None
+_reconciler_lock = threading.Lock()
+
+
+def get_reconciler():
+    global _reconciler
+    with _reconciler_lock:
+        if _reconciler is None:
+            _reconciler = Reconciler()
+    _reconciler.refresh()
+    return _reconciler
+
+
+def csm_breaches(company=None, period=None):
+    return get_reconciler().breaches(company, period)
+
+
+def check_extraction(company, period, data):
+    """הפרשים לתוצאת חילוץ שעדיין לא נקלטה: הרשומה עצמה והרבעון העוקב לה, מול המאגר.
+    החילוץ מחליף את השורה הקיימת (ולא עובר דרך merge, שבו שורה מבוקרת גוברת על חילוץ)"""
+    store = load_store()
+    existing = (store["company"] == company) & (store["period"] == period)
+    frame = pd.concat([store[~existing], from_extraction(company, period, data)], ignore_index=True)
+    successor = [(c, p) for c, p, o in zip(frame["company"], frame["period"], _ordinal(frame["period"]))
+                 if c == company and o == _ordinal([period])[0] + 1]
+    return reconcile(frame, {(company, period), *successor})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="התאמת גלגול CSM לכל השוק")
+    parser.add_argument("--company", action="append")
+    parser.add_argument("--period", action="append", help='למשל "Q3 2025"')
+    parser.add_argument("--all", action="store_true", help="כל ההפרשים ולא רק חריגות")
+    args = parser.parse_args(argv)
+
+    res = get_reconciler().results
+    if args.company: res = res[res["company"].isin(args.company)]
+    if args.period: res = res[res["period"].isin(args.period)]
+    if not args.all: res = res[res["breach"] == True]  # noqa: E712
+    with pd.option_context("display.width", 200, "display.max_rows", None):
+        print(res.drop(columns="description").to_string(index=False, float_format=lambda v: f"{v:,.1f}"))
+    return 1 if (res["breach"] == True).any() else 0  # noqa: E712
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,250 @@
+"""בנייה סטטית של דוח לכל (חברה, רבעון) - אותן תצוגות כמו בדשבורד, בלי Streamlit
+
+כל דוח הוא HTML מוכן להדפסה (פרק לעמוד A4; "שמירה כ-PDF" בדפדפן): מדדי ליבה, דגלים (red_flags),
+רשימת ציות (compliance_checks), מפל CSM, עכביש, הרכב הון, הקצאת נכסים ומפת סיכון-תשואה של הרבעון
+(engine.charts). נתוני הבנצ'מארק לכל הרבעונים נחתכים פעם אחת (scatter_frames) ומועברים לכל תהליכי
+העובדים; הדוחות נבנים במאגר תהליכים. לכל דוח נשמר ב-manifest.json ה-hash של הקלטים (הרשומה, מפת
+הרבעון וקוד הבנייה) - דוח שהקלטים שלו לא השתנו מדולג. plotly.min.js נכתב פעם אחת ומשותף לכל הדוחות.
+
+שימוש:
+    python -m engine.report build
+    python -m engine.report build --period "Q3 2025" --company Harel --workers 4 --out reports/
+"""
+import argparse
+import html
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from engine import CACHE_DIR
+from engine.cache import fingerprint, hash_file
+from engine.store import load_store, period_key, unflatten_row
+
+REPORT_DIR = os.path.join(CACHE_DIR, "reports")
+MANIFEST = "manifest.json"
+PLOTLY_JS = "plotly.min.js"
+# שינוי בקוד הבנייה, בגרפים או בכללים פוסל את כל הדוחות
+SOURCES = ("report.py", "charts.py", "rules.py", "benchmark.py")
+KPIS = [("core_kpis", "net_profit", "רווח נקי", "M₪"), ("core_kpis", "total_csm", "יתרת CSM", "M₪"),
+        ("core_kpis", "roe", "ROE", "%"), ("core_kpis", "gross_premiums", "פרמיות ברוטו", "M₪"),
+        ("solvency", "solvency_ratio", "יחס סולבנסי", "%"), ("solvency", "scr", "SCR", "M₪"),
+        ("financial_ratios", "combined_ratio", "Combined Ratio", "%"), ("investment_mix", "unquoted_pct", "לא סחיר", "%")]
+
+_STYLE = """
+body { background: #0e1117; color: #e6e6e6; font-family: 'Segoe UI', sans-serif; margin: 24px; }
+h1 { color: #2e7bcf; margin-bottom: 0; } h2 { border-bottom: 1px solid #2e7bcf; padding-bottom: 4px; }
+table { border-collapse: collapse; } td, th { padding: 6px 12px; border-bottom: 1px solid #333; text-align: right; }
+.kpis td:last-child { font-family: 'Courier New', monospace; }
+.alert { padding: 10px; border-radius: 6px; margin: 6px 0; border: 1px solid; font-weight: bold; }
+.CRITICAL { background: #2c0b0e; border-color: #ff4b4b; color: #ff9999; }
+.WARNING { background: #2c250b; border-color: #f0ad4e; color: #f0e68c; }
+.grid { display: grid; grid-template-columns: 1fr 1fr; gap: 12px; } .missing { color: #888; padding: 40px; }
+section { page-break-inside: avoid; }
+@page { size: A4; margin: 12mm; }
+@media print { body { -webkit-print-color-adjust: exact; print-color-adjust: exact; } section { page-break-before: always; } }
+"""
+
+
+def _fmt(v, s=""):
+    return f"{v:,.1f}{s}" if v is not None else "N/A"
+
+
+def _slug(period):
+    """'Q3 2025' -> '2025-Q3' (מיון לפי שם = מיון כרונולוגי)"""
+    year, quarter = period_key(period)
+    return f"{year}-Q{quarter}"
+
+
+def report_path(company, period):
+    return f"{_slug(period)}/{company}.html"
+
+
+def _code_version():
+    here = os.path.dirname(os.path.abspath(__file__))
+    return fingerprint(*[hash_file(os.path.join(here, name)) for name in SOURCES])
+
+
+def _write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+# ==============================================================================
+# דוח בודד
+# ==============================================================================
+def _figure(name, build, *args):
+    """div של הגרף; רשומה חסרה שהגרף אינו יכול לצייר מקבלת הודעה במקום חריגה"""
+    try:
+        fig = build(*args)
+    except (TypeError, KeyError, ValueError, ZeroDivisionError):
+        return '<div class="missing">אין מספיק נתונים לגרף</div>'
+    return fig.to_html(full_html=False, include_plotlyjs=False, div_id=f"fig-{name}", config={"displayModeBar": False})
+
+
+def benchmark_html(period, scatter):
+    """מפת הסיכון של הרבעון - זהה לכל החברות בו, ולכן נבנית פעם אחת לרבעון בכל תהליך"""
+    from engine.charts import benchmark_scatter
+
+    return _figure("benchmark", benchmark_scatter, scatter, period) if scatter is not None else ""
+
+
+def render_report(company, period, record, scatter=None, bench=None):
+    """HTML מלא לדוח + סיכום דגלים; scatter - נתוני מפת הסיכון של הרבעון (scatter_frames()[period]),
+    או bench - ה-div המוכן שלה. הגרפים נקראים בלי שכבת ה-memo (כל דוח נבנה פעם אחת)"""
+    from engine.charts import create_allocation_pie, create_capital_chart, create_radar_chart, create_waterfall
+    from engine.rules import compliance_checks, red_flags
+
+    flags = red_flags(record)
+    checks = compliance_checks(record)
+    esc = html.escape
+    kpis = "".join(f"<tr><th>{label}</th><td>{_fmt(record.get(block, {}).get(field), unit)}</td></tr>"
+                   for block, field, label, unit in KPIS)
+    alerts = "".join(f'<div class="alert {level}">{esc(msg)}</div>' for level, msg in flags) \
+        or "<p>✅ לא נמצאו חריגות</p>"
+    compliance = "".join(f"<tr><td>{'❔' if v is None else '✅' if v else '❌'}</td><td>{esc(k)}</td></tr>"
+                         for k, v in checks.items())
+    figures = [("waterfall", create_waterfall.__wrapped__, record), ("radar", create_radar_chart.__wrapped__, record),
+               ("capital", create_capital_chart.__wrapped__, record.get("solvency") or {}),
+               ("allocation", create_allocation_pie.__wrapped__, record.get("investment_mix") or {})]
+    grid = "".join(f"<div>{_figure(name, fn, arg)}</div>" for name, fn, arg in figures)
+    if bench is None: bench = benchmark_html(period, scatter)
+    body = f"""<!DOCTYPE html>
+<html lang="he" dir="rtl"><head><meta charset="utf-8"><title>{esc(company)} - {period}</title>
+<script src="../{PLOTLY_JS}"></script><style>{_STYLE}</style></head><body>
+<h1>{esc(company)}</h1><p>{period}</p>
+<section><h2>מדדי ליבה</h2><table class="kpis">{kpis}</table>
+<h2>דגלים אדומים</h2>{alerts}
+<h2>בקרת ציות</h2><table>{compliance}</table></section>
+<section><h2>IFRS 17, הון והשקעות</h2><div class="grid">{grid}</div></section>
+<section><h2>מפת סיכון-תשואה ({period})</h2>{bench}</section>
+</body></html>
+"""
+    summary = {"critical": sum(level == "CRITICAL" for level, _ in flags),
+               "warning": sum(level == "WARNING" for level, _ in flags),
+               "failed_checks": sum(v is False for v in checks.values())}
+    return body, summary
+
+
+# ==============================================================================
+# בנייה מקבילית
+# ==============================================================================
+_shared = {}
+
+
+def _init(scatter, out_dir):
+    """מאתחל תהליך עובד: נתוני הבנצ'מארק המשותפים מגיעים פעם אחת לכל תהליך"""
+    _shared.update(scatter=scatter, out_dir=out_dir, bench={})
+
+
+def _render(task):
+    from engine.telemetry import span
+
+    company, period, record, digest = task
+    rel = report_path(company, period)
+    with span("report.render", company=company, period=period):
+        bench = _shared["bench"].get(period)
+        if bench is None:
+            bench = _shared["bench"][period] = benchmark_html(period, _shared["scatter"].get(period))
+        body, summary = render_report(company, period, record, bench=bench)
+        _write(os.path.join(_shared["out_dir"], rel), body)
+    return rel, {"company": company, "period": period, "hash": digest, **summary}
+
+
+def plan(companies=None, periods=None, frame=None):
+    """[(company, period, record, input_hash)] לכל הרשומות במאגר (לפי סינון), ונתוני הבנצ'מארק לרבעונים"""
+    from engine.benchmark import scatter_frames
+
+    frame = load_store() if frame is None else frame
+    if companies: frame = frame[frame["company"].isin(companies)]
+    if periods: frame = frame[frame["period"].isin(periods)]
+    scatter = scatter_frames(frame["period"].unique())
+    code = _code_version()
+    scatter_hash = {p: fingerprint(df.to_json(orient="split")) for p, df in scatter.items()}
+    tasks = []
+    for row in frame.to_dict(orient="records"):
+        company, period = row["company"], row["period"]
+        record = unflatten_row(row)
+        tasks.append((company, period, record, fingerprint(code, scatter_hash.get(period), record)))
+    return tasks, scatter
+
+
+def _load_manifest(out_dir):
+    try:
+        with open(os.path.join(out_dir, MANIFEST), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _index(out_dir, manifest):
+    """עמוד ראשי: חברה × רבעון עם קישור ומספר הדגלים"""
+    entries = [e for rel, e in manifest.items() if os.path.exists(os.path.join(out_dir, rel))]
+    quarters = sorted({e["period"] for e in entries}, key=period_key)
+    names = list(dict.fromkeys(e["company"] for e in sorted(entries, key=lambda e: e["company"])))
+    cells = {(e["company"], e["period"]): e for e in entries}
+    rows = []
+    for company in names:
+        tds = []
+        for period in quarters:
+            e = cells.get((company, period))
+            if e is None:
+                tds.append("<td></td>"); continue
+            badge = f" 🚨{e['critical']}" if e["critical"] else f" ⚠️{e['warning']}" if e["warning"] else " ✅"
+            tds.append(f'<td><a href="{html.escape(report_path(company, period))}">{period}</a>{badge}</td>')
+        rows.append(f"<tr><th>{html.escape(company)}</th>{''.join(tds)}</tr>")
+    head = "".join(f"<th>{p}</th>" for p in quarters)
+    _write(os.path.join(out_dir, "index.html"), f"""<!DOCTYPE html>
+<html lang="he" dir="rtl"><head><meta charset="utf-8"><title>דוחות רבעוניים</title><style>{_STYLE}</style></head><body>
+<h1>דוחות רבעוניים</h1><table><tr><th></th>{head}</tr>{''.join(rows)}</table></body></html>
+""")
+
+
+def build(out_dir=REPORT_DIR, companies=None, periods=None, workers=None, force=False):
+    """בניית כל הדוחות שהקלטים שלהם השתנו; מחזיר {built, skipped, seconds, index}"""
+    start = time.perf_counter()
+    tasks, scatter = plan(companies, periods)
+    manifest = _load_manifest(out_dir)
+    todo = [t for t in tasks if force or manifest.get(report_path(t[0], t[1]), {}).get("hash") != t[3]
+            or not os.path.exists(os.path.join(out_dir, report_path(t[0], t[1])))]
+    js = os.path.join(out_dir, PLOTLY_JS)
+    if todo and not os.path.exists(js):
+        from plotly.offline import get_plotlyjs
+        _write(js, get_plotlyjs())
+
+    workers = min(workers or os.cpu_count() or 1, len(todo))
+    if workers <= 1:
+        _init(scatter, out_dir)
+        results = [_render(t) for t in todo]
+    else:
+        with ProcessPoolExecutor(workers, initializer=_init, initargs=(scatter, out_dir)) as pool:
+            results = list(pool.map(_render, todo, chunksize=max(1, len(todo) // (workers * 4))))
+    manifest.update(results)
+    _write(os.path.join(out_dir, MANIFEST), json.dumps(manifest, ensure_ascii=False, indent=1, sort_keys=True))
+    _index(out_dir, manifest)
+    return {"built": len(results), "skipped": len(tasks) - len(todo), "seconds": time.perf_counter() - start,
+            "index": os.path.join(out_dir, "index.html")}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="בניית דוחות HTML סטטיים לכל חברה × רבעון")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("build")
+    p.add_argument("--out", default=REPORT_DIR)
+    p.add_argument("--company", action="append")
+    p.add_argument("--period", action="append", help='למשל "Q3 2025"')
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    p.add_argument("--force", action="store_true", help="בנייה מחדש גם לדוחות שלא השתנו")
+    args = parser.parse_args(argv)
+
+    result = build(args.out, args.company, args.period, args.workers, args.force)
+    print(f"{result['built']} נבנו, {result['skipped']} ללא שינוי ({result['seconds']:.1f}s) -> {result['index']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""מבחן קיצון הפוך (Reverse Stress Test): איזה זעזוע מינימלי שובר כל מבטח
+
+לכל (חברה, רבעון) ולכל סף (100%/115%) מחפשים את צירוף הזעזועים בריבית, במניות ובביטולים
+בעל הנורמה הקטנה ביותר (ביחידות סטיית תקן של כל גורם) שמוריד את יחס הסולבנסי אל מתחת לסף,
+לפי אותו מודל השפעה של הסימולטור (engine.stress.shock_impact).
+
+הפתרון וקטורי לכל השוק יחד: רשת כיוונים על הספירה, חיפוש בינארי לאורך כל קרן במקביל
+(מערך חברות × כיוונים), ואחריו שלב עידון סביב הכיוון הטוב ביותר של כל חברה.
+"""
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from engine.store import load_store, period_key, store_version
+from engine.stress import DEFAULT_VOLS, FACTORS, SOLVENCY_CRITICAL, SOLVENCY_WARNING, shock_impact
+
+# גבולות סבירות לזעזוע (ריבית בנ"א, מניות ב-%, ביטולים ב-%)
+SHOCK_BOUNDS = np.array([[-3.0, 3.0], [-60.0, 60.0], [-60.0, 60.0]])
+GRID_DIRECTIONS = 1024
+REFINE_DIRECTIONS = 256
+BISECT_STEPS = 32
+
+
+def sphere_directions(n):
+    """n כיוונים מפוזרים אחיד על ספירת היחידה (Fibonacci)"""
+    i = np.arange(n) + 0.5
+    phi = np.arccos(1 - 2 * i / n)
+    theta = np.pi * (1 + 5 ** 0.5) * i
+    return np.column_stack([np.cos(theta) * np.sin(phi), np.sin(theta) * np.sin(phi), np.cos(phi)])
+
+
+def _max_reach(directions, vols):
+    """המרחק המקסימלי לאורך כל כיוון (ביחידות σ) לפני יציאה מגבולות הזעזוע"""
+    step = directions * vols
+    with np.errstate(divide="ignore"):
+        limits = np.where(step > 0, SHOCK_BOUNDS[:, 1] / step, np.where(step < 0, SHOCK_BOUNDS[:, 0] / step, np.inf))
+    return limits.min(axis=-1)
+
+
+def _solve_rays(base, threshold, directions, vols, cat):
+    """חיפוש בינארי מקבילי: base (C,), directions (C, M, 3) -> t (C, M); inf כשאין שבירה בגבולות"""
+    def margin(t):
+        shock = directions * (t[..., None] * vols)
+        sol, _ = shock_impact(shock[..., 0], shock[..., 1], shock[..., 2], cat)
+        return base[:, None] + sol - threshold
+
+    hi = np.broadcast_to(_max_reach(directions, vols), directions.shape[:2]).copy()
+    breaks = margin(hi) < 0
+    lo = np.zeros_like(hi)
+    for _ in range(BISECT_STEPS):
+        mid = (lo + hi) / 2
+        below = margin(mid) < 0
+        hi = np.where(below, mid, hi)
+        lo = np.where(below, lo, mid)
+    t = np.where(breaks, hi, np.inf)
+    # כבר מתחת לסף ללא זעזוע
+    return np.where((base - threshold + shock_impact(0.0, 0.0, 0.0, cat)[0])[:, None] < 0, 0.0, t)
+
+
+def solve_breaking_shocks(base, threshold, vols=DEFAULT_VOLS, with_cat=False, seed=0):
+    """לכל בסיס: (מרחק ב-σ, זעזוע שובר (C, 3)). וקטורי לחלוטין על פני כל החברות"""
+    # הפתרון תלוי רק ביחס הבסיס - פותרים פעם אחת לכל ערך ייחודי
+    base, inverse = np.unique(np.asarray(base, dtype=np.float64), return_inverse=True)
+    vols = np.asarray(vols, dtype=np.float64)
+    cat = 1.0 if with_cat else 0.0
+    grid = sphere_directions(GRID_DIRECTIONS)
+    t = _solve_rays(base, threshold, np.broadcast_to(grid, (len(base),) + grid.shape), vols, cat)
+    best = grid[np.argmin(t, axis=1)]
+    best_t = t.min(axis=1)
+
+    # עידון: כיוונים קרובים סביב הכיוון הטוב ביותר של כל חברה
+    rng = np.random.default_rng(seed)
+    spread = np.pi / np.sqrt(GRID_DIRECTIONS)
+    local = best[:, None, :] + rng.normal(scale=spread, size=(len(base), REFINE_DIRECTIONS, 3))
+    local /= np.linalg.norm(local, axis=-1, keepdims=True)
+    t_local = _solve_rays(base, threshold, local, vols, cat)
+    improved = t_local.min(axis=1) < best_t
+    idx = np.argmin(t_local, axis=1)
+    best = np.where(improved[:, None], local[np.arange(len(base)), idx], best)
+    best_t = np.where(improved, t_local.min(axis=1), best_t)
+    shocks = np.where(np.isfinite(best_t)[:, None], best * (np.nan_to_num(best_t, posinf=0.0)[:, None] * vols), np.nan)
+    return best_t[inverse], shocks[inverse]
+
+
+@lru_cache(maxsize=32)
+def _reverse_stress(version, periods, thresholds, vols, with_cat):
+    frame = load_store()
+    rows = frame[frame["solvency.solvency_ratio"].notna()]
+    if periods:
+        rows = rows[rows["period"].isin(periods)]
+    base = rows["solvency.solvency_ratio"].to_numpy()
+    out = []
+    for threshold in thresholds:
+        distance, shocks = solve_breaking_shocks(base, threshold, vols, with_cat)
+        df = pd.DataFrame({"company": rows["company"].to_numpy(), "period": rows["period"].to_numpy(),
+                           "threshold": threshold, "base_solvency": base, "distance": distance})
+        for i, f in enumerate(FACTORS):
+            df[f"{f}_shock"] = shocks[:, i]
+        out.append(df)
+    result = pd.concat(out, ignore_index=True)
+    result["rank"] = result.groupby(["period", "threshold"])["distance"].rank(method="min")
+    return result.sort_values(["period", "threshold", "distance"], key=lambda s: s.map(period_key) if s.name == "period" else s,
+                              kind="stable").reset_index(drop=True)
+
+
+def reverse_stress(periods=None, thresholds=(SOLVENCY_CRITICAL, SOLVENCY_WARNING), vols=DEFAULT_VOLS, with_cat=False):
+    """טבלת "מרחק לכשל" לכל השוק: distance ביחידות σ (inf = לא נשבר בגבולות הזעזוע) והזעזוע השובר"""
+    return _reverse_stress(store_version(), tuple(periods or ()), tuple(float(t) for t in thresholds),
+                           tuple(vols), bool(with_cat))
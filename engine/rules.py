@@ -0,0 +1,283 @@
+"""מנוע כללים הצהרתי: דגלים אדומים ובדיקות ציות כנתונים, מקומפלים לפרדיקטים וקטוריים על המאגר
+
+כל כלל הוא ביטוי על עמודות המאגר ("solvency.solvency_ratio < 100"), מקומפל פעם אחת (ast) לפונקציה
+וקטורית על עמודות numpy. הסמנטיקה בטוחה לערכים חסרים (לוגיקה תלת-ערכית): השוואה עם ערך חסר,
+או חלוקה באפס, מחזירה "לא ידוע" ולא קורסת; דגל נדלק רק כשהתנאי התקיים בוודאות.
+
+אינדקס הפגיעות (RuleIndex) מחושב לכל השוק ומתעדכן בהדרגה: כשהמאגר משתנה מחושבות מחדש רק
+התקופות שתוכנן השתנה (למשל רבעון חדש שנקלט).
+"""
+import ast
+import hashlib
+import operator
+import threading
+
+import numpy as np
+import pandas as pd
+
+from engine.store import KEY_COLUMNS, flatten_record, load_store, period_key, store_version
+from engine.telemetry import span
+
+# kind: flag (נדלק כשהביטוי מתקיים) / check (עובר כשהביטוי מתקיים); value: המדד המוצג בהודעה
+RULES = [
+    {"id": "solvency_critical", "kind": "flag", "level": "CRITICAL", "expr": "solvency.solvency_ratio < 100",
+     "value": "solvency.solvency_ratio", "message": "🚨 יחס סולבנסי קריטי: {value:g}% (נדרשת תוכנית הבראה)"},
+    {"id": "solvency_low", "kind": "flag", "level": "WARNING", "expr": "100 <= solvency.solvency_ratio < 115",
+     "value": "solvency.solvency_ratio", "message": "⚠️ יחס סולבנסי נמוך: {value:g}%"},
+    {"id": "onerous_contracts", "kind": "flag", "level": "WARNING", "expr": "ifrs17_segments.onerous_contracts > 0",
+     "value": "ifrs17_segments.onerous_contracts", "message": "⚠️ זוהו חוזים מפסידים (Onerous): ₪{value:g}M"},
+    {"id": "unquoted_exposure", "kind": "flag", "level": "WARNING", "expr": "investment_mix.unquoted_pct > 20",
+     "value": "investment_mix.unquoted_pct", "message": "⚠️ חשיפה חריגה ללא סחיר: {value:g}%"},
+    {"id": "underwriting_loss", "kind": "flag", "level": "WARNING", "expr": "financial_ratios.combined_ratio > 100",
+     "value": "financial_ratios.combined_ratio", "message": "⚠️ הפסד חיתומי בביטוח כללי (Combined: {value:g}%)"},
+    {"id": "min_capital", "kind": "check", "label": "יחס הון מזערי (>100%)", "expr": "solvency.solvency_ratio >= 100"},
+    {"id": "liquidity", "kind": "check", "label": "יחס נזילות (>1.0)", "expr": "financial_ratios.lcr > 1.0"},
+    {"id": "underwriting", "kind": "check", "label": "רווחיות חיתומית (CR < 100%)", "expr": "financial_ratios.combined_ratio < 100"},
+    {"id": "capital_quality", "kind": "check", "label": "איכות הון (Tier 1 > 50%)",
+     "expr": "solvency.tier1_capital / (solvency.tier1_capital + solvency.tier2_capital) > 0.5"},
+]
+
+_BINOPS = {ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply, ast.Div: np.divide}
+_CMPOPS = {ast.Lt: operator.lt, ast.LtE: operator.le, ast.Gt: operator.gt, ast.GtE: operator.ge,
+           ast.Eq: operator.eq, ast.NotEq: operator.ne}
+
+
+def _column_name(node):
+    """Name/Attribute -> 'block.field'"""
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        return f"{_column_name(node.value)}.{node.attr}"
+    raise ValueError(f"ביטוי לא נתמך: {ast.dump(node)}")
+
+
+def _compile_node(node, columns):
+    """מחזיר פונקציה cols -> (ערכים, מסכת לא-ידוע). columns נאסף לאורך הדרך"""
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+        value = float(node.value)
+        return lambda cols, n: (np.full(n, value), np.zeros(n, dtype=bool))
+    if isinstance(node, (ast.Name, ast.Attribute)):
+        name = _column_name(node)
+        columns.add(name)
+
+        def column(cols, n):
+            values = cols.get(name)
+            if values is None:
+                return np.full(n, np.nan), np.ones(n, dtype=bool)
+            return values, np.isnan(values)
+        return column
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        inner = _compile_node(node.operand, columns)
+        return lambda cols, n: (lambda v, u: (-v, u))(*inner(cols, n))
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        inner = _compile_node(node.operand, columns)
+        return lambda cols, n: (lambda v, u: (~v & ~u, u))(*inner(cols, n))
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINOPS:
+        op, left, right = _BINOPS[type(node.op)], _compile_node(node.left, columns), _compile_node(node.right, columns)
+
+        def binop(cols, n):
+            (lv, lu), (rv, ru) = left(cols, n), right(cols, n)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                out = op(lv, rv)
+            return out, lu | ru | ~np.isfinite(out)
+        return binop
+    if isinstance(node, ast.Compare):
+        operands = [_compile_node(node.left, columns)] + [_compile_node(c, columns) for c in node.comparators]
+        ops = [_CMPOPS[type(o)] for o in node.ops]
+
+        def compare(cols, n):
+            evaluated = [f(cols, n) for f in operands]
+            hit, unknown = np.ones(n, dtype=bool), np.zeros(n, dtype=bool)
+            for op, (lv, lu), (rv, ru) in zip(ops, evaluated, evaluated[1:]):
+                hit &= op(lv, rv)
+                unknown |= lu | ru
+            return hit & ~unknown, unknown
+        return compare
+    if isinstance(node, ast.BoolOp):
+        parts = [_compile_node(v, columns) for v in node.values]
+        is_and = isinstance(node.op, ast.And)
+
+        def boolop(cols, n):
+            # Kleene: False and ? = False, True or ? = True
+            values = [p(cols, n) for p in parts]
+            known = [(v & ~u) if not is_and else (~v & ~u) for v, u in values]
+            decided = np.logical_or.reduce(known)
+            unknown = ~decided & np.logical_or.reduce([u for _, u in values])
+            hit = decided if not is_and else ~decided & ~unknown
+            return hit, unknown
+        return boolop
+    raise ValueError(f"ביטוי לא נתמך: {ast.dump(node)}")
+
+
+class Rule:
+    """כלל מקומפל: evaluate(cols, n) -> (hit, unknown) כמערכים בוליאניים"""
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.id, self.kind, self.expr = spec["id"], spec["kind"], spec["expr"]
+        self.columns = set()
+        self._fn = _compile_node(ast.parse(self.expr, mode="eval").body, self.columns)
+        if spec.get("value"):
+            self.columns.add(spec["value"])
+
+    def evaluate(self, cols, n):
+        return self._fn(cols, n)
+
+
+def compile_rules(specs=RULES):
+    return [Rule(s) for s in specs]
+
+
+_compiled = compile_rules()
+
+
+def _columns(frame, rules):
+    needed = set().union(*(r.columns for r in rules))
+    return {c: frame[c].to_numpy(dtype=np.float64) for c in needed if c in frame.columns}
+
+
+def evaluate(frame, rules=None):
+    """הערכה וקטורית של כל הכללים על כל שורות frame במעבר אחד.
+    פלט: שורה לכל (company, period, rule) עם status (True/False/None), level ו-message"""
+    rules = _compiled if rules is None else rules
+    n = len(frame)
+    cols = _columns(frame, rules)
+    out = []
+    for rule in rules:
+        with span(f"rule.{rule.id}", kind=rule.kind, rows=n):
+            hit, unknown = rule.evaluate(cols, n)
+        status = pd.Series(hit, dtype="object").where(~unknown, None)
+        value = cols.get(rule.spec.get("value"), np.full(n, np.nan))
+        out.append(pd.DataFrame({
+            "company": frame["company"].to_numpy() if "company" in frame else None,
+            "period": frame["period"].to_numpy() if "period" in frame else None,
+            "rule": rule.id, "kind": rule.kind, "level": rule.spec.get("level"),
+            "status": status.to_numpy(), "value": value,
+        }))
+    if not out:
+        return pd.DataFrame(columns=["company", "period", "rule", "kind", "level", "status", "value", "message"])
+    result = pd.concat(out, ignore_index=True)
+    specs = {r.id: r.spec for r in rules}
+    result["message"] = [
+        (specs[r].get("message", "").format(value=v) if s is True and specs[r]["kind"] == "flag" else specs[r].get("label"))
+        for r, s, v in zip(result["rule"], result["status"], result["value"])
+    ]
+    return result
+
+
+# ==============================================================================
+# אינדקס פגיעות לכל השוק - עדכון הדרגתי לפי תקופה
+# ==============================================================================
+def _period_fingerprint(rows, columns):
+    cols = [c for c in KEY_COLUMNS + sorted(columns) if c in rows.columns]
+    digest = pd.util.hash_pandas_object(rows[cols], index=False).to_numpy()
+    return hashlib.sha256(digest.tobytes()).hexdigest()
+
+
+class RuleIndex:
+    """תוצאות כל הכללים לכל (חברה, תקופה); רק תקופות שתוכנן השתנה מוערכות מחדש"""
+
+    def __init__(self, rules=None):
+        self.rules = _compiled if rules is None else rules
+        self.columns = set().union(*(r.columns for r in self.rules))
+        self._lock = threading.Lock()
+        self._version = None
+        self._periods = {}  # period -> (fingerprint, results)
+        self.results = evaluate(pd.DataFrame(columns=KEY_COLUMNS), self.rules)
+        self.evaluated = []  # התקופות שהוערכו בעדכון האחרון
+
+    def refresh(self, frame=None):
+        """סנכרון מול המאגר; מחזיר את רשימת התקופות שהוערכו מחדש"""
+        with self._lock:
+            version = store_version() if frame is None else None
+            if frame is None and version == self._version:
+                return []
+            frame = load_store() if frame is None else frame
+            current, evaluated = {}, []
+            for period, rows in frame.groupby("period", sort=False):
+                fp = _period_fingerprint(rows, self.columns)
+                cached = self._periods.get(period)
+                if cached and cached[0] == fp:
+                    current[period] = cached
+                else:
+                    current[period] = (fp, evaluate(rows, self.rules))
+                    evaluated.append(period)
+            changed = evaluated or set(self._periods) - set(current)
+            self._periods = current
+            if changed:
+                ordered = sorted(current, key=period_key)
+                self.results = pd.concat([current[p][1] for p in ordered], ignore_index=True) if ordered \
+                    else evaluate(pd.DataFrame(columns=KEY_COLUMNS), self.rules)
+            self._version = version
+            self.evaluated = evaluated
+            return evaluated
+
+    def hits(self, level=None, period=None, company=None, kind="flag"):
+        """דגלים שנדלקו (status True) - סינון על האינדקס המחושב בלבד"""
+        res = self.results
+        mask = (res["kind"] == kind) & (res["status"] == True)  # noqa: E712 - עמודת object עם None
+        if level is not None:
+            mask &= res["level"] == level
+        if period is not None:
+            mask &= res["period"] == period
+        if company is not None:
+            mask &= res["company"] == company
+        return res[mask].reset_index(drop=True)
+
+    def failures(self, period=None):
+        """בדיקות ציות שנכשלו או חסרות נתונים"""
+        res = self.results
+        mask = (res["kind"] == "check") & (res["status"] != True)  # noqa: E712
+        if period is not None:
+            mask &= res["period"] == period
+        return res[mask].reset_index(drop=True)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_rule_index():
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = RuleIndex()
+    _index.refresh()
+    return _index
+
+
+def market_flags(level="CRITICAL", period=None):
+    """כל הדגלים ברמה נתונה בכל השוק (מתוך האינדקס)"""
+    return get_rule_index().hits(level=level, period=period)
+
+
+# ==============================================================================
+# רשומה בודדת (למשל תוצאת חילוץ שעדיין לא נקלטה במאגר)
+# ==============================================================================
+def evaluate_record(record, rules=None):
+    return evaluate(pd.DataFrame([flatten_record(record)]), rules)
+
+
+def _evaluate_scalar(record, rules=None):
+    """[(rule, status, value)] לרשומה בודדת: אותם פרדיקטים על מערכים באורך 1, ללא בניית DataFrame"""
+    rules = _compiled if rules is None else rules
+    flat = flatten_record(record)
+    cols = {c: np.array([flat[c]], dtype=np.float64) for c in set().union(*(r.columns for r in rules)) if c in flat}
+    out = []
+    with span("rule.record", rules=len(rules)):
+        for rule in rules:
+            hit, unknown = rule.evaluate(cols, 1)
+            value = cols[rule.spec["value"]][0] if rule.spec.get("value") in cols else np.nan
+            out.append((rule, None if unknown[0] else bool(hit[0]), value))
+    return out
+
+
+def red_flags(record):
+    """[(level, message)] לפי סדר הכללים"""
+    return [(rule.spec["level"], rule.spec["message"].format(value=value))
+            for rule, status, value in _evaluate_scalar(record) if rule.kind == "flag" and status is True]
+
+
+def compliance_checks(record):
+    """{label: True/False/None}; None = אין מספיק נתונים להכריע"""
+    return {rule.spec["label"]: status for rule, status, _ in _evaluate_scalar(record) if rule.kind == "check"}
@@ -0,0 +1,303 @@
+"""מאגר מדדים עמודתי (Parquet): שורה לכל (חברה, תקופה), עמודה טיפוסית לכל מדד ("block.field")
+
+מקורות: מילון הנתונים המבוקר (data/seed/*.json, במבנה FULL_DATA), קובץ ה-CSV של scrapers
+ותוצרי חילוץ (JSON בסכמת IFRS17_SCHEMA). המאגר נבנה אוטומטית מהמקורות אם אינו קיים.
+
+שימוש:
+    python -m engine.store rebuild
+    python -m engine.store verify        # שורות audited זהות לקובצי ה-seed
+    python -m engine.store import-json data/seed/full_data_2025.json
+    python -m engine.store import-csv data/database.csv
+    python -m engine.store import-extraction Harel "Q4 2025" extracted.json
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+
+from engine import DATA_DIR
+
+STORE_PATH = os.environ.get("APEX_STORE_PATH", os.path.join(DATA_DIR, "metrics.parquet"))
+SEED_DIR = os.path.join(DATA_DIR, "seed")
+CSV_PATH = os.path.join(DATA_DIR, "database.csv")
+
+KEY_COLUMNS = ["company", "period"]
+TEXT_COLUMNS = ["company", "period", "source", "notes"]
+EXTRA_PREFIX = "extra."  # עמודות CSV ללא מקבילה ברשומה המבוקרת
+# סדר עדיפות מקורות: נתוני אמת מבוקרים גוברים על חילוץ, וחילוץ גובר על ה-CSV
+SOURCE_PRIORITY = {"csv": 0, "extraction": 1, "audited": 2}
+
+# שמות החברות ב-CSV (עברית) -> המזהים בדשבורד
+COMPANY_NAMES = {
+    "הפניקס": "Phoenix", "הראל": "Harel", "כלל": "Clal", "מגדל": "Migdal", "מנורה": "Menora",
+    "איילון": "Ayalon", "ביטוח ישיר": "Direct", "ליברה": "Libra", "וישור": "Wesure",
+}
+# עמודות ה-CSV -> (עמודה במאגר, מכפיל יחידות). CSM/הון ב-CSV במיליארדים, במאגר במיליונים.
+# היחידות לפי פורמט: database.csv (year/quarter) שומר loss_comp במיליארדים (0.8), ואילו
+# scrapers/fetch_data.py (date) כותב loss_component כבר במיליונים (450) - ולכן מכפיל 1
+CSV_COLUMNS = {
+    "solvency_ratio": ("solvency.solvency_ratio", 1), "csm_total": ("core_kpis.total_csm", 1000),
+    "csm_balance": ("core_kpis.total_csm", 1000), "roe": ("core_kpis.roe", 1),
+    "combined_ratio": ("financial_ratios.combined_ratio", 1), "expense_ratio": ("financial_ratios.expense_ratio", 1),
+    "loss_ratio": ("financial_ratios.loss_ratio", 1), "inv_yield": ("financial_ratios.roi", 1),
+    "life_csm": ("ifrs17_segments.life_csm", 1000), "health_csm": ("ifrs17_segments.health_csm", 1000),
+    "general_csm": ("ifrs17_segments.general_csm", 1000), "loss_comp": ("ifrs17_segments.onerous_contracts", 1000),
+    "loss_component": ("ifrs17_segments.onerous_contracts", 1), "tier1_cap": ("solvency.tier1_capital", 1000),
+    "scr_amount": ("solvency.scr", 1000),
+}
+
+
+def period_key(period):
+    """'Q3 2025' -> (2025, 3) למיון כרונולוגי"""
+    m = re.fullmatch(r"Q([1-4]) (\d{4})", period)
+    return (int(m.group(2)), int(m.group(1))) if m else (0, 0)
+
+
+def period_label(year, quarter):
+    return f"Q{int(str(quarter).lstrip('Q'))} {int(year)}"
+
+
+def flatten_record(record, prefix=""):
+    """{'solvency': {'scr': 1}} -> {'solvency.scr': 1.0}; notes/meta מטופלים בנפרד"""
+    flat = {}
+    for key, value in record.items():
+        if not prefix and key in ("notes", "meta"):
+            continue
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten_record(value, path + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool) or value is None:
+            flat[path] = np.nan if value is None else float(value)
+    return flat
+
+
+def unflatten_row(row):
+    """שורה במאגר -> מילון מקונן במבנה FULL_DATA (NaN -> None)"""
+    record = {}
+    for col, value in row.items():
+        if col in TEXT_COLUMNS or col.startswith(EXTRA_PREFIX):
+            continue
+        node = record
+        *parents, leaf = col.split(".")
+        for p in parents:
+            node = node.setdefault(p, {})
+        node[leaf] = None if pd.isna(value) else float(value)
+    if isinstance(row.get("notes"), str):
+        record["notes"] = row["notes"]
+    return record
+
+
+def _rows_frame(rows):
+    df = pd.DataFrame(rows)
+    for col in df.columns:
+        if col not in TEXT_COLUMNS:
+            df[col] = df[col].astype("float64")
+    return df
+
+
+def merge(existing, incoming):
+    """upsert לפי (company, period): מקור בעדיפות גבוהה/שווה דורס, ומקור נחות אינו נכתב לשורה.
+
+    שורה מכילה רק ערכים ממקורות בעדיפות של ה-source שלה (השלמה הדדית רק בין מקורות שווים);
+    החריג היחיד הוא עמודות extra.* של ה-CSV, שאינן חלק מהרשומה המקוננת ונשמרות לצד כל מקור.
+    """
+    if existing is None or existing.empty:
+        return incoming.reset_index(drop=True)
+    old = existing.set_index(KEY_COLUMNS)
+    new = incoming.set_index(KEY_COLUMNS)
+    base = old.reindex(new.index)
+    old_pri = base["source"].map(SOURCE_PRIORITY)
+    new_pri = new["source"].map(SOURCE_PRIORITY)
+    wins = (new_pri >= old_pri.fillna(-1)).to_numpy()
+    same = (new_pri == old_pri).to_numpy()
+    extra_old = [c for c in old.columns if c.startswith(EXTRA_PREFIX)]
+    extra_new = [c for c in new.columns if c.startswith(EXTRA_PREFIX)]
+    parts = [old.drop(new.index, errors="ignore"),
+             new[wins & same].combine_first(base[wins & same]),
+             new[wins & ~same].combine_first(base.loc[wins & ~same, extra_old]),
+             base[~wins].combine_first(new.loc[~wins, extra_new])]
+    order = old.index.append(new.index.difference(old.index, sort=False))
+    merged = pd.concat(parts).reindex(order).reset_index()
+    return merged[_column_order(merged.columns)]
+
+
+def _column_order(cols):
+    return [c for c in TEXT_COLUMNS if c in cols] + sorted(c for c in cols if c not in TEXT_COLUMNS)
+
+
+def from_nested(full_data, source="audited"):
+    """ייבוא ממילון במבנה FULL_DATA: {period: {company: record}}"""
+    rows = []
+    for period, companies in full_data.items():
+        for company, record in companies.items():
+            rows.append({"company": company, "period": period, "source": source,
+                         "notes": record.get("notes"), **flatten_record(record)})
+    return _rows_frame(rows)
+
+
+def from_csv(path=CSV_PATH):
+    """ייבוא CSV של scrapers (שני הפורמטים: year/quarter או date); עמודות לא ממופות נשמרות כ-extra.*"""
+    raw = pd.read_csv(path, encoding="utf-8-sig")
+    if "quarter" not in raw.columns and "date" in raw.columns:
+        dates = pd.to_datetime(raw["date"])
+        raw["year"], raw["quarter"] = dates.dt.year, dates.dt.quarter
+    out = pd.DataFrame({
+        "company": raw["company"].map(lambda c: COMPANY_NAMES.get(c, c)),
+        "period": [period_label(y, q) for y, q in zip(raw["year"], raw["quarter"])],
+        "source": "csv",
+    })
+    for col in raw.columns:
+        if col in ("company", "year", "quarter", "date"):
+            continue
+        target, factor = CSV_COLUMNS.get(col, (f"{EXTRA_PREFIX}{col}", 1))
+        out[target] = pd.to_numeric(raw[col], errors="coerce").astype("float64") * factor
+    return out
+
+
+def from_extraction(company, period, data):
+    """ייבוא תוצאת חילוץ (JSON בסכמת IFRS17_SCHEMA)"""
+    return _rows_frame([{"company": company, "period": period, "source": "extraction", "notes": None,
+                         **flatten_record(data)}])
+
+
+# ==============================================================================
+# קריאה/כתיבה ו-API טעינה
+# ==============================================================================
+_lock = threading.Lock()
+_loaded = {"mtime": None, "frame": None}
+
+
+def build_from_sources():
+    """בנייה מלאה: כל קובצי ה-seed + ה-CSV"""
+    frame = None
+    for seed in sorted(glob.glob(os.path.join(SEED_DIR, "*.json"))):
+        with open(seed, encoding="utf-8") as f:
+            frame = merge(frame, from_nested(json.load(f)))
+    if os.path.exists(CSV_PATH):
+        frame = merge(frame, from_csv(CSV_PATH))
+    return frame
+
+
+def save_store(frame, path=STORE_PATH):
+    tmp = f"{path}.tmp{os.getpid()}"
+    # מיון יציב לפי תקופה בלבד - סדר החברות נשמר כפי שהוזן
+    frame.sort_values("period", key=lambda s: s.map(period_key), kind="stable") \
+         .reset_index(drop=True).to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+
+
+def load_store(path=STORE_PATH):
+    """המאגר כ-DataFrame רחב; נטען מהדיסק רק כשהקובץ השתנה (mtime)"""
+    with _lock:
+        if not os.path.exists(path):
+            save_store(build_from_sources(), path)
+        mtime = os.stat(path).st_mtime_ns
+        if _loaded["mtime"] != (path, mtime):
+            _loaded["frame"] = pd.read_parquet(path)
+            _loaded["mtime"] = (path, mtime)
+        return _loaded["frame"]
+
+
+def store_version(path=STORE_PATH):
+    """מזהה גרסת נתונים (משתנה בכל כתיבה) - לשימוש כמפתח מטמון"""
+    load_store(path)
+    return _loaded["mtime"][1]
+
+
+def upsert(incoming, path=STORE_PATH):
+    """מיזוג שורות חדשות למאגר ושמירה"""
+    frame = merge(load_store(path) if os.path.exists(path) else None, incoming)
+    save_store(frame, path)
+    return frame
+
+
+def periods(frame=None):
+    """כל התקופות, ממוינות כרונולוגית"""
+    frame = load_store() if frame is None else frame
+    return sorted(frame["period"].unique(), key=period_key)
+
+
+def companies(period=None, frame=None):
+    frame = load_store() if frame is None else frame
+    if period is not None:
+        frame = frame[frame["period"] == period]
+    return list(dict.fromkeys(frame["company"]))
+
+
+def metric(name, frame=None):
+    """מדד אחד לכל החברות והתקופות - סריקת עמודה יחידה. name: 'solvency.scr' או 'scr'"""
+    frame = load_store() if frame is None else frame
+    col = name if name in frame.columns else next(c for c in frame.columns if c.endswith("." + name))
+    return frame.set_index(KEY_COLUMNS)[col]
+
+
+def get_record(company, period, frame=None):
+    """רשומה מקוננת במבנה FULL_DATA, או None"""
+    frame = load_store() if frame is None else frame
+    rows = frame[(frame["company"] == company) & (frame["period"] == period)]
+    return unflatten_row(rows.iloc[0]) if len(rows) else None
+
+
+def audited_mismatches(frame=None, seed_dir=SEED_DIR):
+    """השוואת שורות audited במאגר מול קובצי ה-seed: [(company, period, column, seed, store)]; ריק = זהה"""
+    frame = load_store() if frame is None else frame
+    rows = frame[frame["source"] == "audited"].set_index(KEY_COLUMNS)
+    values = [c for c in rows.columns if c not in TEXT_COLUMNS and not c.startswith(EXTRA_PREFIX)]
+    out = []
+    for seed in sorted(glob.glob(os.path.join(seed_dir, "*.json"))):
+        with open(seed, encoding="utf-8") as f:
+            full_data = json.load(f)
+        for period, companies in full_data.items():
+            for company, record in companies.items():
+                if (company, period) not in rows.index:
+                    out.append((company, period, "source", "audited", None))
+                    continue
+                row, flat = rows.loc[(company, period)], flatten_record(record)
+                for col in values:
+                    expected, actual = flat.get(col, np.nan), row[col]
+                    if not (expected == actual or pd.isna(expected) and pd.isna(actual)):
+                        out.append((company, period, col, expected, actual))
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ניהול מאגר המדדים")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("rebuild")
+    sub.add_parser("verify")
+    p = sub.add_parser("import-json"); p.add_argument("path")
+    p = sub.add_parser("import-csv"); p.add_argument("path", nargs="?", default=CSV_PATH)
+    p = sub.add_parser("import-extraction"); p.add_argument("company"); p.add_argument("period"); p.add_argument("path")
+    args = parser.parse_args(argv)
+
+    if args.cmd in ("rebuild", "verify"):
+        frame = build_from_sources() if args.cmd == "rebuild" else load_store()
+        mismatches = audited_mismatches(frame)
+        for m in mismatches:
+            print("audited != seed: %s %s %s: %r -> %r" % m, file=sys.stderr)
+        if mismatches:
+            return 1
+        if args.cmd == "rebuild":
+            save_store(frame)
+    else:
+        if args.cmd == "import-json":
+            with open(args.path, encoding="utf-8") as f:
+                incoming = from_nested(json.load(f))
+        elif args.cmd == "import-csv":
+            incoming = from_csv(args.path)
+        else:
+            with open(args.path, encoding="utf-8") as f:
+                incoming = from_extraction(args.company, args.period, json.load(f))
+        frame = upsert(incoming)
+    print(f"{len(frame)} שורות, {frame['company'].nunique()} חברות, {frame['period'].nunique()} תקופות -> {STORE_PATH}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
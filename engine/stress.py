@@ -0,0 +1,101 @@
+"""מנוע מבחני קיצון: מודל השפעה משותף (נקודתי), Monte Carlo מתואם ו-VaR/ES ברמת 99.5%
+
+מודל ההשפעה הליניארי הוא אותו מודל שהסימולטור השתמש בו; כאן הוא מוגדר כנתונים כדי שהסימולטור,
+ה-Monte Carlo ומבחן הקיצון ההפוך (reverse stress) ישתמשו בדיוק באותם מקדמים.
+"""
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from engine.store import load_store, store_version
+
+# ספי סולבנסי (כמו ב-get_red_flags): מתחת ל-100% נדרשת תוכנית הבראה, מתחת ל-115% אזהרה
+SOLVENCY_CRITICAL = 100.0
+SOLVENCY_WARNING = 115.0
+CONFIDENCE = 0.995
+
+# השפעה לכל יחידת זעזוע: ריבית (נ"א), מניות (%), ביטולים (%), אירוע קטסטרופה (0/1)
+IMPACT_MODEL = {
+    "solvency": {"rate": 12.0, "equity": 0.45, "lapse": 0.0, "cat": -15.0},
+    "csm": {"rate": 250.0, "equity": 60.0, "lapse": -120.0, "cat": -1500.0},
+}
+FACTORS = ("rate", "equity", "lapse")
+
+# פרמטרי ברירת מחדל להתפלגות הזעזועים סביב התרחיש שנבחר בסליידרים
+DEFAULT_VOLS = (0.75, 15.0, 10.0)
+DEFAULT_CORR = ((1.0, 0.3, 0.2),
+                (0.3, 1.0, -0.4),
+                (0.2, -0.4, 1.0))
+DEFAULT_CAT_PROB = 0.005  # 1 ל-200 שנה
+DEFAULT_SCENARIOS = 100_000
+
+
+def shock_impact(rate, equity, lapse, cat=0.0, model=IMPACT_MODEL):
+    """(השפעה על יחס הסולבנסי בנקודות %, השפעה על ה-CSM במיליוני ש"ח); תומך ב-broadcasting"""
+    sol, csm = model["solvency"], model["csm"]
+    sol_impact = rate * sol["rate"] + equity * sol["equity"] + lapse * sol["lapse"] + cat * sol["cat"]
+    csm_impact = rate * csm["rate"] + equity * csm["equity"] + lapse * csm["lapse"] + cat * csm["cat"]
+    return sol_impact, csm_impact
+
+
+def draw_shocks(center, vols=DEFAULT_VOLS, corr=DEFAULT_CORR, cat_prob=DEFAULT_CAT_PROB, n=DEFAULT_SCENARIOS, seed=0):
+    """מטריצת זעזועים (n, 3) מנורמלית רב-ממדית + וקטור אירועי קטסטרופה (n,)"""
+    rng = np.random.default_rng(seed)
+    cov = np.outer(vols, vols) * np.asarray(corr)
+    chol = np.linalg.cholesky(cov)
+    shocks = np.asarray(center, dtype=np.float64) + rng.standard_normal((n, 3)) @ chol.T
+    cat = (rng.random(n) < cat_prob).astype(np.float64)
+    return shocks, cat
+
+
+def _tail_stats(impact, base, thresholds):
+    """VaR/ES ברמת CONFIDENCE (כהפסד ביחס לבסיס) והסתברויות חציית ספים.
+    ההשפעה זהה לכל החברות (הזזה של הבסיס), ולכן ממיינים את התרחישים פעם אחת
+    ומחשבים הסתברויות לכל חברה ב-searchsorted - O(n log n + companies log n)."""
+    n = impact.shape[0]
+    k = max(1, int(round(n * (1 - CONFIDENCE))))
+    ordered = np.sort(impact)
+    tail = ordered[:k]
+    out = {"mean": base + ordered.mean(), "var": np.full(base.shape, -tail[-1]), "es": np.full(base.shape, -tail.mean())}
+    for t in thresholds:
+        out[f"p_below_{int(t)}"] = np.searchsorted(ordered, t - base, side="left") / n
+    return out
+
+
+def simulate(base_sol, base_csm, center=(0.0, 0.0, 0.0), cat_event=False, vols=DEFAULT_VOLS, corr=DEFAULT_CORR,
+             cat_prob=DEFAULT_CAT_PROB, n=DEFAULT_SCENARIOS, seed=0, keep_samples=0):
+    """Monte Carlo וקטורי לכל החברות יחד (אותם תרחישים לכולן). מחזיר (DataFrame סיכום, דגימות סולבנסי)"""
+    base_sol = np.asarray(base_sol, dtype=np.float64)
+    base_csm = np.asarray(base_csm, dtype=np.float64)
+    shocks, cat = draw_shocks(center, vols, corr, 1.0 if cat_event else cat_prob, n, seed)
+    sol_impact, csm_impact = shock_impact(shocks[:, 0], shocks[:, 1], shocks[:, 2], cat)
+    sol = _tail_stats(sol_impact, base_sol, (SOLVENCY_CRITICAL, SOLVENCY_WARNING))
+    csm = _tail_stats(csm_impact, base_csm, ())
+    summary = pd.DataFrame({
+        "base_solvency": base_sol, "mean_solvency": sol["mean"],
+        "var_solvency": sol["var"], "es_solvency": sol["es"],
+        "p_below_100": sol["p_below_100"], "p_below_115": sol["p_below_115"],
+        "base_csm": base_csm, "mean_csm": csm["mean"], "var_csm": csm["var"], "es_csm": csm["es"],
+    })
+    samples = base_sol[:, None] + sol_impact[None, :keep_samples] if keep_samples else None
+    return summary, samples
+
+
+@lru_cache(maxsize=128)
+def _simulate_market(period, version, center, cat_event, vols, corr, cat_prob, n, seed, keep_samples):
+    frame = load_store()
+    rows = frame[frame["period"] == period]
+    rows = rows[rows["solvency.solvency_ratio"].notna()]
+    summary, samples = simulate(rows["solvency.solvency_ratio"].to_numpy(), rows["core_kpis.total_csm"].to_numpy(),
+                                center, cat_event, vols, corr, cat_prob, n, seed, keep_samples)
+    summary.insert(0, "company", rows["company"].to_numpy())
+    return summary, samples
+
+
+def simulate_market(period, center=(0.0, 0.0, 0.0), cat_event=False, vols=DEFAULT_VOLS, corr=DEFAULT_CORR,
+                    cat_prob=DEFAULT_CAT_PROB, n=DEFAULT_SCENARIOS, seed=0, keep_samples=5000):
+    """כל המבטחים ברבעון; נשמר במטמון לפי (רבעון, גרסת נתונים, סט פרמטרים)"""
+    corr = tuple(map(tuple, corr))
+    return _simulate_market(period, store_version(), tuple(float(c) for c in center), bool(cat_event),
+                            tuple(vols), corr, float(cat_prob), int(n), int(seed), int(keep_samples))
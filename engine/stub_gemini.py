@@ -0,0 +1,110 @@
+"""שרת דמה מקומי ל-Gemini (generateContent + File API) לבדיקות ולפיתוח ללא מכסת API
+
+שימוש:
+    python -m engine.stub_gemini --port 8765 --response sample.json
+    GEMINI_BASE_URL=http://127.0.0.1:8765 python -m engine.batch --api-key test
+"""
+import argparse
+import json
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_RESPONSE = {
+    "core_kpis": {"net_profit": None, "total_csm": None, "roe": None, "gross_premiums": None, "total_assets": None},
+    "ifrs17_segments": {}, "investment_mix": {}, "financial_ratios": {}, "solvency": {}, "consistency_check": {},
+    "meta": {"confidence": 0.5}
+}
+
+
+class StubGemini(ThreadingHTTPServer):
+    """שרת עם תגובה קבועה, תור סטטוסים מתוכנן (למשל [429, 200]) ויומן בקשות.
+    files מחזיק את הקבצים שהועלו; הסרה ממנו מדמה URI שפג תוקפו (403 כמו ב-File API)."""
+
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 0), response=None, statuses=None):
+        super().__init__(address, _Handler)
+        self.response = response or DEFAULT_RESPONSE
+        self.statuses = list(statuses or [])
+        self.requests = []
+        self.files = {}
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def next_status(self):
+        with self._lock:
+            return self.statuses.pop(0) if self.statuses else 200
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, headers=None):
+        raw = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self.server.requests.append({"path": self.path, "bytes": len(body), "headers": dict(self.headers)})
+        command = self.headers.get("X-Goog-Upload-Command", "")
+        if self.path.startswith("/upload/v1beta/files") and command == "start":
+            upload_id = uuid.uuid4().hex
+            host = self.headers.get("Host")
+            return self._send(200, {}, {"X-Goog-Upload-URL": f"http://{host}/upload/session/{upload_id}"})
+        if self.path.startswith("/upload/session/"):
+            name = f"files/{self.path.rsplit('/', 1)[-1]}"
+            self.server.files[name] = len(body)
+            return self._send(200, {"file": {"name": name, "uri": f"{self.server.base_url}/v1beta/{name}"}})
+        if ":generateContent" in self.path:
+            uri = _file_uri(body)
+            if uri and uri.rsplit("/v1beta/", 1)[-1] not in self.server.files:
+                return self._send(403, {"error": {"code": 403, "status": "PERMISSION_DENIED"}})
+            status = self.server.next_status()
+            if status != 200:
+                return self._send(status, {"error": {"code": status}}, {"Retry-After": "0"})
+            text = "```json\n" + json.dumps(self.server.response, ensure_ascii=False) + "\n```"
+            return self._send(200, {"candidates": [{"content": {"parts": [{"text": text}]}}]})
+        self._send(404, {"error": {"code": 404}})
+
+
+def _file_uri(body):
+    """ה-URI של קובץ מצורף בבקשת generateContent ("" אם אין)"""
+    try:
+        parts = json.loads(body)["contents"][0]["parts"]
+    except (ValueError, KeyError, IndexError):
+        return ""
+    return next((p["file_data"]["file_uri"] for p in parts if "file_data" in p), "")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="שרת דמה ל-Gemini")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--response", help="קובץ JSON שיוחזר כתוצאת החילוץ")
+    args = parser.parse_args(argv)
+    response = None
+    if args.response:
+        with open(args.response, encoding="utf-8") as f:
+            response = json.load(f)
+    server = StubGemini((args.host, args.port), response)
+    print(f"Stub Gemini מאזין ב-{server.base_url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""מדידת ביצועים בנתיבים החמים: spans (משך + מאפיינים) ומונים, עם יצוא ליומן JSONL ולקובץ Prometheus
+
+    with span("http.roundtrip", attempt=1) as s:
+        response = client.generate_text(...)
+        s.set(status=response.status_code, bytes=len(response.content))
+    count("extract.retries", reason="429")
+
+כל span נשמר בחוצץ טבעתי בזיכרון (ל-p50/p95 בפאנל הביצועים בדשבורד) ונכתב כשורה ליומן
+TELEMETRY_DIR/spans.jsonl, כך שגם תהליך העובדים (engine.jobs) נמדד. קובץ metrics.prom
+(פורמט הטקסט של Prometheus, ל-node_exporter textfile collector) נכתב מחדש לכל היותר פעם
+ב-PROM_INTERVAL שניות ובסיום התהליך, קובץ לכל תפקיד (metrics_streamlit.prom, metrics_jobs.prom);
+"python -m engine.telemetry prom" מאחד את כל התהליכים מתוך היומן.
+APEX_TELEMETRY=0 מכבה את הכתיבה לדיסק (המדידה בזיכרון נשארת).
+
+שימוש:
+    python -m engine.telemetry summary
+    python -m engine.telemetry prom
+"""
+import argparse
+import atexit
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+
+import numpy as np
+import pandas as pd
+
+from engine import CACHE_DIR
+
+TELEMETRY_DIR = os.path.join(CACHE_DIR, "telemetry")
+LOG_PATH = os.path.join(TELEMETRY_DIR, "spans.jsonl")
+PROM_PATH = os.path.join(TELEMETRY_DIR, "metrics.prom")
+ROLE = os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0] or "python"
+ENABLED = os.environ.get("APEX_TELEMETRY", "1") != "0"
+BUFFER_SIZE = 2048       # מדידות אחרונות לכל שלב
+MAX_LOG_BYTES = 20 * 1024 * 1024
+PROM_INTERVAL = 10.0
+
+_lock = threading.Lock()
+_durations = defaultdict(lambda: deque(maxlen=BUFFER_SIZE))
+_totals = defaultdict(lambda: [0, 0.0, 0])  # stage -> [count, sum_ms, errors]
+_counters = defaultdict(float)                # (name, labels) -> value
+_log = {"file": None, "prom_at": 0.0}
+
+
+class Span:
+    """מדידה אחת; set() מוסיף מאפיינים (סטטוס, בתים, פגיעת מטמון) לפני הסגירה"""
+
+    __slots__ = ("name", "attrs", "start", "ms")
+
+    def __init__(self, name, attrs):
+        self.name, self.attrs, self.start, self.ms = name, attrs, time.perf_counter(), None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+        return self
+
+    def stop(self, error=None):
+        if self.ms is None:
+            self.ms = (time.perf_counter() - self.start) * 1000
+            if error is not None:
+                self.attrs["error"] = type(error).__name__
+            record(self.name, self.ms, **self.attrs)
+        return self.ms
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop(exc)
+        return False
+
+
+def span(name, **attrs):
+    return Span(name, attrs)
+
+
+def timed(name=None):
+    """דקורטור: כל קריאה לפונקציה היא span"""
+    def decorator(fn):
+        stage = name or f"{fn.__module__}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _add(name, ms, error):
+    _durations[name].append(ms)
+    totals = _totals[name]
+    totals[0] += 1
+    totals[1] += ms
+    totals[2] += error
+
+
+def record(name, ms, **attrs):
+    """מדידה שנמדדה מבחוץ (למשל זמן מצטבר של קידוד base64 בזמן שליחה)"""
+    with _lock:
+        _add(name, ms, "error" in attrs)
+    _write({"ts": round(time.time(), 3), "pid": os.getpid(), "stage": name, "ms": round(ms, 3), **attrs})
+
+
+def _labels(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def count(name, value=1, **labels):
+    """מונה מצטבר (ניסיונות חוזרים, קודי סטטוס, בתים, פגיעות מטמון)"""
+    key = (name, _labels(labels))
+    with _lock:
+        _counters[key] += value
+    _write({"ts": round(time.time(), 3), "pid": os.getpid(), "counter": name, "value": value, **labels})
+
+
+def _write(event):
+    if not ENABLED: return
+    line = json.dumps(event, ensure_ascii=False, default=str) + "\n"
+    with _lock:
+        try:
+            f = _log["file"]
+            if f is None:
+                os.makedirs(TELEMETRY_DIR, exist_ok=True)
+                f = _log["file"] = open(LOG_PATH, "a", encoding="utf-8", buffering=1)
+            f.write(line)
+            if f.tell() > MAX_LOG_BYTES:
+                f.close()
+                os.replace(LOG_PATH, LOG_PATH + ".1")
+                _log["file"] = None
+        except OSError:
+            return
+        due = time.monotonic() - _log["prom_at"] > PROM_INTERVAL
+        if due: _log["prom_at"] = time.monotonic()
+    if due: write_prometheus(_role_path())
+
+
+# ==============================================================================
+# סיכומים ויצוא
+# ==============================================================================
+STATS_COLUMNS = ["stage", "count", "p50_ms", "p95_ms", "max_ms", "total_ms", "errors"]
+
+
+def _summarize(durations, totals):
+    rows = []
+    for stage, values in durations.items():
+        arr = np.fromiter(values, dtype=np.float64)
+        if not len(arr): continue
+        n, total, errors = totals.get(stage, (len(arr), arr.sum(), 0))
+        rows.append([stage, n, np.percentile(arr, 50), np.percentile(arr, 95), arr.max(), total, errors])
+    return pd.DataFrame(rows, columns=STATS_COLUMNS).sort_values("total_ms", ascending=False).reset_index(drop=True)
+
+
+def stats():
+    """p50/p95 לכל שלב בתהליך הנוכחי (מתוך החוצץ הטבעתי)"""
+    with _lock:
+        durations = {k: list(v) for k, v in _durations.items()}
+        totals = {k: tuple(v) for k, v in _totals.items()}
+    return _summarize(durations, totals)
+
+
+def counters():
+    with _lock:
+        items = list(_counters.items())
+    return pd.DataFrame([{"name": n, "labels": ",".join(f"{k}={v}" for k, v in labels), "value": value}
+                         for (n, labels), value in items], columns=["name", "labels", "value"])
+
+
+def log_stats(path=LOG_PATH, tail=BUFFER_SIZE * 8):
+    """p50/p95 לכל שלב מכל התהליכים (הדשבורד ותהליך העובדים), מתוך סוף היומן"""
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=STATS_COLUMNS)
+    with open(path, "rb") as f:
+        f.seek(max(0, os.path.getsize(path) - tail * 200))
+        lines = f.read().decode("utf-8", "replace").splitlines()[-tail:]
+    durations, totals = defaultdict(list), defaultdict(lambda: [0, 0.0, 0])
+    for line in lines:
+        try:
+            event = json.loads(line)
+        except ValueError:
+            continue
+        if "stage" not in event: continue
+        durations[event["stage"]].append(event["ms"])
+        t = totals[event["stage"]]
+        t[0], t[1], t[2] = t[0] + 1, t[1] + event["ms"], t[2] + ("error" in event)
+    return _summarize(durations, {k: tuple(v) for k, v in totals.items()})
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+def prometheus_text():
+    lines = ["# HELP apex_stage_seconds Duration of instrumented stages", "# TYPE apex_stage_seconds summary"]
+    for row in stats().itertuples(index=False):
+        stage = _label(row.stage)
+        lines.append(f'apex_stage_seconds{{stage="{stage}",quantile="0.5"}} {row.p50_ms / 1000:.6f}')
+        lines.append(f'apex_stage_seconds{{stage="{stage}",quantile="0.95"}} {row.p95_ms / 1000:.6f}')
+        lines.append(f'apex_stage_seconds_sum{{stage="{stage}"}} {row.total_ms / 1000:.6f}')
+        lines.append(f'apex_stage_seconds_count{{stage="{stage}"}} {row.count}')
+    lines += ["# HELP apex_events_total Instrumented counters", "# TYPE apex_events_total counter"]
+    with _lock:
+        items = sorted(_counters.items())
+    for (name, labels), value in items:
+        extra = "".join(f',{k}="{_label(v)}"' for k, v in labels)
+        lines.append(f'apex_events_total{{name="{_label(name)}"{extra}}} {value:g}')
+    return "\n".join(lines) + "\n"
+
+
+def _role_path():
+    return os.path.join(TELEMETRY_DIR, f"metrics_{ROLE}.prom")
+
+
+def write_prometheus(path=PROM_PATH):
+    """כתיבה אטומית (הקובץ נקרא ע"י collector חיצוני)"""
+    if not ENABLED: return None
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp{os.getpid()}"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(prometheus_text())
+        os.replace(tmp, path)
+    except OSError:
+        return None
+    return path
+
+
+def reset():
+    with _lock:
+        _durations.clear()
+        _totals.clear()
+        _counters.clear()
+
+
+atexit.register(lambda: _totals and write_prometheus(_role_path()))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="סיכום מדידות הביצועים")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("summary"); p.add_argument("--log", default=LOG_PATH)
+    p = sub.add_parser("prom"); p.add_argument("--log", default=LOG_PATH)
+    args = parser.parse_args(argv)
+
+    if args.cmd == "summary":
+        summary = log_stats(args.log)
+        with pd.option_context("display.width", 200, "display.max_rows", None):
+            print(summary.to_string(index=False, float_format=lambda v: f"{v:,.2f}") if len(summary) else "אין מדידות")
+        return 0
+    # prom: כל היומן (כל התהליכים) נטען לחוצץ ונכתב כקובץ מאוחד
+    reset()
+    with _lock, open(args.log, encoding="utf-8") if os.path.exists(args.log) else open(os.devnull) as f:
+        for line in f:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            if "stage" in event:
+                _add(event["stage"], event["ms"], "error" in event)
+            elif "counter" in event:
+                labels = {k: v for k, v in event.items() if k not in ("ts", "pid", "counter", "value")}
+                _counters[(event["counter"], _labels(labels))] += event["value"]
+    print(write_prometheus())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,286 @@
+"""שכבת סדרות עתיות מעל פאנל חברה × רבעון: מערך NumPy רציף לכל מדד, נגזרות וקטוריות ותחזית
+
+הפריסה היא (רבעון, חברה): שורה לכל רבעון ברצף (רבעון חסר = NaN), כך שהוספת רבעון היא כתיבת שורה
+בסוף מערך עם קיבולת עודפת, ו-values(metric) הוא תצוגה רציפה ללא העתקה. לכל מדד נגזרים:
+    qoq / yoy          הפרש מול הרבעון הקודם / אותו רבעון אשתקד (צמודים בלבד, לא התצפית הקודמת הזמינה)
+    roll_mean/roll_std ממוצע וסטיית תקן נעים על WINDOW רבעונים (לפחות MIN_PERIODS תצפיות)
+    annualized         רק לזרמים רבעוניים ב-ANNUALIZE (רווח): סכום 4 רבעונים אחרונים (או הרבעון × 4 כשחסר).
+                       שיעורים שמדווחים כבר בחישוב שנתי (ANNUAL_RATES, כמו ROE) אינם מוכפלים שוב
+הנגזרות מחושבות מחדש רק מהרבעון המוקדם ביותר שהשתנה (רבעון חדש = שורה אחת + חלון ההסתכלות לאחור).
+project() - מגמה לינארית (OLS) על FIT_WINDOW הרבעונים האחרונים לכל חברה, 1-4 רבעונים קדימה עם רצועת 95%.
+
+שימוש:
+    python -m engine.timeseries show --metric solvency.solvency_ratio --company Harel
+    python -m engine.timeseries project --metric core_kpis.total_csm --horizon 4
+"""
+import argparse
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+
+from engine.store import KEY_COLUMNS, load_store, period_key, period_label, store_version
+
+SERIES_METRICS = {
+    "solvency.solvency_ratio": "יחס סולבנסי (%)", "core_kpis.total_csm": "יתרת CSM (M₪)",
+    "core_kpis.net_profit": "רווח נקי (M₪)", "core_kpis.roe": "ROE (%)",
+    "core_kpis.gross_premiums": "פרמיות ברוטו (M₪)", "financial_ratios.combined_ratio": "Combined Ratio (%)",
+    "ifrs17_segments.new_business_csm": "CSM עסקים חדשים (M₪)", "solvency.scr": "SCR (M₪)",
+}
+PROJECTED = ("solvency.solvency_ratio", "core_kpis.total_csm")
+ANNUALIZE = ("core_kpis.net_profit",)  # זרמים רבעוניים: סכום 4 רבעונים
+ANNUAL_RATES = ("core_kpis.roe",)  # מדווחים בדוחות הרבעוניים כשיעור שנתי
+DERIVED = ("qoq", "yoy", "roll_mean", "roll_std")
+WINDOW = 4
+MIN_PERIODS = 2
+LOOKBACK = max(4, WINDOW - 1)  # רבעונים קודמים שנדרשים לחישוב נגזרת של רבעון
+FIT_WINDOW = 8
+MAX_HORIZON = 4
+Z95 = 1.96
+
+
+def _ordinal(period):
+    year, quarter = period_key(period)
+    return year * 4 + quarter - 1
+
+
+def _label(ordinal):
+    return period_label(ordinal // 4, ordinal % 4 + 1)
+
+
+def _shift_diff(x, k):
+    out = np.full_like(x, np.nan)
+    if len(x) > k:
+        out[k:] = x[k:] - x[:-k]
+    return out
+
+
+def _window_sums(x, w):
+    """(count, sum, sum of squares) על חלון של w שורות אחורה, לכל שורה - בסכומים מצטברים"""
+    valid = ~np.isnan(x)
+    v = np.where(valid, x, 0.0)
+    zero = np.zeros((1, x.shape[1]))
+    cums = [np.vstack([zero, np.cumsum(a, axis=0)]) for a in (valid.astype(np.float64), v, v * v)]
+    hi = np.arange(1, len(x) + 1)
+    lo = np.maximum(0, hi - w)
+    return [c[hi] - c[lo] for c in cums]
+
+
+def _rolling(x, w=WINDOW, min_periods=MIN_PERIODS):
+    count, total, squares = _window_sums(x, w)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(count >= min_periods, total / count, np.nan)
+        var = (squares - total * total / count) / (count - 1)
+        std = np.where(count >= max(min_periods, 2), np.sqrt(np.maximum(var, 0.0)), np.nan)
+    return mean, std
+
+
+def _annualize(x):
+    count, total, _ = _window_sums(x, 4)
+    return np.where(count == 4, total, x * 4)
+
+
+class TimeSeries:
+    """פאנל המדדים כמערכים רציפים; refresh() מסנכרן מול המאגר בהדרגה"""
+
+    def __init__(self, metrics=None):
+        self.metrics = list(metrics or SERIES_METRICS)
+        self._lock = threading.Lock()
+        self._version = None
+        self._hashes = {}
+        self.companies, self._col = [], {}
+        self.start, self.length = None, 0
+        self._raw, self._derived = {}, {}
+        self.recomputed = []  # רבעונים שהנגזרות שלהם חושבו בעדכון האחרון
+
+    # --------------------------------------------------------------------------
+    # מבנה
+    # --------------------------------------------------------------------------
+    @property
+    def periods(self):
+        return [_label(self.start + t) for t in range(self.length)] if self.length else []
+
+    def _capacity(self):
+        return len(next(iter(self._raw.values()))) if self._raw else 0
+
+    def _allocate(self, rows, cols):
+        cap = max(8, 1 << int(np.ceil(np.log2(max(rows, 1)))))
+        self._raw = {m: np.full((cap, cols), np.nan) for m in self.metrics}
+        self._derived = {m: {k: np.full((cap, cols), np.nan) for k in DERIVED + (("annualized",) if m in ANNUALIZE else ())}
+                         for m in self.metrics}
+
+    def _grow(self, rows, cols):
+        """הרחבת הקיבולת (הכפלה ברבעונים) ותוספת עמודות לחברות חדשות, עם שמירת התוכן"""
+        cap, n = self._capacity(), len(self.companies)
+        if rows <= cap and cols == n: return
+        new_cap = cap
+        while new_cap < rows: new_cap *= 2
+
+        def grown(a):
+            out = np.full((new_cap, cols), np.nan)
+            out[:cap, :n] = a
+            return out
+        self._raw = {m: grown(a) for m, a in self._raw.items()}
+        self._derived = {m: {k: grown(a) for k, a in d.items()} for m, d in self._derived.items()}
+
+    # --------------------------------------------------------------------------
+    # סנכרון
+    # --------------------------------------------------------------------------
+    def refresh(self, frame=None):
+        """מחזיר את תוויות הרבעונים שהנגזרות שלהם חושבו מחדש"""
+        with self._lock:
+            version = store_version() if frame is None else None
+            if frame is None and version == self._version:
+                return []
+            frame = load_store() if frame is None else frame
+            cols = [m for m in self.metrics if m in frame.columns]
+            hashes = dict(zip(zip(frame["company"], frame["period"]),
+                              pd.util.hash_pandas_object(frame[KEY_COLUMNS + cols], index=False)))
+            changed = [k for k, h in hashes.items() if self._hashes.get(k) != h]
+            removed = set(self._hashes) - set(hashes)
+            ordinals = {p: _ordinal(p) for p in frame["period"].unique()}
+            first, last = min(ordinals.values(), default=0), max(ordinals.values(), default=-1)
+            new_companies = list(dict.fromkeys(c for c, _ in changed if c not in self._col))
+
+            if removed or self.start is None or first < self.start:
+                self._rebuild(frame, ordinals, first, last)
+                t0 = 0
+            else:
+                if not changed:
+                    self._hashes, self._version = hashes, version
+                    self.recomputed = []
+                    return []
+                for c in new_companies:
+                    self._col[c] = len(self.companies) + new_companies.index(c)
+                self._grow(last - self.start + 1, len(self.companies) + len(new_companies))
+                self.companies += new_companies
+                self.length = max(self.length, last - self.start + 1)
+                t0 = min(ordinals[p] for _, p in changed) - self.start
+                self._write(frame[frame["period"].map(ordinals) - self.start >= t0], ordinals)
+            for m in self.metrics:
+                self._derive(m, t0)
+            self._hashes, self._version = hashes, version
+            self.recomputed = [_label(self.start + t) for t in range(t0, self.length)]
+            return self.recomputed
+
+    def _rebuild(self, frame, ordinals, first, last):
+        self.companies = list(dict.fromkeys(frame["company"]))
+        self._col = {c: i for i, c in enumerate(self.companies)}
+        self.start, self.length = first, last - first + 1
+        self._allocate(self.length, len(self.companies))
+        self._write(frame, ordinals)
+
+    def _write(self, rows, ordinals):
+        """פיזור וקטורי של שורות המאגר לתאים (רבעון, חברה)"""
+        if rows.empty: return
+        t = rows["period"].map(ordinals).to_numpy(dtype=np.int64) - self.start
+        c = rows["company"].map(self._col).to_numpy(dtype=np.int64)
+        for m in self.metrics:
+            a = self._raw[m]
+            a[t, c] = rows[m].to_numpy(dtype=np.float64) if m in rows.columns else np.nan
+
+    def _derive(self, metric, t0):
+        """נגזרות לרבעונים t0 והלאה, מחלון שמתחיל LOOKBACK רבעונים לפני t0"""
+        lo = max(0, t0 - LOOKBACK)
+        seg = self._raw[metric][lo:self.length]
+        off, d = t0 - lo, self._derived[metric]
+        mean, std = _rolling(seg)
+        d["qoq"][t0:self.length] = _shift_diff(seg, 1)[off:]
+        d["yoy"][t0:self.length] = _shift_diff(seg, 4)[off:]
+        d["roll_mean"][t0:self.length] = mean[off:]
+        d["roll_std"][t0:self.length] = std[off:]
+        if metric in ANNUALIZE:
+            d["annualized"][t0:self.length] = _annualize(seg)[off:]
+
+    # --------------------------------------------------------------------------
+    # שאילתות
+    # --------------------------------------------------------------------------
+    def values(self, metric, kind=None):
+        """מערך (רבעון, חברה) - תצוגה רציפה על הזיכרון הפנימי; kind: None (ערך) או אחת הנגזרות"""
+        a = self._raw[metric] if kind is None else self._derived[metric][kind]
+        return a[:self.length]
+
+    def frame(self, metric, companies=None):
+        """טבלה מסודרת: company, period, value + כל הנגזרות (שורות ללא ערך מושמטות)"""
+        names = list(companies) if companies is not None else self.companies
+        cols = [self._col[c] for c in names if c in self._col]
+        names = [self.companies[i] for i in cols]
+        n, T = len(cols), self.length
+        out = {"company": np.tile(np.array(names, dtype=object), T),
+               "period": np.repeat(np.array(self.periods, dtype=object), n),
+               "value": self.values(metric)[:, cols].ravel()}
+        for kind in self._derived[metric]:
+            out[kind] = self.values(metric, kind)[:, cols].ravel()
+        df = pd.DataFrame(out)
+        return df[df["value"].notna()].reset_index(drop=True)
+
+    def project(self, metric, horizon=MAX_HORIZON, window=FIT_WINDOW, companies=None):
+        """מגמה לינארית לכל חברה על window הרבעונים האחרונים; שורה לכל (חברה, צעד) עם רצועת 95%"""
+        k = min(window, self.length)
+        y = self.values(metric)[self.length - k:]
+        t = np.arange(k, dtype=np.float64)[:, None]
+        mask = ~np.isnan(y)
+        count = mask.sum(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            t_mean = (t * mask).sum(axis=0) / count
+            y_mean = np.where(mask, y, 0).sum(axis=0) / count
+            dt = np.where(mask, t - t_mean, 0.0)
+            sxx = (dt * dt).sum(axis=0)
+            slope = np.where(sxx > 0, (dt * np.where(mask, y - y_mean, 0)).sum(axis=0) / sxx, 0.0)
+            intercept = y_mean - slope * t_mean
+            resid = np.where(mask, y - (intercept + slope * t), 0.0)
+            sigma = np.where(count > 2, np.sqrt((resid * resid).sum(axis=0) / (count - 2)), np.nan)
+            steps = np.arange(1, horizon + 1, dtype=np.float64)[:, None]
+            t_f = k - 1 + steps
+            pred = intercept + slope * t_f
+            se = sigma * np.sqrt(1 + 1 / count + (t_f - t_mean) ** 2 / np.where(sxx > 0, sxx, np.nan))
+        names = self.companies if companies is None else [c for c in companies if c in self._col]
+        cols = [self._col[c] for c in names]
+        last = self.start + self.length - 1
+        df = pd.DataFrame({
+            "company": np.tile(np.array(names, dtype=object), horizon),
+            "period": np.repeat(np.array([_label(last + h) for h in range(1, horizon + 1)], dtype=object), len(cols)),
+            "horizon": np.repeat(np.arange(1, horizon + 1), len(cols)),
+            "value": pred[:, cols].ravel(), "lower": (pred - Z95 * se)[:, cols].ravel(),
+            "upper": (pred + Z95 * se)[:, cols].ravel(), "slope": np.tile(slope[cols], horizon),
+        })
+        return df[df["value"].notna()].reset_index(drop=True)
+
+
+_timeseries = None
+_timeseries_lock = threading.Lock()
+
+
+def get_timeseries():
+    global _timeseries
+    with _timeseries_lock:
+        if _timeseries is None:
+            _timeseries = TimeSeries()
+    _timeseries.refresh()
+    return _timeseries
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="סדרות עתיות ותחזיות למדדי השוק")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    for name in ("show", "project"):
+        p = sub.add_parser(name)
+        p.add_argument("--metric", default="solvency.solvency_ratio", choices=list(SERIES_METRICS))
+        p.add_argument("--company", action="append")
+    p.add_argument("--horizon", type=int, default=MAX_HORIZON)
+    p.add_argument("--window", type=int, default=FIT_WINDOW)
+    args = parser.parse_args(argv)
+
+    ts = get_timeseries()
+    if args.cmd == "show":
+        res = ts.frame(args.metric, args.company)
+    else:
+        res = ts.project(args.metric, args.horizon, args.window, args.company)
+    with pd.option_context("display.width", 200, "display.max_rows", None):
+        print(res.to_string(index=False, float_format=lambda v: f"{v:,.2f}"))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,328 @@
+"""שלב אימות ונרמול לפלט החילוץ: JSON גולמי מהמודל -> מילון בסכמה, עם כל השגיאות במסמך
+
+- extract_json: פענוח עמיד לפלט עטוף חלקית (```json בלי סגירה, טקסט לפני/אחרי, פסיקים מיותרים)
+- normalize: כללי המרה לפני האימות - מחרוזות אחוז ("12.5%"), מפרידי אלפים (1,234 / 1'234 / 1 234),
+  סימני כיווניות (RLM), ₪ ו-ש"ח, מינוס בסוגריים או בסוף ("(1,234)", "1,234-"), ויחידות: שדות כספיים
+  נשמרים במיליוני ₪ - ערך או מסמך באלפי ₪ (meta.units / "אלפי ש"ח") מחולק ב-1000, מיליארדים מוכפלים.
+  בלוק חסר או meta חסר מושלמים ל-{} (ערכיהם null)
+- validate: מאמת מהודר פעם אחת לכל סכמה (לפי טביעת אצבע) שאוסף את כל השגיאות, לא רק הראשונה.
+  תת-הקבוצה שהסכמות כאן משתמשות בה (type/required/properties) מתורגמת לפונקציות Python פשוטות;
+  סכמה עם מילות מפתח אחרות נבדקת ב-Draft7Validator (גם הוא נבנה פעם אחת)
+
+שימוש:
+    python -m engine.validation cache
+    python -m engine.validation file extracted.json
+"""
+import argparse
+import json
+import re
+import sys
+import threading
+import time
+from collections import namedtuple
+
+from jsonschema import Draft7Validator
+
+from engine.cache import fingerprint
+
+# שדות כספיים (מיליוני ₪); כל השאר אחוזים/יחסים שאינם עוברים המרת יחידות
+MONEY_FIELDS = frozenset(
+    [f"core_kpis.{f}" for f in ("net_profit", "total_csm", "gross_premiums", "total_assets")]
+    + [f"ifrs17_segments.{f}" for f in ("life_csm", "health_csm", "general_csm", "onerous_contracts", "new_business_csm")]
+    + [f"solvency.{f}" for f in ("tier1_capital", "tier2_capital", "scr")]
+    + [f"consistency_check.{f}" for f in ("opening_csm", "new_business_csm", "csm_release", "closing_csm")])
+# יחסים שמדווחים באחוזים; ערך מתחת לסף הוא שבר עשרוני (1.82 -> 182%)
+FRACTION_LIMITS = {"solvency.solvency_ratio": 5.0, "financial_ratios.combined_ratio": 3.0,
+                   "financial_ratios.loss_ratio": 3.0}
+# (ביטוי, מכפיל למיליונים); הסדר חשוב - "אלפי" לפני "מיליון"
+UNIT_WORDS = [
+    (re.compile(r"אלפי|אלפים|thousands?|(?<![a-z])k(?![a-z])", re.IGNORECASE), 0.001),
+    (re.compile(r"מיליארד|מיליארדי|billions?|(?<![a-z])bn?(?![a-z])", re.IGNORECASE), 1000.0),
+    (re.compile(r"מיליון|מיליוני|millions?|(?<![a-z])mn?(?![a-z])|מ'", re.IGNORECASE), 1.0),
+]
+NULL_TOKENS = frozenset(["", "null", "none", "n/a", "na", "-", "—", "–", "nan", "לא ידוע", "אין"])
+
+Result = namedtuple("Result", ["data", "errors", "coerced"])
+
+_BIDI = re.compile("[\u200e\u200f\u202a-\u202e\u2066-\u2069]")
+_SEPARATORS = re.compile("(?<=\\d)[,'\u2019\u05f3 \u00a0\u2009\u202f](?=\\d{3}(?!\\d))")
+_NUMBER = re.compile(r"[-+]?(?:\d+(?:\.\d*)?|\.\d+)(?:e[-+]?\d+)?", re.IGNORECASE)
+_FENCE = re.compile(r"```[a-zA-Z]*\s*(.*?)(?:```|$)", re.DOTALL)
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+
+def _by_block(paths):
+    blocks = {}
+    for path in paths:
+        block, field = path.split(".", 1)
+        blocks[block] = blocks.get(block, frozenset()) | {field}
+    return blocks
+
+
+_MONEY_BY_BLOCK, _FRACTION_BY_BLOCK = _by_block(MONEY_FIELDS), _by_block(FRACTION_LIMITS)
+_NONE = frozenset()
+
+
+# ==============================================================================
+# פענוח JSON
+# ==============================================================================
+def extract_json(text):
+    """הטקסט של המודל -> dict. מנסה: JSON נקי, בלוק מגודר (גם בלי סגירה), האובייקט הראשון בטקסט,
+    ולבסוף הסרת פסיקים מיותרים בין הסוגר הראשון לאחרון. ValueError אם לא נמצא אובייקט"""
+    text = text.strip()
+    candidates = [text] + [m.group(1).strip() for m in _FENCE.finditer(text)]
+    decoder = json.JSONDecoder()
+    for candidate in candidates:
+        start = candidate.find("{")
+        if start < 0: continue
+        try:
+            obj, _ = decoder.raw_decode(candidate, start)
+        except ValueError:
+            end = candidate.rfind("}")
+            try:
+                obj = json.loads(_TRAILING_COMMA.sub(r"\1", candidate[start:end + 1]))
+            except ValueError:
+                continue
+        if isinstance(obj, dict):
+            return obj
+    raise ValueError(f"לא נמצא אובייקט JSON בפלט המודל: {text[:120]!r}")
+
+
+# ==============================================================================
+# נרמול
+# ==============================================================================
+def unit_factor(text, default=None):
+    """מכפיל למיליוני ₪ לפי מילת יחידה בטקסט, או default"""
+    if not isinstance(text, str): return default
+    for pattern, factor in UNIT_WORDS:
+        if pattern.search(text): return factor
+    return default
+
+
+def parse_number(text):
+    """מחרוזת מספרית בפורמט ישראלי -> (ערך, אחוז?, מכפיל יחידה או None); ValueError אם אינה מספר"""
+    s = _BIDI.sub("", text).strip()
+    if s.lower() in NULL_TOKENS: return None, False, None
+    s = s.replace("\u2212", "-").replace("\u2013", "-")
+    factor = unit_factor(s)
+    percent = "%" in s
+    negative = s.startswith("(") and s.endswith(")") or s.endswith("-") and not s.startswith("-")
+    m = _NUMBER.search(_SEPARATORS.sub("", s))
+    if m is None: raise ValueError(text)
+    value = float(m.group())
+    return (-abs(value) if negative else value), percent, factor
+
+
+def _coerce(path, value, doc_factor, coerced):
+    if value is None or isinstance(value, bool): return value
+    if type(value) in (int, float) and path not in MONEY_FIELDS and path not in FRACTION_LIMITS: return value
+    factor = None
+    if isinstance(value, str):
+        try:
+            number, percent, factor = parse_number(value)
+        except ValueError:
+            return value  # נשאר מחרוזת - האימות ידווח
+        if number is None or percent:
+            coerced.append(f"{path}: {value!r} -> {number}")
+            return number
+        original, value = value, number
+    elif not isinstance(value, (int, float)):
+        return value
+    else:
+        original = value
+    if path in MONEY_FIELDS:
+        factor = factor or doc_factor or 1.0
+        if factor != 1.0: value = round(value * factor, 6)
+    elif path in FRACTION_LIMITS and 0 < abs(value) < FRACTION_LIMITS[path]:
+        value = round(value * 100, 6)
+    if value != original or not isinstance(original, (int, float)):
+        coerced.append(f"{path}: {original!r} -> {value}")
+    return value
+
+
+def normalize(data, schema):
+    """מחזיר (data מנורמל, רשימת המרות "block.field: לפני -> אחרי"); data המקורי לא משתנה"""
+    if isinstance(data, list) and len(data) == 1: data = data[0]
+    if not isinstance(data, dict): return data, []
+    data, coerced = dict(data), []
+    meta = data.get("meta")
+    if not isinstance(meta, dict):
+        coerced.append("meta: חסר -> {}")
+        meta = {}
+    data["meta"] = meta = dict(meta)
+    units = data.pop("units", None)
+    doc_factor = unit_factor(meta.get("units") or units)
+    if doc_factor not in (None, 1.0):
+        meta["units"] = "מיליוני ש\"ח"  # הערכים מומרים כאן; נרמול חוזר לא ימיר שוב
+    if isinstance(meta.get("confidence"), str):
+        try:
+            value, percent, _ = parse_number(meta["confidence"])
+            meta["confidence"] = value / 100 if percent and value is not None else value
+            coerced.append(f"meta.confidence: -> {meta['confidence']}")
+        except ValueError:
+            pass
+    for block in schema.get("properties", {}):
+        if block == "meta": continue
+        values = data.get(block)
+        if values is None:
+            if block in schema.get("required", ()):
+                coerced.append(f"{block}: חסר -> {{}}")
+                data[block] = {}
+            continue
+        if not isinstance(values, dict): continue
+        # מספר רגיל בשדה שאינו דורש המרה (הרוב המוחלט ברשומות תקינות) מועתק כמו שהוא
+        special = _FRACTION_BY_BLOCK.get(block, _NONE) | (_MONEY_BY_BLOCK.get(block, _NONE) if doc_factor else _NONE)
+        data[block] = {k: v if (type(v) is float or type(v) is int) and k not in special
+                       else _coerce(f"{block}.{k}", v, doc_factor, coerced) for k, v in values.items()}
+    return data, coerced
+
+
+# ==============================================================================
+# אימות מהודר
+# ==============================================================================
+_TYPES = {"number": (int, float), "string": (str,), "object": (dict,), "array": (list,), "boolean": (bool,),
+          "null": (type(None),)}
+_SIMPLE_KEYWORDS = frozenset(["type", "required", "properties", "title", "description", "$schema"])
+_MISSING = object()
+
+
+def _types(schema):
+    """(טיפוסי Python, לפסול bool?, תיאור) לפי type, או None אם אינו נתמך"""
+    types = schema.get("type")
+    types = [types] if isinstance(types, str) else types or []
+    if any(t not in _TYPES for t in types): return None
+    py_types = tuple(t for name in types for t in _TYPES[name]) or None
+    return py_types, bool(types) and "boolean" not in types, " או ".join(types)  # bool הוא תת-מחלקה של int
+
+
+def _compile(schema, path=""):
+    """סכמה -> check(value, errors), או None אם יש מילות מפתח מחוץ לתת-הקבוצה הפשוטה.
+    אין מערכים בתת-הקבוצה, כך שנתיב כל שדה ידוע בזמן ההידור; שדות עלה נבדקים בלולאה של האב"""
+    if not isinstance(schema, dict) or set(schema) - _SIMPLE_KEYWORDS: return None
+    own = _types(schema)
+    if own is None: return None
+    py_types, no_bool, expected = own
+    required = tuple(schema.get("required", ()))
+    leaves, nested = [], []
+    for name, sub in schema.get("properties", {}).items():
+        sub_path = f"{path}.{name}" if path else name
+        if isinstance(sub, dict) and set(sub) <= {"type", "title", "description"}:
+            spec = _types(sub)
+            if spec is None: return None
+            if spec[0] is not None: leaves.append((name, *spec, sub_path))
+            continue
+        check = _compile(sub, sub_path)
+        if check is None: return None
+        nested.append((name, check))
+    where = path or "<root>"
+
+    def check(value, errors):
+        if py_types is not None and (not isinstance(value, py_types) or no_bool and isinstance(value, bool)):
+            errors.append(f"{where}: {value!r} אינו {expected}")
+            return
+        if not isinstance(value, dict): return
+        for name in required:
+            if name not in value: errors.append(f"{where}: חסר השדה '{name}'")
+        get = value.get
+        for name, types, reject_bool, label, field_path in leaves:
+            v = get(name, _MISSING)
+            if v is _MISSING: continue
+            if not isinstance(v, types) or reject_bool and isinstance(v, bool):
+                errors.append(f"{field_path}: {v!r} אינו {label}")
+        for name, sub in nested:
+            if name in value: sub(value[name], errors)
+    return check
+
+
+class CompiledValidator:
+    """נבנה פעם אחת לכל סכמה; errors() מחזיר את כל השגיאות במסמך"""
+
+    def __init__(self, schema):
+        Draft7Validator.check_schema(schema)
+        self.schema = schema
+        self._check = _compile(schema)
+        self._draft = None if self._check else Draft7Validator(schema)
+
+    def errors(self, data):
+        if self._check is not None:
+            errors = []
+            self._check(data, errors)
+            return errors
+        return [f"{'.'.join(map(str, e.absolute_path)) or '<root>'}: {e.message}"
+                for e in sorted(self._draft.iter_errors(data), key=lambda e: list(map(str, e.absolute_path)))]
+
+    def is_valid(self, data):
+        return not self.errors(data)
+
+
+_validators = {}
+_validators_lock = threading.Lock()
+
+
+def get_validator(schema):
+    key = fingerprint(schema)
+    with _validators_lock:
+        if key not in _validators:
+            _validators[key] = CompiledValidator(schema)
+        return _validators[key]
+
+
+def validate(data, schema):
+    """כל השגיאות במסמך (רשימה ריקה = תקין)"""
+    return get_validator(schema).errors(data)
+
+
+def prepare(data, schema):
+    """נרמול + אימות: Result(data, errors, coerced). data יכול להיות טקסט המודל או dict"""
+    if isinstance(data, str): data = extract_json(data)
+    data, coerced = normalize(data, schema)
+    return Result(data, validate(data, schema), coerced)
+
+
+def validate_many(docs, schema):
+    """אימות בכמות (למשל כל המטמון): [(key, Result)] לכל (key, doc)"""
+    validator = get_validator(schema)
+    out = []
+    for key, doc in docs:
+        data, coerced = normalize(doc, schema)
+        out.append((key, Result(data, validator.errors(data), coerced)))
+    return out
+
+
+def main(argv=None):
+    from engine.extraction import IFRS17_SCHEMA, get_extraction_cache
+
+    parser = argparse.ArgumentParser(description="אימות ונרמול תוצאות חילוץ")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("cache"); p.add_argument("--verbose", action="store_true")
+    p = sub.add_parser("file"); p.add_argument("path")
+    args = parser.parse_args(argv)
+
+    if args.cmd == "file":
+        with open(args.path, encoding="utf-8") as f:
+            result = prepare(f.read(), IFRS17_SCHEMA)
+        for line in result.coerced: print(f"~ {line}")
+        for line in result.errors: print(f"✗ {line}")
+        print("תקין" if not result.errors else f"{len(result.errors)} שגיאות")
+        return 1 if result.errors else 0
+
+    # רשומות חלקיות נבדקות מול הבלוקים של הסכמה המלאה, בלי חובת בלוקים
+    partial = {**IFRS17_SCHEMA, "required": ["meta"]}
+    entries = list(get_extraction_cache().payloads())
+    start = time.perf_counter()
+    results = validate_many([((ns, h), doc) for h, ns, doc in entries if ns == "full"], IFRS17_SCHEMA)
+    results += validate_many([((ns, h), doc) for h, ns, doc in entries if ns != "full"], partial)
+    elapsed = time.perf_counter() - start
+    invalid = [(key, r) for key, r in results if r.errors]
+    for (ns, h), r in results:
+        if r.errors or args.verbose and r.coerced:
+            print(f"{h[:12]} [{ns}]")
+            for line in r.coerced: print(f"  ~ {line}")
+            for line in r.errors: print(f"  ✗ {line}")
+    print(f"{len(results)} רשומות, {len(invalid)} לא תקינות, "
+          f"{sum(bool(r.coerced) for _, r in results)} עם המרות ({elapsed * 1000:.0f}ms)")
+    return 1 if invalid else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
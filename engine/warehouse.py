@@ -0,0 +1,229 @@
+"""אינדקס (manifest) למחסן הדוחות: (חברה, שנה, רבעון, סוג, הערכה, מבוסס על) -> hash תוכן ונתיב
+
+הסורק מצטבר: קובץ שגודלו ו-mtime שלו לא השתנו אינו נקרא מחדש. נסרקים גם המחסן הראשי
+(<Company>/<Year>/<Qn>/<Type>_Reports/) וגם העץ הישן data/<Company>/<Year>/<Qn>/<type>/.
+כל הקוראים (הדשבורד, האצווה, בנצ'מרק החילוץ) מאתרים דוחות דרך resolve_report / Manifest.entries
+במקום להרכיב נתיבים; שמות עם סיומת כפולה (.pdf.pdf) מנורמלים באינדקס. dedupe מחליף עותקים זהים בתוכן ב-hardlink לעותק קנוני אחד.
+
+שימוש:
+    python -m engine.warehouse scan
+    python -m engine.warehouse list [--duplicates]
+    python -m engine.warehouse resolve Harel 2025 Q1 Solvency
+    python -m engine.warehouse dedupe [--dry-run]
+"""
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import namedtuple
+
+from engine import CACHE_DIR, DATA_DIR
+from engine.cache import fingerprint, hash_file
+
+WAREHOUSE_DIR = os.path.join(DATA_DIR, "Insurance_Warehouse")
+MANIFEST_DB = os.path.join(CACHE_DIR, "warehouse.sqlite")
+REPORT_TYPES = ("Financial", "Solvency")
+SCAN_TTL = 30.0  # שניות בין סריקות אוטומטיות
+
+Entry = namedtuple("Entry", ["company", "year", "quarter", "report_type", "is_estimate", "based_on", "content_hash",
+                             "path", "name", "size"])
+
+_ESTIMATE = re.compile(r"_ESTIMATE(?:_Based_on_(?P<based_on>[A-Za-z0-9]+))?", re.IGNORECASE)
+_LEGACY_TYPES = {"financial": "Financial", "solvency": "Solvency"}
+
+
+def normalized_name(name):
+    """'X.pdf.pdf' -> 'X.pdf'"""
+    while name.lower().endswith(".pdf.pdf"):
+        name = name[:-4]
+    return name
+
+
+def classify(path, root):
+    """נתיב -> (company, year, quarter, report_type, is_estimate, based_on), או None אם אינו דוח"""
+    parts = os.path.relpath(path, root).split(os.sep)
+    if len(parts) != 5 or not parts[-1].lower().endswith(".pdf"):
+        return None
+    company, year, quarter, type_dir, name = parts
+    if not re.fullmatch(r"\d{4}", year) or not re.fullmatch(r"Q[1-4]", quarter):
+        return None
+    report_type = type_dir[:-len("_Reports")] if type_dir.endswith("_Reports") else _LEGACY_TYPES.get(type_dir.lower())
+    if report_type not in REPORT_TYPES:
+        return None
+    m = _ESTIMATE.search(name)
+    return company, year, quarter, report_type, bool(m), (m.group("based_on") if m else None)
+
+
+def _roots():
+    """המחסן הראשי קודם (עדיפות בפתרון), ואחריו העץ הישן תחת data/"""
+    return [WAREHOUSE_DIR, DATA_DIR]
+
+
+class Manifest:
+    def __init__(self, path=MANIFEST_DB, roots=None):
+        self.path = path
+        self.roots = roots or _roots()
+        self._lock = threading.Lock()
+        self._scanned = 0.0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("""CREATE TABLE IF NOT EXISTS reports (
+                path TEXT PRIMARY KEY, root INTEGER NOT NULL, company TEXT NOT NULL, year TEXT NOT NULL,
+                quarter TEXT NOT NULL, report_type TEXT NOT NULL, is_estimate INTEGER NOT NULL, based_on TEXT,
+                content_hash TEXT NOT NULL, name TEXT NOT NULL, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL)""")
+            db.execute("CREATE INDEX IF NOT EXISTS idx_reports_key ON reports(company, year, quarter, report_type)")
+            db.execute("CREATE INDEX IF NOT EXISTS idx_reports_hash ON reports(content_hash)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def scan(self):
+        """סריקה מצטברת; מחזיר (נסרקו, חושב להם hash מחדש, הוסרו)"""
+        with self._lock:
+            with self._connect() as db:
+                known = {p: (s, m) for p, s, m in db.execute("SELECT path, size, mtime_ns FROM reports")}
+            seen, rows = set(), []
+            for rank, root in enumerate(self.roots):
+                if not os.path.isdir(root): continue
+                for dirpath, dirnames, files in os.walk(root):
+                    # המחסן הראשי נסרק בנפרד; בעץ הישן מדלגים עליו ועל תיקיות פנימיות
+                    dirnames[:] = [d for d in dirnames if not d.startswith(".") and
+                                   os.path.join(dirpath, d) not in self.roots[:rank] + self.roots[rank + 1:]]
+                    for name in files:
+                        path = os.path.abspath(os.path.join(dirpath, name))
+                        meta = classify(path, root)
+                        if meta is None: continue
+                        seen.add(path)
+                        st = os.stat(path)
+                        if known.get(path) == (st.st_size, st.st_mtime_ns): continue
+                        rows.append((path, rank, *meta[:4], int(meta[4]), meta[5], hash_file(path),
+                                     normalized_name(name), st.st_size, st.st_mtime_ns))
+            removed = [p for p in known if p not in seen]
+            with self._connect() as db:
+                db.executemany("INSERT OR REPLACE INTO reports VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                db.executemany("DELETE FROM reports WHERE path=?", [(p,) for p in removed])
+            self._scanned = time.monotonic()
+            return len(seen), len(rows), len(removed)
+
+    def refresh(self, max_age=SCAN_TTL):
+        if time.monotonic() - self._scanned > max_age:
+            self.scan()
+
+    def entries(self, companies=None, years=None, quarters=None, report_types=None, include_estimates=True,
+                preferred_only=False):
+        """רשומות המחסן לפי סינון, ממוינות (חברה, שנה, רבעון, סוג, סופי לפני הערכה, עדיפות שורש);
+        preferred_only - רשומה אחת (המועדפת) לכל חברה/רבעון/סוג"""
+        self.refresh()
+        clauses, args = [], []
+        for col, values in (("company", companies), ("year", years), ("quarter", quarters), ("report_type", report_types)):
+            if values:
+                values = [str(v) for v in values]
+                clauses.append(f"{col} IN ({','.join('?' * len(values))})")
+                args.extend(values)
+        if not include_estimates:
+            clauses.append("is_estimate=0")
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._connect() as db:
+            rows = db.execute(f"""SELECT company, year, quarter, report_type, is_estimate, based_on, content_hash, path,
+                                  name, size FROM reports{where}
+                                  ORDER BY company, year, quarter, report_type, is_estimate, root, path""", args).fetchall()
+        out, keys = [], set()
+        for r in rows:
+            if preferred_only and r[:4] in keys: continue
+            keys.add(r[:4])
+            out.append(Entry(r[0], r[1], r[2], r[3], bool(r[4]), r[5], r[6], r[7], r[8], r[9]))
+        return out
+
+    def resolve(self, company, year, quarter, report_type="Financial", allow_estimate=True):
+        """הדוח המועדף: סופי לפני הערכה, המחסן הראשי לפני העץ הישן"""
+        quarter = quarter if str(quarter).startswith("Q") else f"Q{quarter}"
+        for e in self.entries([company], [year], [quarter], [report_type], include_estimates=allow_estimate):
+            return e
+        return None
+
+    def duplicates(self):
+        """{content_hash: [entries]} לתוכן שמופיע ביותר מנתיב אחד"""
+        groups = {}
+        for e in self.entries():
+            groups.setdefault(e.content_hash, []).append(e)
+        return {h: g for h, g in groups.items() if len(g) > 1}
+
+    def dedupe(self, dry_run=False):
+        """מחליף עותקים זהים ב-hardlink לעותק הקנוני (הראשון במיון); מחזיר (קבצים, בתים שנחסכו)"""
+        linked, saved = 0, 0
+        for group in self.duplicates().values():
+            canonical = group[0].path
+            for e in group[1:]:
+                if os.path.samefile(canonical, e.path): continue
+                linked, saved = linked + 1, saved + e.size
+                if dry_run: continue
+                tmp = f"{e.path}.link{os.getpid()}"
+                os.link(canonical, tmp)
+                os.replace(tmp, e.path)
+        if not dry_run and linked:
+            self.scan()
+        return linked, saved
+
+
+_manifests = {}
+_manifests_lock = threading.Lock()
+
+
+def get_manifest(root=None):
+    """מופע משותף לתהליך; שורש מותאם (למשל מחסן שסונכרן לתיקייה אחרת) מקבל אינדקס נפרד"""
+    root = os.path.abspath(root) if root else None
+    with _manifests_lock:
+        if root not in _manifests:
+            if root is None or root == os.path.abspath(WAREHOUSE_DIR):
+                _manifests[root] = Manifest()
+            else:
+                _manifests[root] = Manifest(os.path.join(CACHE_DIR, f"warehouse_{fingerprint(root)[:12]}.sqlite"), [root])
+        return _manifests[root]
+
+
+def resolve_report(company, year, quarter, report_types=REPORT_TYPES):
+    """הנתיב לדוח הראשון שנמצא לפי סדר סוגי הדוח (ברירת מחדל: כספי ואז סולבנסי), או None"""
+    manifest = get_manifest()
+    for report_type in report_types:
+        entry = manifest.resolve(company, year, quarter, report_type)
+        if entry: return entry.path
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="אינדקס מחסן הדוחות")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("scan")
+    p = sub.add_parser("list"); p.add_argument("--duplicates", action="store_true")
+    p = sub.add_parser("resolve"); p.add_argument("company"); p.add_argument("year"); p.add_argument("quarter")
+    p.add_argument("report_type", nargs="?", default="Financial", choices=REPORT_TYPES)
+    p = sub.add_parser("dedupe"); p.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args(argv)
+
+    manifest = get_manifest()
+    if args.cmd == "scan":
+        seen, hashed, removed = manifest.scan()
+        print(f"{seen} דוחות, {hashed} חושבו מחדש, {removed} הוסרו -> {manifest.path}")
+    elif args.cmd == "list":
+        groups = manifest.duplicates().values() if args.duplicates else [manifest.entries()]
+        for group in groups:
+            for e in group:
+                est = f" (הערכה, מבוסס {e.based_on})" if e.is_estimate else ""
+                print(f"{e.content_hash[:12]} {e.company} {e.year} {e.quarter} {e.report_type}{est}  {os.path.relpath(e.path)}")
+            if args.duplicates: print()
+    elif args.cmd == "resolve":
+        entry = manifest.resolve(args.company, args.year, args.quarter, args.report_type)
+        print(entry.path if entry else "לא נמצא")
+        return 0 if entry else 1
+    else:
+        linked, saved = manifest.dedupe(args.dry_run)
+        print(f"{'יקושרו' if args.dry_run else 'קושרו'} {linked} קבצים, {saved / 1e6:.1f}MB נחסכו")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
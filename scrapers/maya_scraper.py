@@ -1 +1,256 @@
+"""סנכרון מצטבר של דוחות רבעוניים (כספיים וסולבנסי) ממאיה/הבורסה אל מחסן הדוחות
 
+לכל מבטח: שליפת רשימת הדיווחים (בקשה מותנית - ETag/If-Modified-Since), והורדה רק של מה שהשתנה:
+- בקשה מותנית לכל קובץ (304 = ללא שינוי), והשוואת hash תוכן מול הקובץ שבדיסק לפני החלפה
+- המשך הורדה חלקית (Range + If-Range) מקובץ .part - מיד באותה הרצה אחרי ניתוק (עד RESUME_ATTEMPTS),
+  או בהרצה הבאה
+- קבצים קיימים מזוהים לפי השם המנורמל, כך ש-X.pdf.pdf שבמחסן אינו מורד שוב כעותק X.pdf
+- הורדות במקביל עם הגבלה לכל שרת (per-host)
+הקבצים נכתבים במבנה <Company>/<Year>/<Qn>/<Type>_Reports/ של המחסן. מצב הסנכרון (ETag, Last-Modified,
+hash) נשמר ב-SQLite, כך שסנכרון לילי ללא דיווחים חדשים מסתכם בבקשות 304.
+
+ממשק הרשימה (FEED_PATH) מחזיר JSON:
+    {"filings": [{"year": 2025, "quarter": 3, "type": "Solvency", "url": "/files/...pdf",
+                  "estimate": true, "based_on": "Q2"}]}
+מול שרת הדמה המקומי (scrapers/stub_maya.py) או שרת תיווך למאיה בכתובת MAYA_BASE_URL.
+
+שימוש:
+    python -m scrapers.maya_scraper --base-url http://127.0.0.1:8766
+    python -m scrapers.maya_scraper --company Harel --company Clal --workers 8 --per-host 2
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urljoin, urlparse
+
+import requests
+
+from engine import CACHE_DIR
+from engine.warehouse import REPORT_TYPES, WAREHOUSE_DIR, normalized_name
+
+STATE_DB = os.path.join(CACHE_DIR, "maya_sync.sqlite")
+DEFAULT_BASE_URL = os.environ.get("MAYA_BASE_URL", "http://127.0.0.1:8766")
+FEED_PATH = "/filings/{maya_id}"
+CHUNK_SIZE = 64 * 1024
+TIMEOUT = (10, 120)
+RESUME_ATTEMPTS = 3  # המשכי Range באותה הרצה אחרי ניתוק באמצע הורדה
+RESUME_BACKOFF = 0.5
+
+# מזהי החברות במאיה (מספר החברה בבורסה)
+COMPANIES = {"Harel": 585, "Phoenix": 767, "Migdal": 1081, "Clal": 224, "Menora": 566}
+
+Filing = namedtuple("Filing", ["company", "year", "quarter", "report_type", "url", "is_estimate", "based_on"])
+
+
+def filing_name(f):
+    """שם הקובץ המנורמל (X.pdf); הקבצים הקיימים במחסן שמורים בפועל עם סיומת כפולה (X.pdf.pdf)"""
+    name = f"{f.company}_Q{f.quarter}_{f.year}"
+    if f.report_type == "Solvency": name += "_Solvency"
+    if f.is_estimate: name += f"_ESTIMATE_Based_on_{f.based_on}" if f.based_on else "_ESTIMATE"
+    return name + ".pdf"
+
+
+def filing_path(f, root=WAREHOUSE_DIR):
+    """הקובץ הקיים בתיקיית הדיווח ששמו המנורמל זהה (גם X.pdf.pdf), ואם אין - נתיב חדש בשם X.pdf"""
+    folder = os.path.join(root, f.company, str(f.year), f"Q{f.quarter}", f"{f.report_type}_Reports")
+    name = filing_name(f)
+    if os.path.isdir(folder):
+        for existing in sorted(os.listdir(folder)):
+            if normalized_name(existing) == name:
+                return os.path.join(folder, existing)
+    return os.path.join(folder, name)
+
+
+def _hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class SyncState:
+    """ETag/Last-Modified/hash לכל כתובת (קבצים ורשימות דיווחים)"""
+
+    def __init__(self, path=STATE_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("""CREATE TABLE IF NOT EXISTS resources (
+                url TEXT PRIMARY KEY, path TEXT, etag TEXT, last_modified TEXT, content_hash TEXT, body TEXT,
+                synced_at REAL NOT NULL)""")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, url):
+        with self._lock, self._connect() as db:
+            row = db.execute("SELECT path, etag, last_modified, content_hash, body FROM resources WHERE url=?", (url,)).fetchone()
+        return dict(zip(("path", "etag", "last_modified", "content_hash", "body"), row)) if row else None
+
+    def put(self, url, path=None, etag=None, last_modified=None, content_hash=None, body=None):
+        with self._lock, self._connect() as db:
+            db.execute("INSERT OR REPLACE INTO resources VALUES (?, ?, ?, ?, ?, ?, ?)",
+                       (url, path, etag, last_modified, content_hash, body, time.time()))
+
+
+def _conditional_headers(state):
+    headers = {}
+    if state and state.get("etag"): headers["If-None-Match"] = state["etag"]
+    if state and state.get("last_modified"): headers["If-Modified-Since"] = state["last_modified"]
+    return headers
+
+
+class MayaSync:
+    """מנוע הסנכרון; session אחד משותף (חיבורים חוזרים) ומגבלת חיבורים לכל שרת"""
+
+    def __init__(self, base_url=DEFAULT_BASE_URL, root=WAREHOUSE_DIR, state=None, workers=8, per_host=2, session=None):
+        self.base_url = base_url.rstrip("/") + "/"
+        self.root = root
+        self.state = state or SyncState()
+        self.workers = workers
+        self.per_host = per_host
+        self.session = session or requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=8, pool_maxsize=max(workers, per_host))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._hosts = {}
+        self._hosts_lock = threading.Lock()
+
+    def _host_slot(self, url):
+        host = urlparse(url).netloc
+        with self._hosts_lock:
+            return self._hosts.setdefault(host, threading.Semaphore(self.per_host))
+
+    # -- גילוי ------------------------------------------------------------
+    def discover(self, company):
+        """רשימת הדיווחים של מבטח; 304 מחזיר את הרשימה השמורה"""
+        url = urljoin(self.base_url, FEED_PATH.format(maya_id=COMPANIES[company]).lstrip("/"))
+        state = self.state.get(url)
+        with self._host_slot(url):
+            resp = self.session.get(url, headers=_conditional_headers(state), timeout=TIMEOUT)
+        if resp.status_code == 304 and state and state["body"]:
+            body = json.loads(state["body"])
+        else:
+            resp.raise_for_status()
+            body = resp.json()
+            self.state.put(url, etag=resp.headers.get("ETag"), last_modified=resp.headers.get("Last-Modified"),
+                           body=json.dumps(body, ensure_ascii=False))
+        return [Filing(company, int(f["year"]), int(f["quarter"]), f["type"], urljoin(url, f["url"]),
+                       bool(f.get("estimate")), f.get("based_on"))
+                for f in body.get("filings", []) if f.get("type") in REPORT_TYPES]
+
+    # -- הורדה ------------------------------------------------------------
+    def fetch(self, filing):
+        """מוריד דיווח אחד; מחזיר (סטטוס, נתיב): new / updated / unchanged / not-modified"""
+        path = filing_path(filing, self.root)
+        state = self.state.get(filing.url)
+        on_disk = os.path.exists(path)
+        # בלי קובץ בדיסק אין טעם בבקשה מותנית; תוכן זהה עדיין מזוהה לפי hash אחרי ההורדה
+        conditional = _conditional_headers(state) if on_disk else {}
+        part, validator_file = path + ".part", path + ".part.validator"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        for attempt in range(RESUME_ATTEMPTS + 1):
+            try:
+                status, etag, last_modified = self._download(filing.url, part, validator_file, conditional)
+                break
+            except (requests.exceptions.ChunkedEncodingError, requests.exceptions.ConnectionError):
+                # ניתוק באמצע (IncompleteRead וכד') - ה-.part נשמר, והניסיון הבא ממשיך ממנו ב-Range
+                if attempt == RESUME_ATTEMPTS: raise
+                time.sleep(RESUME_BACKOFF * 2 ** attempt)
+        if status == 304:
+            return "not-modified", path
+        if status == 416:
+            # ה-.part לא תואם לקובץ בשרת - מתחילים מחדש
+            for leftover in (part, validator_file):
+                if os.path.exists(leftover): os.remove(leftover)
+            return self.fetch(filing)
+
+        digest = _hash(part)
+        if on_disk and _hash(path) == digest:
+            os.remove(part)
+            status = "unchanged"
+        else:
+            os.replace(part, path)
+            status = "updated" if on_disk else "new"
+        if os.path.exists(validator_file): os.remove(validator_file)
+        self.state.put(filing.url, path, etag, last_modified, digest)
+        return status, path
+
+    def _download(self, url, part, validator_file, conditional):
+        """בקשה אחת אל ה-.part (המשך מהיסט קיים אם הוולידטור תואם); מחזיר (status, etag, last_modified)"""
+        headers = dict(conditional)
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        if offset and os.path.exists(validator_file):
+            # המשך רק אם התוכן בשרת זהה לזה שממנו התחלנו (If-Range עם הוולידטור של ההורדה החלקית)
+            with open(validator_file, encoding="utf-8") as f:
+                headers.update({"Range": f"bytes={offset}-", "If-Range": f.read()})
+        with self._host_slot(url):
+            with self.session.get(url, headers=headers, stream=True, timeout=TIMEOUT) as resp:
+                if resp.status_code in (304, 416):
+                    return resp.status_code, None, None
+                resp.raise_for_status()
+                etag, last_modified = resp.headers.get("ETag"), resp.headers.get("Last-Modified")
+                if resp.status_code != 206 and (etag or last_modified):
+                    with open(validator_file, "w", encoding="utf-8") as f:
+                        f.write(etag or last_modified)
+                with open(part, "ab" if resp.status_code == 206 else "wb") as out:
+                    for chunk in resp.iter_content(CHUNK_SIZE):
+                        out.write(chunk)
+        return resp.status_code, etag, last_modified
+
+    def sync(self, companies=None, progress=print):
+        """גילוי לכל המבטחים ואז הורדה מקבילית; מחזיר רשימת (filing, status, path)"""
+        companies = companies or list(COMPANIES)
+        started = time.monotonic()
+        results = []
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            feeds = {pool.submit(self.discover, c): c for c in companies}
+            filings = []
+            for fut in as_completed(feeds):
+                try:
+                    filings.extend(fut.result())
+                except requests.RequestException as e:
+                    progress(f"❌ {feeds[fut]}: {e}")
+            downloads = {pool.submit(self.fetch, f): f for f in filings}
+            for fut in as_completed(downloads):
+                f = downloads[fut]
+                try:
+                    status, path = fut.result()
+                except (requests.RequestException, OSError) as e:
+                    status, path = f"error: {e}", None
+                results.append((f, status, path))
+                if status not in ("not-modified", "unchanged"):
+                    progress(f"{'✅' if path else '❌'} {f.company} Q{f.quarter} {f.year} {f.report_type}: {status}")
+        counts = {}
+        for _, status, _ in results:
+            counts[status.split(":")[0]] = counts.get(status.split(":")[0], 0) + 1
+        progress(f"הסתיים: {len(results)} דיווחים {counts}, {time.monotonic() - started:.1f}s")
+        return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="סנכרון דוחות ממאיה אל מחסן הדוחות")
+    parser.add_argument("--base-url", default=DEFAULT_BASE_URL)
+    parser.add_argument("--root", default=WAREHOUSE_DIR)
+    parser.add_argument("--company", action="append", choices=sorted(COMPANIES), help="ניתן לחזור מספר פעמים")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--per-host", type=int, default=2, help="חיבורים מקבילים לכל שרת")
+    args = parser.parse_args(argv)
+
+    sync = MayaSync(args.base_url, args.root, workers=args.workers, per_host=args.per_host)
+    results = sync.sync(args.company)
+    return 1 if any(status.startswith("error") for _, status, _ in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+"""שרת דמה מקומי למאיה: מגיש תיקיית fixtures במבנה המחסן כרשימות דיווחים וקבצים
+
+תומך ב-ETag / Last-Modified, בקשות מותנות (304), Range / If-Range (206) וקיטוע מכוון של
+הורדה (truncate) לבדיקת המשך הורדה. יומן הבקשות זמין ב-.requests.
+
+שימוש:
+    python -m scrapers.stub_maya --root data/Insurance_Warehouse --port 8766
+    python -m scrapers.maya_scraper --base-url http://127.0.0.1:8766 --root /tmp/warehouse
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import threading
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, unquote
+
+from scrapers.maya_scraper import COMPANIES
+
+_NAME = re.compile(r"_Q(?P<quarter>[1-4])_(?P<year>\d{4})(?:_Solvency)?(?P<estimate>_ESTIMATE(?:_Based_on_(?P<based_on>[^._]+))?)?")
+
+
+class StubMaya(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, root, address=("127.0.0.1", 0)):
+        super().__init__(address, _Handler)
+        self.root = root
+        self.requests = []
+        self.truncate = {}  # url path -> מספר בתים לשליחה לפני ניתוק
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def filings(self, company):
+        out = []
+        company_dir = os.path.join(self.root, company)
+        for dirpath, _, files in os.walk(company_dir):
+            report_type = os.path.basename(dirpath).removesuffix("_Reports")
+            for name in sorted(files):
+                m = _NAME.search(name)
+                if not m or not name.lower().endswith(".pdf"): continue
+                rel = os.path.relpath(os.path.join(dirpath, name), self.root)
+                out.append({"year": int(m["year"]), "quarter": int(m["quarter"]), "type": report_type,
+                            "url": "/files/" + quote(rel), "estimate": bool(m["estimate"]), "based_on": m["based_on"]})
+        return sorted(out, key=lambda f: (f["year"], f["quarter"], f["type"]))
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _not_modified(self, etag, mtime):
+        if self.headers.get("If-None-Match"):
+            return self.headers["If-None-Match"] == etag
+        since = self.headers.get("If-Modified-Since")
+        if since:
+            try:
+                return int(mtime) <= parsedate_to_datetime(since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def _send(self, status, body=b"", headers=None, limit=None):
+        self.send_response(status)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body if limit is None else body[:limit])
+        if limit is not None:
+            self.close_connection = True
+
+    def do_GET(self):
+        server = self.server
+        with server._lock:
+            server.requests.append({"path": self.path, "headers": dict(self.headers)})
+        if self.path.startswith("/filings/"):
+            ids = {str(v): k for k, v in COMPANIES.items()}
+            company = ids.get(self.path.rsplit("/", 1)[1])
+            if company is None:
+                return self._send(404)
+            body = json.dumps({"filings": server.filings(company)}).encode("utf-8")
+            mtime = max((os.path.getmtime(os.path.join(d, f)) for d, _, fs in os.walk(os.path.join(server.root, company))
+                         for f in fs), default=0)
+            return self._serve(body, mtime, "application/json")
+        if self.path.startswith("/files/"):
+            path = os.path.join(server.root, unquote(self.path[len("/files/"):]))
+            if not os.path.isfile(path):
+                return self._send(404)
+            with open(path, "rb") as f:
+                body = f.read()
+            return self._serve(body, os.path.getmtime(path), "application/pdf", server.truncate.pop(self.path, None))
+        self._send(404)
+
+    def _serve(self, body, mtime, content_type, limit=None):
+        etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        headers = {"ETag": etag, "Last-Modified": formatdate(mtime, usegmt=True), "Content-Type": content_type,
+                   "Accept-Ranges": "bytes"}
+        if self._not_modified(etag, mtime):
+            return self._send(304, headers={"ETag": etag})
+        rng = re.fullmatch(r"bytes=(\d+)-", self.headers.get("Range", ""))
+        if_range = self.headers.get("If-Range")
+        if rng and (not if_range or if_range in (etag, headers["Last-Modified"])):
+            start = int(rng.group(1))
+            if start >= len(body):
+                return self._send(416, headers={"Content-Range": f"bytes */{len(body)}"})
+            headers["Content-Range"] = f"bytes {start}-{len(body) - 1}/{len(body)}"
+            return self._send(206, body[start:], headers, limit)
+        self._send(200, body, headers, limit)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="שרת דמה מקומי למאיה")
+    parser.add_argument("--root", default=os.path.join("data", "Insurance_Warehouse"))
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args(argv)
+    server = StubMaya(args.root, ("127.0.0.1", args.port))
+    print(f"Maya stub on {server.base_url} (root={args.root})")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
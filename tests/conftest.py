@@ -0,0 +1,8 @@
+"""הגדרות משותפות לבדיקות: מטמון ומדידות בתיקייה זמנית, כדי שהבדיקות לא יכתבו לתיקיית הנתונים"""
+import os
+import sys
+import tempfile
+
+os.environ.setdefault("APEX_CACHE_DIR", tempfile.mkdtemp(prefix="apex-tests-"))
+os.environ.setdefault("APEX_TELEMETRY", "0")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,63 @@
+import os
+import shutil
+from urllib.parse import quote
+
+import pytest
+
+from scrapers import maya_scraper
+from scrapers.maya_scraper import MayaSync, SyncState
+from scrapers.stub_maya import StubMaya
+
+FILES = {
+    "Harel/2025/Q1/Financial_Reports/Harel_Q1_2025.pdf.pdf": b"%PDF-1.4 financial " * 20000,
+    "Harel/2025/Q1/Solvency_Reports/Harel_Q1_2025_Solvency_ESTIMATE_Based_on_2024.pdf.pdf": b"%PDF-1.4 solvency " * 300,
+}
+
+
+@pytest.fixture
+def stub(tmp_path):
+    root = tmp_path / "maya"
+    for rel, body in FILES.items():
+        (root / rel).parent.mkdir(parents=True, exist_ok=True)
+        (root / rel).write_bytes(body)
+    server = StubMaya(str(root)).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def sync(stub, tmp_path, monkeypatch):
+    monkeypatch.setattr(maya_scraper, "RESUME_BACKOFF", 0)
+    return MayaSync(stub.base_url, str(tmp_path / "warehouse"), SyncState(str(tmp_path / "state.sqlite")), workers=2)
+
+
+def _run(sync):
+    return {os.path.relpath(path, sync.root) if path else f.url: status
+            for f, status, path in sync.sync(["Harel"], progress=lambda *_: None)}
+
+
+def test_existing_double_extension_files_are_matched(stub, sync):
+    shutil.copytree(stub.root, sync.root)
+    assert _run(sync) == {rel: "unchanged" for rel in FILES}
+    names = sorted(n for _, _, files in os.walk(sync.root) for n in files)
+    assert names == sorted(os.path.basename(rel) for rel in FILES)
+
+
+def test_second_sync_is_a_304_noop(stub, sync):
+    assert set(_run(sync).values()) == {"new"}
+    del stub.requests[:]
+    assert set(_run(sync).values()) == {"not-modified"}
+    assert stub.requests and all("If-None-Match" in r["headers"] for r in stub.requests)
+
+
+def test_truncated_download_resumes_in_the_same_run(stub, sync):
+    rel = next(iter(FILES))
+    url = "/files/" + quote(rel)
+    # ניתוק אחרי כמה חלקים שלמים, כדי שה-.part לא יהיה ריק
+    stub.truncate[url] = 3 * maya_scraper.CHUNK_SIZE + 100
+    assert _run(sync)[rel.removesuffix(".pdf")] == "new"
+    with open(os.path.join(sync.root, rel.removesuffix(".pdf")), "rb") as f:
+        assert f.read() == FILES[rel]
+    ranges = [r["headers"].get("Range") for r in stub.requests if r["path"] == url]
+    assert ranges == [None, f"bytes={3 * maya_scraper.CHUNK_SIZE}-"]
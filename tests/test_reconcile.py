@@ -0,0 +1,59 @@
+import pandas as pd
+
+from engine.reconcile import CLOSING, NEW_BUSINESS, OPENING, RELEASE, Reconciler, check_extraction, reconcile
+from engine.store import build_from_sources, get_record
+
+
+def _result(frame, company, period, check):
+    res = reconcile(frame)
+    return res[(res["company"] == company) & (res["period"] == period) & (res["check"] == check)].iloc[0]
+
+
+def _quarters(companies=("Harel", "Clal"), periods=("Q1 2025", "Q2 2025", "Q3 2025")):
+    """גלגול מאוזן: סגירת כל רבעון היא פתיחת הבא"""
+    rows = []
+    for company in companies:
+        opening = 1000.0
+        for period in periods:
+            rows.append({"company": company, "period": period, "source": "audited", OPENING: opening,
+                         NEW_BUSINESS: 50.0, RELEASE: 30.0, CLOSING: opening + 20.0})
+            opening += 20.0
+    return pd.DataFrame(rows)
+
+
+def test_rollforward_breach_clal_q3():
+    row = _result(build_from_sources(), "Clal", "Q3 2025", "rollforward")
+    assert (row["expected"], row["reported"], row["breach"]) == (8887.0, 8813.0, True)
+
+
+def test_cross_block_breach_harel_q3_new_business():
+    row = _result(build_from_sources(), "Harel", "Q3 2025", "new_business_blocks")
+    assert (row["expected"], row["reported"], row["breach"]) == (1265.0, 398.0, True)
+
+
+def test_linkage_without_previous_quarter_is_unknown():
+    frame = _quarters(periods=("Q1 2025", "Q3 2025"))
+    res = reconcile(frame)
+    linkage = res[res["check"] == "linkage"]
+    assert linkage["breach"].tolist() == [None] * 4
+    assert res[res["check"] == "rollforward"]["breach"].tolist() == [False] * 4
+
+
+def test_extraction_replaces_the_stored_row():
+    record = get_record("Clal", "Q3 2025")
+    record["consistency_check"]["closing_csm"] = 8887.0
+    res = check_extraction("Clal", "Q3 2025", record)
+    assert res.loc[res["check"] == "rollforward", "breach"].tolist() == [False]
+
+
+def test_refresh_rechecks_changed_row_and_successor_only():
+    frame = _quarters()
+    reconciler = Reconciler()
+    assert len(reconciler.refresh(frame)) == 6
+    assert reconciler.refresh(frame) == []
+    changed = frame.copy()
+    changed.loc[(changed["company"] == "Harel") & (changed["period"] == "Q2 2025"), CLOSING] = 1100.0
+    assert reconciler.refresh(changed) == [("Harel", "Q2 2025"), ("Harel", "Q3 2025")]
+    assert set(map(tuple, reconciler.breaches()[["company", "period", "check"]].to_numpy())) == \
+        {("Harel", "Q2 2025", "rollforward"), ("Harel", "Q3 2025", "linkage")}
+    pd.testing.assert_frame_equal(reconciler.results, reconcile(changed), check_dtype=False)
@@ -0,0 +1,61 @@
+import math
+
+import pandas as pd
+
+from engine.rules import RuleIndex, compile_rules, compliance_checks, evaluate, evaluate_record, red_flags
+from engine.store import build_from_sources, get_record
+
+
+def _statuses(expr, rows):
+    rules = compile_rules([{"id": "r", "kind": "check", "label": "r", "expr": expr}])
+    return evaluate(pd.DataFrame(rows), rules)["status"].tolist()
+
+
+def _record_paths(record):
+    """red_flags/compliance_checks כפי שהיו נגזרים מטבלת evaluate_record"""
+    res = evaluate_record(record)
+    flags = res[(res["kind"] == "flag") & (res["status"] == True)]  # noqa: E712
+    checks = res[res["kind"] == "check"]
+    return list(zip(flags["level"], flags["message"])), dict(zip(checks["message"], checks["status"]))
+
+
+def test_missing_operands_are_unknown():
+    rows = [{"x.a": 5.0, "x.b": 1.0}, {"x.a": math.nan, "x.b": 1.0}, {"x.a": None, "x.b": 1.0}, {"x.a": 1.0, "x.b": 0.0}]
+    assert _statuses("x.a > 2", rows) == [True, None, None, False]
+    # חלוקה באפס אינה קורסת ונותנת "לא ידוע"
+    assert _statuses("x.a / x.b > 2", rows) == [True, None, None, None]
+    # עמודה שאינה קיימת כלל
+    assert _statuses("x.missing > 0", rows) == [None] * 4
+
+
+def test_and_or_with_an_unknown_side():
+    rows = [{"x.a": math.nan, "x.b": 0.0}, {"x.a": math.nan, "x.b": 5.0}, {"x.a": 5.0, "x.b": 5.0}]
+    # False and ? = False; True and ? = ?
+    assert _statuses("x.a > 1 and x.b > 1", rows) == [False, None, True]
+    # True or ? = True; False or ? = ?
+    assert _statuses("x.a > 1 or x.b > 1", rows) == [None, True, True]
+
+
+def test_record_fast_path_matches_frame_path():
+    records = [get_record(c, p) for c, p in build_from_sources()[["company", "period"]].itertuples(index=False)]
+    sparse = {"solvency": {"solvency_ratio": 105.0, "tier1_capital": 0, "tier2_capital": 0},
+              "financial_ratios": {"combined_ratio": None}, "ifrs17_segments": {"onerous_contracts": 12.5}}
+    for record in [r for r in records if r] + [sparse, {}]:
+        assert (red_flags(record), compliance_checks(record)) == _record_paths(record)
+    assert red_flags(sparse) == _record_paths(sparse)[0] != []
+    assert compliance_checks(sparse)["איכות הון (Tier 1 > 50%)"] is None
+
+
+def test_index_reevaluates_only_the_changed_quarter():
+    frame = build_from_sources()
+    index = RuleIndex()
+    assert sorted(index.refresh(frame)) == sorted(frame["period"].unique())
+    assert index.refresh(frame) == []
+    changed = frame.copy()
+    key = (changed["company"] == "Harel") & (changed["period"] == "Q2 2025")
+    changed.loc[key, "solvency.solvency_ratio"] = 90.0
+    assert index.refresh(changed) == ["Q2 2025"]
+    assert index.hits(period="Q2 2025", company="Harel", level="CRITICAL")["rule"].tolist() == ["solvency_critical"]
+    fresh = RuleIndex()
+    fresh.refresh(changed)
+    pd.testing.assert_frame_equal(index.results, fresh.results, check_dtype=False)
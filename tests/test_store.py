@@ -0,0 +1,30 @@
+import pandas as pd
+
+from engine.store import audited_mismatches, build_from_sources, from_csv, merge, unflatten_row
+
+
+def test_built_store_matches_seed_for_audited_rows():
+    frame = build_from_sources()
+    assert (frame["source"] == "audited").any()
+    assert audited_mismatches(frame) == []
+
+
+def test_csv_never_fills_audited_cells():
+    audited = pd.DataFrame([{"company": "Harel", "period": "Q2 2025", "source": "audited", "notes": None,
+                             "core_kpis.total_csm": 15000.0, "ifrs17_segments.general_csm": float("nan")}])
+    csv = pd.DataFrame([{"company": "Harel", "period": "Q2 2025", "source": "csv",
+                         "ifrs17_segments.general_csm": 3000.0, "extra.mcr_ratio": 375.0}])
+    row = merge(audited, csv).iloc[0]
+    assert row["source"] == "audited"
+    assert pd.isna(row["ifrs17_segments.general_csm"])
+    assert row["extra.mcr_ratio"] == 375.0
+    assert unflatten_row(row)["ifrs17_segments"] == {"general_csm": None}
+
+
+def test_csv_units_per_layout(tmp_path):
+    path = tmp_path / "fetch.csv"
+    pd.DataFrame({"company": ["הראל"], "date": ["2026-01-06"], "csm_balance": [11.8],
+                  "loss_component": [380]}).to_csv(path, index=False)
+    row = from_csv(path).iloc[0]
+    assert row["core_kpis.total_csm"] == 11800.0
+    assert row["ifrs17_segments.onerous_contracts"] == 380.0
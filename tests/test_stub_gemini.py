@@ -0,0 +1,64 @@
+import pytest
+
+from engine.extraction import analyze_report
+from engine.gemini_client import GeminiClient
+from engine.stub_gemini import StubGemini
+
+
+@pytest.fixture
+def stub():
+    server = StubGemini().start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(stub):
+    client = GeminiClient("test", stub.base_url)
+    yield client
+    client.close()
+
+
+@pytest.fixture
+def report(tmp_path):
+    path = tmp_path / "Harel_Q1_2025.pdf"
+    path.write_bytes(b"%PDF-1.4 report " * 4096)
+    return str(path)
+
+
+def _analyze(report, client):
+    return analyze_report(report, "test", use_cache=False, client=client, upload=True, prefilter=None)
+
+
+def _routes(stub):
+    return ["start" if "/upload/v1beta/" in r["path"] else "upload" if "/upload/session/" in r["path"] else "generate"
+            for r in stub.requests]
+
+
+def test_upload_is_reused_across_calls(stub, client, report):
+    for _ in range(2):
+        data, status = _analyze(report, client)
+        assert status == "success" and data["meta"]["confidence"] == 0.5
+    assert _routes(stub) == ["start", "upload", "generate", "generate"]
+    assert len(stub.files) == 1
+    # המסמך נשלח פעם אחת בלבד; בקשות ה-generate מפנות ל-URI
+    assert [r["bytes"] for r in stub.requests if r["path"].startswith("/upload/session/")] == [16 * 4096]
+    assert all(r["bytes"] < 16 * 4096 for r in stub.requests if ":generateContent" in r["path"])
+
+
+def test_expired_uri_is_uploaded_again(stub, client, report):
+    assert _analyze(report, client)[1] == "success"
+    stub.files.clear()
+    data, status = _analyze(report, client)
+    assert status == "success" and data is not None
+    assert _routes(stub) == ["start", "upload", "generate", "generate", "start", "upload", "generate"]
+    assert len(stub.files) == 1
+
+
+def test_expired_uri_exhausts_retries_without_success(stub, client, report, monkeypatch):
+    # URI שאינו תקף אף פעם: כל ניסיון מקבל 403, שוכח את ה-URI ומנסה שוב עד תום הניסיונות
+    monkeypatch.setattr(client, "upload_file", lambda path, key=None: f"{stub.base_url}/v1beta/files/gone")
+    data, status = _analyze(report, client)
+    assert data is None and status == "Connection Failed"
+    assert _routes(stub) == ["generate"] * 3